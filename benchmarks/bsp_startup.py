@@ -0,0 +1,119 @@
+"""
+Startup-time benchmark of BacteriophageStructuralProteinClassifier
+
+Synthetic model with large numeric arrays is saved in the compressed joblib
+format (the format of the downloaded model) and exported with
+BacteriophageStructuralProteinManager.export_model. Construction time of the
+classifier is measured in fresh Python processes for both formats
+
+Example usage (from the repository root):
+
+    python -m benchmarks.bsp_startup --samples 50000 --repeat 5
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+import joblib
+import numpy as np
+
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from phages2050.classifiers.proteins.structural_protein import (
+    BacteriophageStructuralProteinManager,
+)
+
+# Model classes are imported before the timer starts,
+# so only the deserialization time is measured
+LOAD_SCRIPT = """
+import sys, time
+import sklearn.neighbors
+from phages2050.classifiers.proteins.structural_protein import (
+    BacteriophageStructuralProteinClassifier,
+)
+start = time.perf_counter()
+BacteriophageStructuralProteinClassifier(
+    model_path=sys.argv[1], label_encoder_path=sys.argv[2]
+)
+print(time.perf_counter() - start)
+"""
+
+
+def build_model(root_dir: str, samples: int) -> dict:
+    """
+    Save synthetic model (samples x 1024 float64 training set)
+    and label encoder in the compressed joblib format
+    """
+
+    rng = np.random.RandomState(0)
+    vectors = rng.normal(size=(samples, 1024))
+    labels = rng.choice(["major_capsid", "portal", "tail_fiber"], size=samples)
+
+    le = LabelEncoder().fit(labels)
+    model = KNeighborsClassifier(algorithm="brute").fit(vectors, le.transform(labels))
+
+    model_path = os.path.join(root_dir, "model", "model.joblib")
+    label_encoder_path = os.path.join(root_dir, "label_encoder", "le.joblib")
+    os.makedirs(os.path.dirname(model_path))
+    os.makedirs(os.path.dirname(label_encoder_path))
+    joblib.dump(model, model_path, compress=3)
+    joblib.dump(le, label_encoder_path, compress=3)
+
+    return {"model_path": model_path, "label_encoder_path": label_encoder_path}
+
+
+def measure(paths: dict, repeat: int) -> dict:
+    """
+    Return construction time statistics (in seconds) measured in fresh processes
+    """
+
+    timings = [
+        float(
+            subprocess.check_output(
+                [
+                    sys.executable,
+                    "-c",
+                    LOAD_SCRIPT,
+                    str(paths["model_path"]),
+                    str(paths["label_encoder_path"]),
+                ]
+            )
+        )
+        for _ in range(repeat)
+    ]
+
+    return {"median": statistics.median(timings), "min": min(timings)}
+
+
+def main(args=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parsed = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root_dir = os.path.join(tmp_dir, "bsp_model")
+        manager = BacteriophageStructuralProteinManager(root_dir=root_dir)
+
+        compressed_paths = build_model(root_dir, parsed.samples)
+        mmap_paths = manager.export_model(**compressed_paths)
+
+        result = {
+            "samples": parsed.samples,
+            "compressed": measure(compressed_paths, parsed.repeat),
+            "mmap": measure(mmap_paths, parsed.repeat),
+        }
+
+    result["speedup"] = result["compressed"]["median"] / result["mmap"]["median"]
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
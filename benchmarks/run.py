@@ -0,0 +1,446 @@
+"""
+Performance benchmark suite of PHAGES2050 hot paths
+
+Each case runs offline on synthetic genomes or proteomes of controlled sizes
+(random sequences with fixed seed) and reports median time, throughput and
+peak memory (traced Python and NumPy allocations) for each size, together
+with the scaling exponent (slope of log(time) / log(size)). Results are
+saved as JSON file which can be compared with the results of another commit
+
+Cases which require optional packages (torch, bio_embeddings, esm)
+are reported as skipped if the packages are not installed, any other
+failure is reported as error and the script exits with non-zero status
+
+Example usage (from the repository root, so phages2050 is importable
+without installation):
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --compare before.json
+    python -m benchmarks.run --cases kmers,genome_avg --preset full
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+from argparse import Namespace
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+NUCLEOTIDES = list("ACGT")
+AMINO_ACIDS = list("ACDEFGHIKLMNPQRSTVWY")
+PROTEIN_LENGTH = 300
+
+logger = logging.getLogger(__name__)
+
+# Sizes of each case (bases or proteins) for quick and full runs
+PRESETS = {
+    "quick": {"bases": [10000, 50000, 200000], "proteins": [10, 50, 200]},
+    "full": {
+        "bases": [50000, 200000, 1000000, 5000000],
+        "proteins": [50, 200, 1000, 5000],
+    },
+    "tiny": {"bases": [2000, 4000], "proteins": [2, 4]},
+}
+
+# Packages of the optional embedding cases
+OPTIONAL_PACKAGES = {"torch", "esm", "bio_embeddings", "transformers"}
+
+# Tiny model configurations, forward passes are measured without
+# downloading the pre-trained weights
+TINY_MODEL = {"layers": 2, "embed_dim": 64, "ffn_embed_dim": 128, "heads": 4}
+
+
+def get_genome(size: int, seed: int = 0) -> str:
+    """
+    Return random genome sequence of given size
+    """
+
+    return "".join(np.random.RandomState(seed).choice(NUCLEOTIDES, size))
+
+
+def get_proteins(count: int, seed: int = 0) -> List[str]:
+    """
+    Return random protein sequences (PROTEIN_LENGTH amino acids each)
+    """
+
+    random_state = np.random.RandomState(seed)
+
+    return [
+        "M" + "".join(random_state.choice(AMINO_ACIDS, PROTEIN_LENGTH - 1))
+        for _ in range(count)
+    ]
+
+
+def write_fasta(path: str, sequences: List[str], prefix: str) -> str:
+    with open(path, "w") as handle:
+        for index, sequence in enumerate(sequences):
+            handle.write(f">{prefix}_{index}\n")
+            for start in range(0, len(sequence), 60):
+                handle.write(f"{sequence[start : start + 60]}\n")
+
+    return path
+
+
+# Each case returns function to be measured (setup is not measured)
+
+
+def case_fasta_reader(size: int, tmp_dir: str) -> Callable:
+    from phages2050.features.io.fasta import FastaReader
+
+    path = write_fasta(os.path.join(tmp_dir, "genome.fasta"), [get_genome(size)], "g")
+
+    return lambda: FastaReader(path).get_sequence()
+
+
+def case_kmers(size: int, tmp_dir: str) -> Callable:
+    from phages2050.features.transformers.kmers import KMersTransformer
+
+    df = pd.DataFrame(data=[get_genome(size)], columns=["sequence"])
+
+    return lambda: KMersTransformer().transform(df)
+
+
+def case_genome_avg(size: int, tmp_dir: str) -> Callable:
+    from gensim.models.word2vec import Word2Vec
+    from phages2050.features.transformers.kmers import (
+        KMersTransformer,
+        GenomeAvgTransformer,
+    )
+
+    kmers = KMersTransformer().transform(
+        pd.DataFrame(data=[get_genome(size)], columns=["sequence"])
+    )
+
+    # Small random Word2Vec model trained on the synthetic genome
+    model = Word2Vec(
+        sentences=[get_genome(20000, seed=1)[x : x + 6] for x in range(0, 20000, 6)],
+        size=32,
+        min_count=1,
+        workers=1,
+        iter=1,
+        seed=0,
+    )
+
+    return lambda: GenomeAvgTransformer(model).transform(kmers)
+
+
+def case_protein_features(size: int, tmp_dir: str) -> Callable:
+    from phages2050.features.extractors.proteins import (
+        MultifastaProteinFeatureExtractor,
+    )
+
+    path = write_fasta(os.path.join(tmp_dir, "proteome.fasta"), get_proteins(size), "p")
+
+    return lambda: MultifastaProteinFeatureExtractor(path).to_df()
+
+
+def case_genome_features(size: int, tmp_dir: str) -> Callable:
+    from phages2050.features.extractors.genomes import GenomeFeatureExtractor
+
+    genome = get_genome(size)
+
+    return lambda: GenomeFeatureExtractor(genome).get_features()
+
+
+def case_orf_finder(size: int, tmp_dir: str) -> Callable:
+    from phages2050.features.extractors.orfs import ORFFinder
+
+    genome, finder = get_genome(size), ORFFinder()
+
+    return lambda: finder.find(genome)
+
+
+def case_minhash(size: int, tmp_dir: str) -> Callable:
+    from phages2050.features.transformers.minhash import MinHashSketchTransformer
+
+    genome, transformer = get_genome(size), MinHashSketchTransformer()
+
+    return lambda: transformer.sketch(genome)
+
+
+def case_bert_tiny(size: int, tmp_dir: str) -> Callable:
+    """
+    BertEmbedding with randomly initialized tiny BERT
+    saved in the format of the pre-trained model directory
+    """
+
+    from transformers import BertConfig, BertModel
+    from phages2050.embeddings.proteins.bert import BertEmbedding
+
+    model_dir = os.path.join(tmp_dir, "bert")
+    if not os.path.exists(model_dir):
+        tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + list(
+            "LAGVESIKRDTPNQFYMHCWXUBZO"
+        )
+        config = BertConfig(
+            vocab_size=len(tokens),
+            hidden_size=TINY_MODEL["embed_dim"],
+            num_hidden_layers=TINY_MODEL["layers"],
+            num_attention_heads=TINY_MODEL["heads"],
+            intermediate_size=TINY_MODEL["ffn_embed_dim"],
+        )
+        BertModel(config).save_pretrained(model_dir)
+
+        with open(os.path.join(model_dir, "vocab.txt"), "w") as handle:
+            handle.write("\n".join(tokens))
+
+    bert = BertEmbedding(model_dir=model_dir)
+    df = pd.DataFrame({"sequence": get_proteins(size), "class": ["benchmark"] * size})
+
+    return lambda: bert._get_vectors(df)
+
+
+def case_esm_tiny(size: int, tmp_dir: str) -> Callable:
+    """
+    ESMEmbedding with randomly initialized tiny ESM-1 model
+    (the pre-trained model is not loaded)
+    """
+
+    import torch
+    import esm
+    from phages2050.embeddings.proteins.esm import ESMEmbedding
+
+    alphabet = esm.Alphabet.from_architecture("ESM-1")
+    args = Namespace(
+        arch="protein_bert_base",
+        layers=TINY_MODEL["layers"],
+        embed_dim=TINY_MODEL["embed_dim"],
+        ffn_embed_dim=TINY_MODEL["ffn_embed_dim"],
+        attention_heads=TINY_MODEL["heads"],
+        max_positions=1024,
+        final_bias=True,
+        dropout=0.0,
+    )
+
+    embedding = ESMEmbedding.__new__(ESMEmbedding)
+    embedding.toks_per_batch = 4096
+    embedding.extra_toks_per_seq = 1
+    embedding.repr_layers = TINY_MODEL["layers"]
+    embedding.layers = [TINY_MODEL["layers"]]
+    embedding.device = torch.device(ESMEmbedding.CPU)
+    embedding.alphabet = alphabet
+    embedding.model = esm.ProteinBertModel(args, alphabet).eval()
+
+    path = write_fasta(os.path.join(tmp_dir, "proteome.fasta"), get_proteins(size), "p")
+
+    return lambda: embedding._get_vectors(embedding._get_data(path))
+
+
+# name: (case, unit of size)
+CASES = {
+    "fasta_reader": (case_fasta_reader, "bases"),
+    "kmers": (case_kmers, "bases"),
+    "genome_avg": (case_genome_avg, "bases"),
+    "protein_features": (case_protein_features, "proteins"),
+    "genome_features": (case_genome_features, "bases"),
+    "orf_finder": (case_orf_finder, "bases"),
+    "minhash": (case_minhash, "bases"),
+    "bert_tiny": (case_bert_tiny, "proteins"),
+    "esm_tiny": (case_esm_tiny, "proteins"),
+}
+
+
+def measure(function: Callable, repeat: int) -> Tuple[float, float]:
+    """
+    Return median time (seconds) of repeated runs and peak
+    memory (MiB) of separate run traced with tracemalloc
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return statistics.median(timings), peak / 1024**2
+
+
+def get_scaling_exponent(points: List[Dict]) -> float:
+    """
+    Return slope of log(time) / log(size), 1.0 means linear scaling
+    """
+
+    if len(points) < 2:
+        return None
+
+    sizes = np.log([point["size"] for point in points])
+    seconds = np.log([max(point["seconds"], 1e-9) for point in points])
+
+    return round(float(np.polyfit(sizes, seconds, 1)[0]), 3)
+
+
+def run_case(name: str, sizes: List[int], repeat: int) -> Dict:
+    """
+    Return points of the scaling curve for each size
+    (skipped if optional package is missing, error if the case failed)
+    """
+
+    case, unit = CASES[name]
+    result = {"unit": unit, "points": []}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            try:
+                function = case(size, tmp_dir)
+                # The first run warms up caches and lazy imports
+                function()
+                seconds, peak_memory = measure(function, repeat)
+            except ImportError as e:
+                if (e.name or "").split(".")[0] not in OPTIONAL_PACKAGES:
+                    logger.error("%s failed: %r", name, e)
+                    return {"unit": unit, "error": repr(e)}
+
+                logger.warning("%s is skipped: %s", name, e)
+                return {"unit": unit, "skipped": str(e)}
+            except Exception as e:
+                logger.error("%s failed: %r", name, e)
+                return {"unit": unit, "error": repr(e)}
+
+            result["points"].append(
+                {
+                    "size": size,
+                    "seconds": round(seconds, 6),
+                    "throughput": round(size / seconds, 3),
+                    "peak_memory_mb": round(peak_memory, 3),
+                }
+            )
+            print(
+                f"{name} {size} {unit}: {seconds:.4f}s, "
+                f"{size / seconds:.1f} {unit}/s, {peak_memory:.1f} MiB"
+            )
+
+    result["scaling_exponent"] = get_scaling_exponent(result["points"])
+
+    return result
+
+
+def get_environment() -> Dict:
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        )
+        commit = commit.decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(current: Dict, baseline: Dict) -> List[Dict]:
+    """
+    Return time ratio (current / baseline) of each case and size
+    measured in both results, ratio above 1.0 means slower
+    """
+
+    rows = []
+
+    for name, result in current["results"].items():
+        baseline_points = {
+            point["size"]: point
+            for point in baseline["results"].get(name, {}).get("points", [])
+        }
+
+        for point in result.get("points", []):
+            if point["size"] in baseline_points:
+                before = baseline_points[point["size"]]
+                rows.append(
+                    {
+                        "case": name,
+                        "size": point["size"],
+                        "baseline_seconds": before["seconds"],
+                        "seconds": point["seconds"],
+                        "ratio": round(point["seconds"] / before["seconds"], 3),
+                        "memory_ratio": round(
+                            point["peak_memory_mb"]
+                            / max(before["peak_memory_mb"], 1e-6),
+                            3,
+                        ),
+                    }
+                )
+
+    return rows
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--preset", choices=list(PRESETS), default="quick")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", help="JSON results of the baseline commit")
+    parser.add_argument(
+        "--max-ratio",
+        type=float,
+        default=None,
+        help="exit with error if any case is slower than baseline by this ratio",
+    )
+    parsed = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+
+    names = [name.strip() for name in parsed.cases.split(",") if name.strip()]
+    unknown = set(names) - set(CASES)
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(sorted(unknown))}")
+
+    results = {
+        "environment": get_environment(),
+        "preset": parsed.preset,
+        "repeat": parsed.repeat,
+        "results": {
+            name: run_case(name, PRESETS[parsed.preset][CASES[name][1]], parsed.repeat)
+            for name in names
+        },
+    }
+
+    with open(parsed.output, "w") as handle:
+        json.dump(results, handle, indent=2)
+    print(f"Results are saved in {parsed.output}")
+
+    if parsed.compare:
+        with open(parsed.compare) as handle:
+            rows = compare(results, json.load(handle))
+
+        if rows:
+            print(pd.DataFrame(rows).to_string(index=False))
+
+        if parsed.max_ratio and any(row["ratio"] > parsed.max_ratio for row in rows):
+            logger.error("Slowdown above %sx", parsed.max_ratio)
+            return 1
+
+    # Broken case is never treated as passed
+    failed = [name for name, result in results["results"].items() if "error" in result]
+    if failed:
+        logger.error("Failed cases: %s", ", ".join(failed))
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import importlib
+from typing import Any, List
+
+# Public API is imported on the first attribute access (PEP 562),
+# so "import phages2050" does not load pandas, sklearn, gensim or torch
+_LAZY_IMPORTS = {
+    "ArtifactStore": "phages2050.artifacts",
+    "ShardedBatchRunner": "phages2050.batch.runner",
+    "FastaReader": "phages2050.features.io.fasta",
+    "ParquetWriter": "phages2050.features.io.parquet",
+    "ProteinFeatureExtractor": "phages2050.features.extractors.proteins",
+    "MultifastaProteinFeatureExtractor": "phages2050.features.extractors.proteins",
+    "GenomeFeatureExtractor": "phages2050.features.extractors.genomes",
+    "MultifastaGenomeFeatureExtractor": "phages2050.features.extractors.genomes",
+    "ORFFinder": "phages2050.features.extractors.orfs",
+    "KMersTransformer": "phages2050.features.transformers.kmers",
+    "GenomeAvgTransformer": "phages2050.features.transformers.kmers",
+    "GenomeWindowTransformer": "phages2050.features.transformers.kmers",
+    "MinHashSketchTransformer": "phages2050.features.transformers.minhash",
+    "MinHashSketches": "phages2050.features.transformers.minhash",
+    "ProteinNGramsTransformer": "phages2050.features.transformers.ngrams",
+    "EmbeddingResult": "phages2050.embeddings.result",
+    "ResidueEmbeddingResult": "phages2050.embeddings.result",
+    "EmbeddingStore": "phages2050.embeddings.store",
+    "IVFIndex": "phages2050.embeddings.index",
+    "Word2VecModelManager": "phages2050.embeddings.nucleotides.word2vec",
+    "Word2VecEmbedding": "phages2050.embeddings.nucleotides.word2vec",
+    "BertModelManager": "phages2050.embeddings.proteins.bert",
+    "BertEmbedding": "phages2050.embeddings.proteins.bert",
+    "ESMEmbedding": "phages2050.embeddings.proteins.esm",
+    "LandmarkProjection": "phages2050.explore.projection",
+    "BacteriophageStructuralProteinManager": "phages2050.classifiers.proteins.structural_protein",
+    "BacteriophageStructuralProteinClassifier": "phages2050.classifiers.proteins.structural_protein",
+    "StructuralProteinPipeline": "phages2050.classifiers.proteins.pipeline",
+    "StructuralProteinServer": "phages2050.classifiers.proteins.server",
+    "StructuralProteinTrainer": "phages2050.classifiers.proteins.training",
+    "MillardLabPhagesCrawler": "phages2050.crawlers.millardlab.crawler",
+    "NCBISequenceFetcher": "phages2050.crawlers.ncbi.fetcher",
+}
+
+__all__ = sorted(_LAZY_IMPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+    # Next access does not call __getattr__
+    globals()[name] = value
+
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
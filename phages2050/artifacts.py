@@ -0,0 +1,352 @@
+import os
+import json
+import logging
+import shutil
+import hashlib
+from pathlib import Path
+from zipfile import ZipFile
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Union
+
+import requests
+
+from fake_useragent import UserAgent
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, the lock file is locked with msvcrt instead
+    import msvcrt
+
+    fcntl = None
+
+from phages2050 import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactStore:
+    """
+    Shared store of pre-trained models (ZIP archives) used by model managers
+
+    Each of the archive is:
+    - taken from the local mirror directory if it contains file with the same
+      name as the archive from URL (mirror_dir or PHAGES2050_MIRROR variable)
+    - or streamed to the disk in chunks, interrupted downloads are resumed
+      from the partial file (<cache_dir>/<archive name>.part)
+    - verified with SHA-256 checksum (if provided)
+    - extracted into the store subdirectory of the target directory
+      (.phages2050-extract) and moved next to the files already there,
+      which are never removed
+
+    Target directory with the completion marker (.phages2050.json) is returned
+    immediately, so the archive is downloaded and extracted once. Directory
+    without the marker which already contains the expected files (e.g. model
+    downloaded by the previous version) or all the archive files is marked
+    as complete instead of being extracted again. Extraction into the same
+    target directory is serialized with the file lock (<cache_dir>/*.lock)
+
+    Example usage:
+
+        store = ArtifactStore()
+        model_dir = store.fetch(url="https://example.com/model.zip", target_dir="model")
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+    MARKER_NAME = ".phages2050.json"
+    EXTRACT_DIR_NAME = ".phages2050-extract"
+    STATUS_CODE_200 = 200
+    STATUS_CODE_206 = 206
+    STATUS_CODE_416 = 416
+
+    def __init__(
+        self, cache_dir: str = None, mirror_dir: str = None, timeout: int = 30
+    ):
+        self.cache_dir = Path(
+            cache_dir
+            or os.environ.get("PHAGES2050_CACHE")
+            or Path.home() / ".cache" / "phages2050"
+        )
+        self.mirror_dir = mirror_dir or os.environ.get("PHAGES2050_MIRROR")
+        self.timeout = timeout
+
+    @staticmethod
+    def _get_headers() -> Dict:
+        """
+        Return header dict with random User-Agent to support request
+        and to avoid being blocked by the server
+        """
+
+        ua = UserAgent()
+        ua.update()
+
+        return {"User-Agent": ua.random}
+
+    @staticmethod
+    def _get_name(url: Union[str, bytes]) -> str:
+        """
+        Return archive file name from the URL
+        """
+
+        if isinstance(url, bytes):
+            url = url.decode("utf-8")
+
+        return url.rstrip("/").split("/")[-1]
+
+    @staticmethod
+    def _get_sha256(path: Path) -> str:
+        """
+        Return SHA-256 checksum of the file calculated chunk by chunk
+        """
+
+        digest = hashlib.sha256()
+
+        with open(path, "rb") as handle:
+            for chunk in iter(lambda: handle.read(ArtifactStore.CHUNK_SIZE), b""):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def _load_marker(self, target_dir: Path) -> Optional[Dict]:
+        """
+        Return completion marker of the target directory (if exists)
+        """
+
+        marker_path = target_dir / self.MARKER_NAME
+        if not marker_path.exists():
+            return None
+
+        with open(marker_path) as handle:
+            return json.load(handle)
+
+    def _download(self, url: Union[str, bytes], archive_path: Path) -> None:
+        """
+        Stream the archive to the disk, resume from the partial file if exists
+        """
+
+        part_path = Path(f"{archive_path}.part")
+        offset = part_path.stat().st_size if part_path.exists() else 0
+
+        headers = self._get_headers()
+        if offset:
+            logger.debug("Resuming download from %d bytes", offset)
+            headers["Range"] = f"bytes={offset}-"
+
+        with requests.get(
+            url, headers=headers, stream=True, timeout=self.timeout
+        ) as response:
+            if response.status_code == self.STATUS_CODE_416:
+                # Partial file already contains the whole archive
+                pass
+            elif response.status_code in (self.STATUS_CODE_200, self.STATUS_CODE_206):
+                # Server without range requests support sends the whole archive
+                mode = "ab" if response.status_code == self.STATUS_CODE_206 else "wb"
+
+                with open(part_path, mode) as handle, instrumentation.stage(
+                    "artifacts.download", items=1
+                ) as stage:
+                    for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                        handle.write(chunk)
+                        stage.add(bytes_read=len(chunk))
+            else:
+                raise Exception(f"Invalid status code: {response.status_code}")
+
+        os.replace(part_path, archive_path)
+
+    def _get_archive(self, url: Union[str, bytes]) -> Path:
+        """
+        Return path to the archive from the mirror or downloaded into cache
+        """
+
+        name = self._get_name(url)
+
+        if self.mirror_dir:
+            mirror_path = Path(self.mirror_dir) / name
+            if mirror_path.exists():
+                logger.debug("%s is taken from the mirror", name)
+                return mirror_path
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        archive_path = self.cache_dir / name
+
+        if not archive_path.exists():
+            logger.debug("%s is downloading now", name)
+            self._download(url, archive_path)
+
+        return archive_path
+
+    @contextmanager
+    def _lock(self, target_dir: Path) -> Iterator[None]:
+        """
+        Hold exclusive lock of the target directory (released by the
+        operating system if the process is killed)
+        """
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        name = hashlib.sha1(str(target_dir.resolve()).encode("utf-8")).hexdigest()
+
+        with open(self.cache_dir / f"{name}.lock", "w") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            else:
+                # LK_LOCK gives up after 10 seconds, so it is retried
+                while True:
+                    try:
+                        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _write_marker(self, target_dir: Path, marker: Dict) -> None:
+        """
+        Write completion marker, it is the last step of the extraction
+        """
+
+        tmp_path = target_dir / f"{self.MARKER_NAME}.tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump(marker, handle)
+
+        os.replace(tmp_path, target_dir / self.MARKER_NAME)
+
+    @staticmethod
+    def _is_extracted(archive_path: Path, target_dir: Path) -> bool:
+        """
+        Return True if each of the archive file exists in the target
+        directory with the same size
+        """
+
+        with ZipFile(archive_path) as zip_file:
+            members = [member for member in zip_file.infolist() if not member.is_dir()]
+
+        return bool(members) and all(
+            (target_dir / member.filename).is_file()
+            and (target_dir / member.filename).stat().st_size == member.file_size
+            for member in members
+        )
+
+    @classmethod
+    def _move(cls, source_dir: Path, target_dir: Path) -> None:
+        """
+        Move extracted files into target directory, existing directories
+        are merged and only files with the same name are replaced
+        """
+
+        os.makedirs(target_dir, exist_ok=True)
+
+        for source in source_dir.iterdir():
+            target = target_dir / source.name
+
+            if source.is_dir() and target.is_dir():
+                cls._move(source, target)
+            elif target.is_dir():
+                raise Exception(f"{target} is a directory, archive contains a file")
+            else:
+                os.replace(source, target)
+
+    def _extract(self, archive_path: Path, target_dir: Path, marker: Dict) -> None:
+        """
+        Extract the archive into the store subdirectory of the target
+        directory and move the files into the target directory
+        """
+
+        extract_dir = target_dir / self.EXTRACT_DIR_NAME
+
+        # The store subdirectory is left only by an interrupted extraction
+        if extract_dir.exists():
+            shutil.rmtree(extract_dir)
+
+        with ZipFile(archive_path) as zip_file:
+            zip_file.extractall(extract_dir)
+
+        self._move(extract_dir, target_dir)
+        shutil.rmtree(extract_dir)
+
+        self._write_marker(target_dir, marker)
+
+    @classmethod
+    def _exists(cls, target_dir: Path, pattern: str) -> bool:
+        """
+        Return True if any file matching the pattern exists in the target
+        directory (files of the store itself are not taken into account)
+        """
+
+        return any(
+            path.name not in (cls.MARKER_NAME, cls.EXTRACT_DIR_NAME)
+            for path in target_dir.glob(pattern)
+        )
+
+    def is_complete(self, target_dir: str) -> bool:
+        """
+        Return True if the archive was completely extracted into target directory
+        """
+
+        return self._load_marker(Path(target_dir)) is not None
+
+    def fetch(
+        self,
+        url: Union[str, bytes],
+        target_dir: str,
+        sha256: str = None,
+        expected: Sequence[str] = None,
+    ) -> Path:
+        """
+        Return target directory with extracted archive, the archive
+        is downloaded and extracted only if it wasn't done before
+
+        If all the expected files (glob patterns relative to the target
+        directory, e.g. "*" for any file) already exist, the directory
+        is marked as complete without download
+        """
+
+        target_dir = Path(target_dir)
+        if self.is_complete(target_dir):
+            return target_dir
+
+        with self._lock(target_dir):
+            # Another process could complete the extraction in the meantime
+            if self.is_complete(target_dir):
+                return target_dir
+
+            name = self._get_name(url)
+
+            if expected and all(self._exists(target_dir, path) for path in expected):
+                logger.debug("%s is already extracted", name)
+                self._write_marker(target_dir, {"name": name, "sha256": sha256})
+
+                return target_dir
+
+            archive_path = self._get_archive(url)
+
+            if sha256 is not None:
+                digest = self._get_sha256(archive_path)
+                if digest != sha256.lower():
+                    # Broken download is removed, mirror is never modified
+                    if archive_path.parent == self.cache_dir:
+                        os.remove(archive_path)
+
+                    raise Exception(
+                        f"Invalid checksum of {archive_path.name}: {digest}"
+                    )
+
+            marker = {"name": archive_path.name, "sha256": sha256}
+
+            if target_dir.is_dir() and self._is_extracted(archive_path, target_dir):
+                logger.debug("%s files are already in %s", name, target_dir)
+                self._write_marker(target_dir, marker)
+            else:
+                self._extract(archive_path, target_dir, marker)
+
+            # Extracted archive is not needed anymore
+            if archive_path.parent == self.cache_dir:
+                os.remove(archive_path)
+
+        return target_dir
@@ -0,0 +1,525 @@
+import io
+import os
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+import multiprocessing
+from pathlib import Path
+from itertools import islice
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from Bio.SeqIO.FastaIO import FastaIterator
+from Bio.SeqRecord import SeqRecord
+
+from phages2050 import instrumentation
+from phages2050.batch.workloads import WORKLOADS, Workload
+from phages2050.features.io.parquet import ParquetWriter, iter_parquet, to_parquet
+
+logger = logging.getLogger(__name__)
+
+
+class Shard(NamedTuple):
+    """
+    Contiguous range of the input records [start, end) processed as single
+    unit of work (offset is the position of the first record in the file
+    and size is the total length of the sequences)
+    """
+
+    index: int
+    start: int
+    end: int
+    offset: int
+    size: int
+
+
+def scan_fasta(fasta_path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return byte offset and sequence length of each record of (multi) FASTA file
+    """
+
+    offsets, sizes = [], []
+    position = 0
+
+    with open(fasta_path, "rb") as handle:
+        for line in handle:
+            if line.startswith(b">"):
+                offsets.append(position)
+                sizes.append(0)
+            elif sizes:
+                sizes[-1] += len(line.strip())
+
+            position += len(line)
+
+    return np.array(offsets, dtype=np.int64), np.array(sizes, dtype=np.int64)
+
+
+def plan_shards(offsets: np.ndarray, sizes: np.ndarray, n_shards: int) -> List[Shard]:
+    """
+    Split records into at most n_shards contiguous shards with similar total
+    size of the sequences (each record costs at least 1)
+
+    The shard ends after the record which crosses the next multiple of
+    total size / n_shards, so the plan depends only on the records sizes
+    """
+
+    if not len(sizes):
+        return []
+
+    cumulative = np.cumsum(np.maximum(sizes, 1))
+    targets = cumulative[-1] * np.arange(1, n_shards) / n_shards
+
+    ends = np.searchsorted(cumulative, targets) + 1
+    ends = np.unique(np.concatenate([ends[ends < len(sizes)], [len(sizes)]]))
+    starts = np.concatenate([[0], ends[:-1]])
+
+    return [
+        Shard(
+            index=index,
+            start=int(start),
+            end=int(end),
+            offset=int(offsets[start]),
+            size=int(sizes[start:end].sum()),
+        )
+        for index, (start, end) in enumerate(zip(starts, ends))
+    ]
+
+
+class _Heartbeat:
+    """
+    Thread which touches the lock file of the processed shard,
+    so the lock of a long-running shard never becomes stale
+    """
+
+    def __init__(self, lock_path: Path, interval: float):
+        self.lock_path = lock_path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            try:
+                os.utime(self.lock_path)
+            except FileNotFoundError:
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
+
+        return False
+
+
+class ShardedBatchRunner:
+    """
+    Deterministic sharded batch execution on multiple nodes
+    which share only the filesystem (work directory)
+
+    Input FASTA file is split into contiguous, size-balanced shards
+    (the plan is saved in the manifest). Workers started on any node
+    claim shards with atomic lock files (O_CREAT | O_EXCL), execute
+    the workload (e.g. BertWorkload) and save per-shard Parquet files.
+    Failed shards are released and retried (at most max_retries times),
+    locks of crashed workers become stale after lock_timeout seconds.
+    Shard outputs are merged into one Parquet file in the input order
+
+    Work directory layout:
+    - manifest.json - input FASTA file and shards
+    - locks/shard_<index>.lock - shard claimed by the worker
+    - failures/shard_<index>.json - number of failed attempts and the last error
+    - outputs/shard_<index>.parquet - result of the completed shard
+
+    Example usage:
+
+        from phages2050.batch.runner import ShardedBatchRunner
+        from phages2050.batch.workloads import BertWorkload
+
+        runner = ShardedBatchRunner("batch", workload=BertWorkload("bert_model/bert"))
+        runner.plan("proteins.fasta", n_shards=64)
+
+        # On each node
+        runner.run_worker()
+
+        # On any node, after all the workers have finished
+        runner.merge("embeddings.parquet")
+
+        # Or locally, with processes standing in for nodes
+        runner.run_local(n_workers=4)
+    """
+
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(
+        self,
+        work_dir: str,
+        workload: Workload = None,
+        max_retries: int = 2,
+        lock_timeout: float = 600.0,
+    ):
+        self.work_dir = Path(work_dir)
+        self.workload = workload
+        self.max_retries = max_retries
+        self.lock_timeout = lock_timeout
+
+        self._shards = None
+
+    @property
+    def worker_id(self) -> str:
+        # Process id is taken on each call (workers can be forked)
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _get_path(self, kind: str, shard: Shard, extension: str) -> Path:
+        return self.work_dir / kind / f"shard_{shard.index:05d}.{extension}"
+
+    def plan(
+        self, fasta_path: str, n_shards: int = None, shard_size: int = None
+    ) -> List[Shard]:
+        """
+        Split FASTA file into n_shards shards (or shards with about
+        shard_size residues/nucleotides) and save the manifest
+
+        The same plan can be executed on each node, exception is raised
+        if the work directory contains a different plan
+        """
+
+        assert (n_shards is None) != (shard_size is None)
+
+        offsets, sizes = scan_fasta(fasta_path)
+        if shard_size is not None:
+            n_shards = max(int(np.ceil(np.maximum(sizes, 1).sum() / shard_size)), 1)
+
+        manifest = {
+            "fasta_path": os.path.abspath(fasta_path),
+            "n_records": len(sizes),
+            "shards": [
+                shard._asdict() for shard in plan_shards(offsets, sizes, n_shards)
+            ],
+        }
+
+        manifest_path = self.work_dir / self.MANIFEST_NAME
+        if manifest_path.exists():
+            with open(manifest_path) as handle:
+                if json.load(handle) != manifest:
+                    raise Exception(f"{self.work_dir} contains a different plan")
+        else:
+            for kind in ["locks", "failures", "outputs"]:
+                os.makedirs(self.work_dir / kind, exist_ok=True)
+
+            # Nodes may save the same manifest at the same time
+            tmp_path = f"{manifest_path}.tmp-{self.worker_id}"
+            with open(tmp_path, "w") as handle:
+                json.dump(manifest, handle)
+            os.replace(tmp_path, manifest_path)
+
+        self._shards = None
+
+        return self.shards
+
+    def _load_manifest(self) -> Dict:
+        manifest_path = self.work_dir / self.MANIFEST_NAME
+        if not manifest_path.exists():
+            raise Exception(f"{self.work_dir} doesn't contain the plan")
+
+        with open(manifest_path) as handle:
+            return json.load(handle)
+
+    @property
+    def shards(self) -> List[Shard]:
+        if self._shards is None:
+            self._shards = [Shard(**shard) for shard in self._load_manifest()["shards"]]
+
+        return self._shards
+
+    def _is_done(self, shard: Shard) -> bool:
+        return self._get_path("outputs", shard, "parquet").exists()
+
+    def _get_attempts(self, shard: Shard) -> int:
+        failure_path = self._get_path("failures", shard, "json")
+        if not failure_path.exists():
+            return 0
+
+        with open(failure_path) as handle:
+            return json.load(handle)["attempts"]
+
+    def _record_failure(self, shard: Shard, error: Exception) -> int:
+        """
+        Save number of failed attempts of the shard (the shard is locked)
+        """
+
+        attempts = self._get_attempts(shard) + 1
+        failure_path = self._get_path("failures", shard, "json")
+
+        with open(f"{failure_path}.tmp", "w") as handle:
+            json.dump(
+                {"attempts": attempts, "error": repr(error), "worker": self.worker_id},
+                handle,
+            )
+        os.replace(f"{failure_path}.tmp", failure_path)
+
+        return attempts
+
+    def _claim(self, shard: Shard) -> bool:
+        """
+        Create the lock file of the shard, stale lock (not modified
+        for lock_timeout seconds) is taken over by a single worker
+        """
+
+        lock_path = self._get_path("locks", shard, "lock")
+
+        for _ in range(2):
+            try:
+                handle = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) < self.lock_timeout:
+                        return False
+
+                    # Only one of the workers renames the stale lock, in the worst
+                    # case the shard is processed twice and its output (renamed
+                    # atomically) is the same
+                    stale_path = f"{lock_path}.stale-{self.worker_id}"
+                    os.rename(lock_path, stale_path)
+                    os.remove(stale_path)
+
+                    logger.warning("Stale lock of shard %d was removed", shard.index)
+                except FileNotFoundError:
+                    pass
+
+                continue
+
+            with os.fdopen(handle, "w") as lock_file:
+                json.dump({"worker": self.worker_id, "time": time.time()}, lock_file)
+
+            return True
+
+        return False
+
+    def _release(self, shard: Shard) -> None:
+        try:
+            os.remove(self._get_path("locks", shard, "lock"))
+        except FileNotFoundError:
+            # Lock was taken over as stale
+            pass
+
+    def _read_records(self, shard: Shard) -> List[SeqRecord]:
+        """
+        Read records of the shard (the file is read from the shard offset)
+        """
+
+        fasta_path = self._load_manifest()["fasta_path"]
+
+        with open(fasta_path, "rb") as handle:
+            handle.seek(shard.offset)
+
+            records = FastaIterator(io.TextIOWrapper(handle))
+            return list(islice(records, shard.end - shard.start))
+
+    def _process(self, shard: Shard) -> None:
+        """
+        Execute the workload on the shard records and save the result,
+        output file is renamed only after the whole shard was saved
+        """
+
+        records = self._read_records(shard)
+
+        with instrumentation.stage("batch.shard", items=len(records)):
+            df = self.workload(records)
+
+        assert len(df) == len(records)
+
+        output_path = self._get_path("outputs", shard, "parquet")
+        to_parquet(df, f"{output_path}.tmp")
+        os.replace(f"{output_path}.tmp", output_path)
+
+    def run_worker(self) -> int:
+        """
+        Claim and process shards until all of them are completed, failed
+        (retries are exhausted) or processed by other workers, return
+        number of shards completed by this worker
+        """
+
+        assert self.workload is not None
+
+        completed = 0
+        progress = True
+
+        while progress:
+            progress = False
+
+            for shard in self.shards:
+                if self._is_done(shard) or self._get_attempts(shard) > self.max_retries:
+                    continue
+
+                if not self._claim(shard):
+                    continue
+
+                progress = True
+                lock_path = self._get_path("locks", shard, "lock")
+
+                try:
+                    # Shard could be completed after the check but before the claim
+                    if self._is_done(shard):
+                        continue
+
+                    with _Heartbeat(lock_path, self.lock_timeout / 4):
+                        self._process(shard)
+
+                    completed += 1
+                    logger.debug("Shard %d was completed", shard.index)
+                except Exception as e:
+                    attempts = self._record_failure(shard, e)
+                    logger.warning(
+                        "Shard %d failed (attempt %d): %r", shard.index, attempts, e
+                    )
+                finally:
+                    self._release(shard)
+
+        return completed
+
+    def status(self) -> Dict[str, List[int]]:
+        """
+        Return indexes of done, failed (retries are exhausted),
+        locked (processed now) and pending shards
+        """
+
+        status = {"done": [], "failed": [], "locked": [], "pending": []}
+
+        for shard in self.shards:
+            if self._is_done(shard):
+                status["done"].append(shard.index)
+            elif self._get_attempts(shard) > self.max_retries:
+                status["failed"].append(shard.index)
+            elif self._get_path("locks", shard, "lock").exists():
+                status["locked"].append(shard.index)
+            else:
+                status["pending"].append(shard.index)
+
+        return status
+
+    def merge(self, output_path: str) -> int:
+        """
+        Merge outputs of all the shards into one Parquet file
+        in the input order and return number of rows
+        """
+
+        status = self.status()
+        if len(status["done"]) != len(self.shards):
+            raise Exception(
+                f"Shards are not completed (failed: {status['failed']}, "
+                f"locked: {status['locked']}, pending: {status['pending']})"
+            )
+
+        rows = 0
+
+        with ParquetWriter(output_path) as writer:
+            for shard in self.shards:
+                for df in iter_parquet(self._get_path("outputs", shard, "parquet")):
+                    writer.write(df)
+                    rows += len(df)
+
+        return rows
+
+    def run_local(self, n_workers: int) -> Dict[str, List[int]]:
+        """
+        Execute the plan with n_workers local processes
+        standing in for nodes and return the status
+        """
+
+        workers = [
+            multiprocessing.Process(target=self.run_worker) for _ in range(n_workers)
+        ]
+
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        return self.status()
+
+
+def _get_workload(parsed: argparse.Namespace) -> Workload:
+    """
+    Return workload with command line arguments
+    """
+
+    if parsed.workload == "bert":
+        kwargs = {
+            "model_dir": parsed.model_path,
+            "cuda_device": parsed.cuda_device,
+            "batch_size": parsed.embedding_batch_size,
+        }
+    elif parsed.workload == "esm":
+        kwargs = {"uniref": parsed.uniref, "cuda_device": parsed.cuda_device}
+    elif parsed.workload == "genome_avg":
+        kwargs = {"model_pkl_file": parsed.model_path}
+    else:
+        kwargs = {}
+
+    return WORKLOADS[parsed.workload](**kwargs)
+
+
+def main(args: List[str] = None) -> None:
+    """
+    Console entry point (phages2050-batch) for ShardedBatchRunner
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Sharded batch execution with shared filesystem"
+    )
+    parser.add_argument("command", choices=["plan", "work", "local", "status", "merge"])
+    parser.add_argument("work_dir", help="work directory on the shared filesystem")
+    parser.add_argument("--fasta-path", default=None, help="input (multi) FASTA file")
+    parser.add_argument("--n-shards", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=None)
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default=None)
+    parser.add_argument("--model-path", default=None)
+    parser.add_argument("--uniref", default="Uniref50")
+    parser.add_argument("--cuda-device", type=int, default=None)
+    parser.add_argument(
+        "--embedding-batch-size",
+        type=int,
+        default=4000,
+        help="residues per BERT forward pass",
+    )
+    parser.add_argument("--n-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-retries", type=int, default=2)
+    parser.add_argument("--lock-timeout", type=float, default=600.0)
+    parser.add_argument("--output-path", default=None, help="merged Parquet file")
+    parsed = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+
+    runner = ShardedBatchRunner(
+        parsed.work_dir,
+        workload=_get_workload(parsed) if parsed.workload else None,
+        max_retries=parsed.max_retries,
+        lock_timeout=parsed.lock_timeout,
+    )
+
+    if parsed.command == "plan":
+        shards = runner.plan(
+            parsed.fasta_path, n_shards=parsed.n_shards, shard_size=parsed.shard_size
+        )
+        logger.info("%d shards planned", len(shards))
+    elif parsed.command == "work":
+        logger.info("%d shards completed", runner.run_worker())
+    elif parsed.command == "local":
+        runner.run_local(parsed.n_workers)
+    elif parsed.command == "merge":
+        logger.info("%d rows merged", runner.merge(parsed.output_path))
+
+    status = runner.status()
+    logger.info(", ".join(f"{len(status[key])} {key}" for key in status))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from phages2050.batch.runner import ShardedBatchRunner, plan_shards, scan_fasta
+from phages2050.batch.workloads import ProteinFeaturesWorkload, Workload
+from phages2050.features.extractors.proteins import MultifastaProteinFeatureExtractor
+from phages2050.features.io.parquet import read_parquet
+
+
+@pytest.fixture
+def fasta_path(tmp_path):
+    """
+    Multi-FASTA file with 40 proteins of different lengths
+    """
+
+    random_state = np.random.RandomState(0)
+    path = tmp_path / "proteins.fasta"
+
+    with open(path, "w") as handle:
+        for index in range(40):
+            length = random_state.randint(20, 300)
+            protein = "".join(random_state.choice(list("ACDEFGHIKLMNPQRSTVWY"), length))
+            handle.write(f">protein_{index} hypothetical protein\n")
+            for start in range(0, length, 60):
+                handle.write(f"{protein[start : start + 60]}\n")
+
+    return path
+
+
+class FlakyWorkload(Workload):
+    """
+    Workload which fails on the first attempt of each shard
+    """
+
+    def __init__(self, attempts_dir):
+        self.attempts_dir = attempts_dir
+        self.workload = ProteinFeaturesWorkload()
+
+    def __call__(self, records):
+        marker = self.attempts_dir / records[0].id
+        if not marker.exists():
+            marker.touch()
+            raise Exception("Node failure")
+
+        return self.workload(records)
+
+
+class BrokenWorkload(Workload):
+    def __call__(self, records):
+        raise Exception("Invalid model")
+
+
+def test_plan_is_deterministic_and_balanced(fasta_path, tmp_path):
+    """
+    This test check if shards are contiguous, size-balanced
+    and the same plan is accepted by each of the node
+    """
+
+    offsets, sizes = scan_fasta(fasta_path)
+    assert len(sizes) == 40
+
+    shards = plan_shards(offsets, sizes, n_shards=4)
+
+    assert [shard.start for shard in shards[1:]] == [shard.end for shard in shards[:-1]]
+    assert shards[0].start == 0 and shards[-1].end == 40
+    assert (
+        max(shard.size for shard in shards) - min(shard.size for shard in shards)
+        <= 2 * sizes.max()
+    )
+
+    runner = ShardedBatchRunner(tmp_path / "batch")
+    assert runner.plan(fasta_path, n_shards=4) == shards
+    assert ShardedBatchRunner(tmp_path / "batch").plan(fasta_path, n_shards=4) == shards
+
+    with pytest.raises(Exception):
+        runner.plan(fasta_path, n_shards=5)
+
+
+def test_local_workers_and_ordered_merge(fasta_path, tmp_path):
+    """
+    This test check if several processes standing in for nodes process
+    all the shards (with retries) and the merged result is in input order
+    """
+
+    attempts_dir = tmp_path / "attempts"
+    attempts_dir.mkdir()
+
+    runner = ShardedBatchRunner(
+        tmp_path / "batch", workload=FlakyWorkload(attempts_dir), max_retries=1
+    )
+    runner.plan(fasta_path, n_shards=7)
+
+    status = runner.run_local(n_workers=3)
+    assert len(status["done"]) == len(runner.shards)
+
+    assert runner.merge(str(tmp_path / "merged.parquet")) == 40
+    df = read_parquet(str(tmp_path / "merged.parquet"))
+
+    expected = MultifastaProteinFeatureExtractor(fasta_path=str(fasta_path)).to_df()
+
+    assert df["id"].tolist() == [f"protein_{index}" for index in range(40)]
+    np.testing.assert_allclose(
+        df.drop(columns="id").to_numpy(dtype=float), expected.to_numpy(dtype=float)
+    )
+
+
+def test_failed_shards_and_stale_locks(fasta_path, tmp_path):
+    """
+    This test check if shards are failed after exhausted retries,
+    merge is refused and stale lock is taken over by other worker
+    """
+
+    runner = ShardedBatchRunner(
+        tmp_path / "batch", workload=BrokenWorkload(), max_retries=1
+    )
+    shards = runner.plan(fasta_path, n_shards=2)
+
+    assert runner.run_worker() == 0
+    assert runner.status()["failed"] == [0, 1]
+
+    with pytest.raises(Exception):
+        runner.merge(str(tmp_path / "merged.parquet"))
+
+    # Lock of the crashed worker
+    runner = ShardedBatchRunner(
+        tmp_path / "other", workload=ProteinFeaturesWorkload(), lock_timeout=60
+    )
+    runner.plan(fasta_path, n_shards=2)
+
+    lock_path = tmp_path / "other" / "locks" / "shard_00000.lock"
+    lock_path.touch()
+
+    assert runner.run_worker() == 1
+    assert runner.status()["locked"] == [0]
+
+    os.utime(lock_path, (time.time() - 120, time.time() - 120))
+
+    assert runner.run_worker() == 1
+    assert runner.merge(str(tmp_path / "merged.parquet")) == 40
+    assert not lock_path.exists()
@@ -0,0 +1,173 @@
+import os
+import tempfile
+from typing import List
+
+import pandas as pd
+
+from Bio import SeqIO
+from Bio.SeqRecord import SeqRecord
+
+from phages2050.embeddings.result import EmbeddingResult
+
+
+class Workload:
+    """
+    Workload executed by ShardedBatchRunner on each shard
+
+    Workload is called with list of shard records and returns DataFrame
+    with "id" column and the results in the records order. Models are
+    loaded on the first call, so workloads can be passed to the worker
+    processes before the models are loaded
+    """
+
+    ID_COLUMN = "id"
+
+    def __call__(self, records: List[SeqRecord]) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+class ProteinFeaturesWorkload(Workload):
+    """
+    Protein features (MultifastaProteinFeatureExtractor) of each shard protein
+    """
+
+    def __call__(self, records: List[SeqRecord]) -> pd.DataFrame:
+        from phages2050.features.extractors.proteins import (
+            MultifastaProteinFeatureExtractor,
+        )
+
+        df = MultifastaProteinFeatureExtractor(records=records).to_df()
+        df.insert(0, self.ID_COLUMN, [record.id for record in records])
+
+        return df
+
+
+class BertWorkload(Workload):
+    """
+    BERT embedding (BertEmbedding.embed_batch) of each shard protein
+    """
+
+    def __init__(self, model_dir: str, cuda_device: int = None, batch_size: int = 4000):
+        """
+        batch_size is the number of residues per forward pass
+        """
+
+        self.model_dir = model_dir
+        self.cuda_device = cuda_device
+        self.batch_size = batch_size
+        self.embedder = None
+
+    def __call__(self, records: List[SeqRecord]) -> pd.DataFrame:
+        if self.embedder is None:
+            from phages2050.embeddings.proteins.bert import BertEmbedding
+
+            self.embedder = BertEmbedding(
+                model_dir=self.model_dir, cuda_device=self.cuda_device
+            )
+
+        vectors = self.embedder.embed_batch(
+            [str(record.seq) for record in records], batch_size=self.batch_size
+        )
+        result = EmbeddingResult(
+            ids=[record.id for record in records], vectors=vectors, prefix="BERT"
+        )
+
+        return result.to_df(id_column=self.ID_COLUMN)
+
+
+class ESMWorkload(Workload):
+    """
+    ESM embedding (ESMEmbedding) of each shard protein
+
+    Shard proteins are saved as temporary FASTA file (ESMEmbedding input)
+    and vectors are reordered from the model order to the records order
+    """
+
+    def __init__(
+        self,
+        uniref: str = "Uniref50",
+        toks_per_batch: int = 4096,
+        cuda_device: int = None,
+    ):
+        self.uniref = uniref
+        self.toks_per_batch = toks_per_batch
+        self.cuda_device = cuda_device
+        self.embedder = None
+
+    def __call__(self, records: List[SeqRecord]) -> pd.DataFrame:
+        if self.embedder is None:
+            from phages2050.embeddings.proteins.esm import ESMEmbedding
+
+            self.embedder = ESMEmbedding(
+                uniref=self.uniref,
+                toks_per_batch=self.toks_per_batch,
+                cuda_device=self.cuda_device,
+            )
+
+        ids = [record.id for record in records]
+
+        # FASTA labels have to be the same as record ids
+        handle, fasta_path = tempfile.mkstemp(suffix=".fasta")
+        try:
+            with os.fdopen(handle, "w") as fasta_file:
+                SeqIO.write(
+                    [
+                        SeqRecord(record.seq, id=record.id, description="")
+                        for record in records
+                    ],
+                    fasta_file,
+                    "fasta",
+                )
+
+            result = self.embedder.transform(fasta_path, as_array=True)
+        finally:
+            os.remove(fasta_path)
+
+        rows = {label: row for row, label in enumerate(result.ids)}
+        vectors = result.vectors[[rows[record_id] for record_id in ids]]
+
+        return EmbeddingResult(ids=ids, vectors=vectors, prefix="ESM").to_df(
+            id_column=self.ID_COLUMN
+        )
+
+
+class GenomeAvgWorkload(Workload):
+    """
+    Word2Vec genome embedding (KMersTransformer and GenomeAvgTransformer)
+    of each shard genome
+    """
+
+    def __init__(self, model_pkl_file: str, kmer_size: int = 6):
+        self.model_pkl_file = model_pkl_file
+        self.kmer_size = kmer_size
+        self.transformer = None
+
+    def __call__(self, records: List[SeqRecord]) -> pd.DataFrame:
+        from phages2050.features.transformers.kmers import (
+            GenomeAvgTransformer,
+            KMersTransformer,
+        )
+
+        if self.transformer is None:
+            from phages2050.embeddings.nucleotides.word2vec import Word2VecEmbedding
+
+            model = Word2VecEmbedding(model_pkl_file=self.model_pkl_file).model
+            self.transformer = GenomeAvgTransformer(gensim_model=model)
+
+        df = pd.DataFrame(
+            {"sequence": [str(record.seq).upper() for record in records]},
+            index=[record.id for record in records],
+        )
+        kmers = KMersTransformer(size=self.kmer_size).transform(df)
+
+        return self.transformer.transform(kmers, as_array=True).to_df(
+            id_column=self.ID_COLUMN
+        )
+
+
+WORKLOADS = {
+    "protein_features": ProteinFeaturesWorkload,
+    "bert": BertWorkload,
+    "esm": ESMWorkload,
+    "genome_avg": GenomeAvgWorkload,
+}
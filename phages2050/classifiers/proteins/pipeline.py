@@ -0,0 +1,286 @@
+import os
+import csv
+import json
+import logging
+import argparse
+from typing import List, Iterator, Optional, Tuple
+
+from Bio.SeqIO.FastaIO import FastaIterator
+from Bio.SeqRecord import SeqRecord
+
+from phages2050 import instrumentation
+from phages2050.classifiers.proteins.structural_protein import (
+    BacteriophageStructuralProteinManager,
+    BacteriophageStructuralProteinClassifier,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class StructuralProteinPipeline:
+    """
+    Streaming pipeline for Bacteriophage Structural Protein classification
+    of proteins from the multi-FASTA file (FASTA -> BERT embedding -> BSP model)
+
+    Proteins are read, embedded and classified in batches, so the memory usage
+    does not depend on the FASTA file size. Each of the classified batch is
+    appended to the output CSV file (id, predicted_class, accuracy) and the
+    progress is saved in the checkpoint file. Interrupted run started again
+    with the same arguments resumes from the last saved batch
+
+    Example usage:
+
+        from phages2050.embeddings.proteins.bert import BertEmbedding
+        from phages2050.classifiers.proteins.pipeline import StructuralProteinPipeline
+
+        pipeline = StructuralProteinPipeline(
+            embedder=BertEmbedding(model_dir=bert_model_path),
+            classifier=BacteriophageStructuralProteinClassifier(**bsp_paths),
+        )
+        pipeline.run("proteins.fasta", "proteins_bsp.csv")
+    """
+
+    OUTPUT_COLUMNS = ["id", "predicted_class", "accuracy"]
+
+    def __init__(
+        self,
+        embedder,
+        classifier: BacteriophageStructuralProteinClassifier,
+        batch_size: int = 64,
+        embedding_batch_size: int = 4000,
+    ):
+        """
+        embedder is expected to provide embed_batch method
+        which returns 2D array (N x 1024) for list of sequences
+        (BertEmbedding instance)
+
+        Proteins of each batch are embedded in forward passes
+        of at most embedding_batch_size residues
+        """
+
+        assert batch_size >= 1 and embedding_batch_size >= 1
+
+        self.embedder = embedder
+        self.classifier = classifier
+        self.batch_size = batch_size
+        self.embedding_batch_size = embedding_batch_size
+
+    @staticmethod
+    def _fasta_reader(filename: str) -> Iterator[SeqRecord]:
+        """
+        Read FASTA file content including multifasta format
+        """
+
+        with open(filename) as handle:
+            for record in FastaIterator(handle):
+                yield record
+
+    @staticmethod
+    def _normalize(entry: SeqRecord) -> str:
+        """
+        Each of the sequence is normalized into uppercase
+        format without blank chars at the end
+        """
+
+        return str(entry.seq).upper().strip()
+
+    def _get_batches(self, fasta_path: str, skip: int = 0) -> Iterator[List]:
+        """
+        Yield lists of FASTA records with at most batch_size elements,
+        the first skip records are omitted (already processed)
+        """
+
+        batch = []
+
+        for index, record in enumerate(self._fasta_reader(fasta_path)):
+            if index < skip:
+                continue
+
+            batch.append(record)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    def _classify(self, batch: List[SeqRecord]) -> List:
+        """
+        Return output rows (id, predicted_class, accuracy) for single batch
+        """
+
+        vectors = self.embedder.embed_batch(
+            [self._normalize(r) for r in batch], batch_size=self.embedding_batch_size
+        )
+        predictions = self.classifier.predict_batch(vectors)
+
+        return list(
+            zip(
+                [record.id for record in batch],
+                predictions["predicted_class"],
+                predictions["accuracy"],
+            )
+        )
+
+    @staticmethod
+    def _load_checkpoint(checkpoint_path: str) -> Optional[dict]:
+        """
+        Return saved progress or None if the run was not started before
+        """
+
+        if not os.path.exists(checkpoint_path):
+            return None
+
+        with open(checkpoint_path) as handle:
+            return json.load(handle)
+
+    @staticmethod
+    def _save_checkpoint(checkpoint_path: str, checkpoint: dict) -> None:
+        """
+        Save progress atomically, so the checkpoint file
+        is never left half-written after interruption
+        """
+
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump(checkpoint, handle)
+
+        os.replace(tmp_path, checkpoint_path)
+
+    def run(
+        self, fasta_path: str, output_path: str, checkpoint_path: str = None
+    ) -> int:
+        """
+        Execute the pipeline and return number of classified proteins
+
+        The checkpoint file (<output_path>.checkpoint by default) keeps
+        number of processed records and size of the output file after
+        the last completed batch. Rows written after that point
+        (interrupted batch) are removed before the run is resumed
+        """
+
+        checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+        checkpoint = self._load_checkpoint(checkpoint_path)
+
+        if checkpoint and os.path.exists(output_path):
+            assert checkpoint["fasta_path"] == os.path.abspath(fasta_path)
+
+            logger.debug("Resuming after %d records", checkpoint["records"])
+
+            handle = open(output_path, "r+", newline="")
+            handle.truncate(checkpoint["offset"])
+            handle.seek(checkpoint["offset"])
+        else:
+            checkpoint = {"fasta_path": os.path.abspath(fasta_path), "records": 0}
+
+            handle = open(output_path, "w", newline="")
+            csv.writer(handle).writerow(self.OUTPUT_COLUMNS)
+
+        with handle:
+            writer = csv.writer(handle)
+
+            for batch in self._get_batches(fasta_path, skip=checkpoint["records"]):
+                writer.writerows(self._classify(batch))
+
+                # Rows have to be on the disk before the checkpoint points at them
+                handle.flush()
+                os.fsync(handle.fileno())
+
+                checkpoint["records"] += len(batch)
+                checkpoint["offset"] = handle.tell()
+                self._save_checkpoint(checkpoint_path, checkpoint)
+
+            # Empty input or everything was already processed
+            checkpoint["offset"] = handle.tell()
+            self._save_checkpoint(checkpoint_path, checkpoint)
+
+        return checkpoint["records"]
+
+
+def add_model_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add command line arguments with pre-trained models location
+    """
+
+    parser.add_argument("--bert-model-dir", default=None)
+    parser.add_argument("--bsp-model-path", default=None)
+    parser.add_argument("--bsp-label-encoder-path", default=None)
+    parser.add_argument("--cuda-device", type=int, default=None)
+    parser.add_argument(
+        "--embedding-batch-size",
+        type=int,
+        default=4000,
+        help="residues per BERT forward pass",
+    )
+
+
+def load_models(parsed: argparse.Namespace) -> Tuple:
+    """
+    Return BertEmbedding and BacteriophageStructuralProteinClassifier
+    instances, pre-trained models are downloaded if their paths
+    are not provided
+    """
+
+    # BERT model dependencies are heavy, so they are imported on demand
+    from phages2050.embeddings.proteins.bert import BertModelManager, BertEmbedding
+
+    bert_model_dir = parsed.bert_model_dir or BertModelManager().download_model()
+
+    if parsed.bsp_model_path and parsed.bsp_label_encoder_path:
+        bsp_paths = {
+            "model_path": parsed.bsp_model_path,
+            "label_encoder_path": parsed.bsp_label_encoder_path,
+        }
+    else:
+        bsp_paths = BacteriophageStructuralProteinManager().download_model()
+
+    embedder = BertEmbedding(
+        model_dir=str(bert_model_dir), cuda_device=parsed.cuda_device
+    )
+    classifier = BacteriophageStructuralProteinClassifier(**bsp_paths)
+
+    return embedder, classifier
+
+
+def main(args: List[str] = None) -> None:
+    """
+    Console entry point (phages2050-bsp) for StructuralProteinPipeline
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Bacteriophage structural protein classification of multi-FASTA"
+    )
+    parser.add_argument("fasta_path", help="multi-FASTA file with proteins")
+    parser.add_argument("output_path", help="output CSV file")
+    parser.add_argument("--checkpoint-path", default=None)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument(
+        "--metrics-path", default=None, help="output JSON file with stage metrics"
+    )
+    add_model_arguments(parser)
+    parsed = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+
+    if parsed.metrics_path:
+        instrumentation.enable()
+
+    embedder, classifier = load_models(parsed)
+    pipeline = StructuralProteinPipeline(
+        embedder=embedder,
+        classifier=classifier,
+        batch_size=parsed.batch_size,
+        embedding_batch_size=parsed.embedding_batch_size,
+    )
+
+    records = pipeline.run(
+        parsed.fasta_path, parsed.output_path, checkpoint_path=parsed.checkpoint_path
+    )
+    logger.info("%d proteins classified", records)
+
+    if parsed.metrics_path:
+        instrumentation.to_json(parsed.metrics_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+import json
+import time
+import logging
+import queue
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from phages2050.classifiers.proteins.structural_protein import (
+    BacteriophageStructuralProteinClassifier,
+)
+from phages2050.classifiers.proteins.pipeline import add_model_arguments, load_models
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    """
+    Single request waiting in the micro-batching queue
+    """
+
+    def __init__(self, sequences: List[str]):
+        self.sequences = sequences
+        self.created = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching of concurrent prediction requests
+
+    Requests submitted from many threads are collected in the queue, the
+    worker thread waits at most max_latency seconds (counted from the first
+    request) for next requests and executes predict_fn once for the whole
+    micro-batch (up to max_batch_size sequences). Results are returned to
+    each of the waiting request separately. Request larger than max_batch_size
+    is split into many micro-batches
+
+    Request submitted to stopped batcher fails immediately, requests waiting
+    in the queue when the batcher is stopped fail with an error and each
+    of the request waits at most timeout seconds for its predictions
+
+    Example usage:
+
+        batcher = MicroBatcher(predict_fn=lambda sequences: [...])
+        batcher.start()
+        batcher.submit(["MAKINELLRESTTTNSNSIGRPNLVALTRATTKLIYSDIVATQRTNQPVAA"])
+        batcher.stop()
+    """
+
+    LATENCY_WINDOW = 1000
+
+    def __init__(
+        self,
+        predict_fn: Callable[[List[str]], List],
+        max_batch_size: int = 64,
+        max_latency: float = 0.01,
+        timeout: float = 60.0,
+    ):
+        assert max_batch_size >= 1 and max_latency >= 0 and timeout > 0
+
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.timeout = timeout
+
+        self.queue = queue.Queue()
+        self.thread = None
+        self.running = threading.Event()
+
+        self.lock = threading.Lock()
+        self.requests_total = 0
+        self.batches_total = 0
+        self.sequences_total = 0
+        self.batch_size_max = 0
+        # Latencies (in seconds) of the recent requests
+        self.latencies = deque(maxlen=self.LATENCY_WINDOW)
+
+    def start(self) -> None:
+        """
+        Start the worker thread which executes micro-batches
+        """
+
+        self.running.set()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the worker thread after the current micro-batch,
+        jobs left in the queue fail with an error
+        """
+
+        with self.lock:
+            self.running.clear()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        while True:
+            try:
+                job = self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+            self._fail(job, Exception("MicroBatcher was stopped"))
+
+    @staticmethod
+    def _fail(job: _Job, error: Exception) -> None:
+        job.error = error
+        job.done.set()
+
+    def submit(self, sequences: List[str]) -> List:
+        """
+        Put sequences into the queue (in parts of at most max_batch_size
+        sequences) and wait for their predictions
+        """
+
+        jobs = [
+            _Job(sequences[start : start + self.max_batch_size])
+            for start in range(0, len(sequences), self.max_batch_size)
+        ]
+
+        # Jobs are never queued after stop drained the queue
+        with self.lock:
+            if not self.running.is_set():
+                raise Exception("MicroBatcher is not running")
+
+            for job in jobs:
+                self.queue.put(job)
+
+        deadline = time.perf_counter() + self.timeout
+        results = []
+
+        for job in jobs:
+            if not job.done.wait(max(deadline - time.perf_counter(), 0)):
+                raise Exception(f"Prediction timed out after {self.timeout} seconds")
+
+            if job.error is not None:
+                raise job.error
+
+            results.extend(job.result)
+
+        return results
+
+    def _collect(self, first_job: _Job) -> Tuple[List[_Job], Optional[_Job]]:
+        """
+        Return jobs for single micro-batch, waiting for the next jobs
+        until the batch is full or the latency window is over, and
+        the job which doesn't fit into the batch (if any)
+        """
+
+        jobs = [first_job]
+        size = len(first_job.sequences)
+        deadline = time.perf_counter() + self.max_latency
+
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+
+            try:
+                job = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            if size + len(job.sequences) > self.max_batch_size:
+                return jobs, job
+
+            jobs.append(job)
+            size += len(job.sequences)
+
+        return jobs, None
+
+    def _execute(self, jobs: List[_Job]) -> None:
+        """
+        Execute predict_fn once for all sequences from the jobs
+        and split the result back into the jobs
+        """
+
+        sequences = [sequence for job in jobs for sequence in job.sequences]
+
+        try:
+            results = self.predict_fn(sequences) if sequences else []
+        except Exception as e:
+            results = None
+            for job in jobs:
+                job.error = e
+
+        start = 0
+        for job in jobs:
+            if results is not None:
+                job.result = results[start : start + len(job.sequences)]
+                start += len(job.sequences)
+
+        now = time.perf_counter()
+        with self.lock:
+            self.requests_total += len(jobs)
+            self.batches_total += 1
+            self.sequences_total += len(sequences)
+            self.batch_size_max = max(self.batch_size_max, len(sequences))
+            self.latencies.extend(now - job.created for job in jobs)
+
+        for job in jobs:
+            job.done.set()
+
+    def _worker(self) -> None:
+        """
+        Worker thread main loop
+        """
+
+        next_job = None
+
+        while self.running.is_set():
+            if next_job is None:
+                try:
+                    next_job = self.queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+            jobs, next_job = self._collect(next_job)
+            self._execute(jobs)
+
+        if next_job is not None:
+            self._fail(next_job, Exception("MicroBatcher was stopped"))
+
+    def metrics(self) -> Dict:
+        """
+        Return queue depth, batch size and latency metrics as Python dict
+        """
+
+        with self.lock:
+            latencies = sorted(self.latencies)
+            batches = self.batches_total
+
+            metrics = {
+                "queue_depth": self.queue.qsize(),
+                "requests_total": self.requests_total,
+                "batches_total": batches,
+                "sequences_total": self.sequences_total,
+                "batch_size_avg": self.sequences_total / batches if batches else 0.0,
+                "batch_size_max": self.batch_size_max,
+            }
+
+        for name, quantile in [("p50", 0.5), ("p95", 0.95), ("max", 1.0)]:
+            if latencies:
+                index = min(int(quantile * len(latencies)), len(latencies) - 1)
+                latency = latencies[index]
+            else:
+                latency = 0.0
+            metrics[f"latency_{name}_ms"] = round(latency * 1000.0, 3)
+
+        return metrics
+
+
+class StructuralProteinServer:
+    """
+    Local HTTP inference server for Bacteriophage Structural Protein
+    classification of protein sequences
+
+    BERT embedding and BSP models are loaded once and shared by all the
+    clients, concurrent requests are merged into micro-batches by MicroBatcher.
+    Supported endpoints:
+    - POST /predict with JSON {"sequences": [...]} returns JSON
+      {"predictions": [{"predicted_index", "predicted_class", "accuracy"}, ...]}
+    - GET /metrics returns JSON with queue depth, batch size and latency metrics
+    - GET /health returns JSON {"status": "ok"}
+
+    Example usage:
+
+        server = StructuralProteinServer(
+            embedder=BertEmbedding(model_dir=bert_model_path),
+            classifier=BacteriophageStructuralProteinClassifier(**bsp_paths),
+            port=8050,
+        )
+        server.serve_forever()
+    """
+
+    def __init__(
+        self,
+        embedder,
+        classifier: BacteriophageStructuralProteinClassifier,
+        host: str = "127.0.0.1",
+        port: int = 8050,
+        max_batch_size: int = 64,
+        max_latency: float = 0.01,
+        embedding_batch_size: int = 4000,
+    ):
+        """
+        embedder is expected to provide embed_batch method
+        which returns 2D array (N x 1024) for list of sequences
+        (BertEmbedding instance), micro-batch is embedded in forward
+        passes of at most embedding_batch_size residues
+
+        Port 0 selects random free port (see server_address)
+        """
+
+        self.embedder = embedder
+        self.classifier = classifier
+        self.embedding_batch_size = embedding_batch_size
+
+        self.batcher = MicroBatcher(
+            predict_fn=self._predict,
+            max_batch_size=max_batch_size,
+            max_latency=max_latency,
+        )
+        self.httpd = ThreadingHTTPServer((host, port), self._get_handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def server_address(self):
+        """
+        Return (host, port) tuple of the listening socket
+        """
+
+        return self.httpd.server_address
+
+    def _predict(self, sequences: List[str]) -> List[Dict]:
+        """
+        Return JSON serializable predictions for micro-batch of sequences
+        """
+
+        vectors = self.embedder.embed_batch(
+            sequences, batch_size=self.embedding_batch_size
+        )
+        df = self.classifier.predict_batch(vectors)
+
+        return [
+            {
+                "predicted_index": int(index),
+                "predicted_class": str(name),
+                "accuracy": float(accuracy),
+            }
+            for index, name, accuracy in zip(
+                df["predicted_index"], df["predicted_class"], df["accuracy"]
+            )
+        ]
+
+    def _get_handler(self):
+        """
+        Return request handler class bound to this server instance
+        """
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, status: int, data: Dict) -> None:
+                body = json.dumps(data).encode("utf-8")
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    self._send_json(200, server.batcher.metrics())
+                elif self.path == "/health":
+                    self._send_json(200, {"status": "ok"})
+                else:
+                    self._send_json(404, {"error": "Not found"})
+
+            def do_POST(self):
+                if self.path != "/predict":
+                    self._send_json(404, {"error": "Not found"})
+                    return
+
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json.loads(self.rfile.read(length))
+                    sequences = payload["sequences"]
+
+                    # String or dict would be iterated char by char or key by key
+                    if not isinstance(sequences, list) or not all(
+                        isinstance(sequence, str) for sequence in sequences
+                    ):
+                        raise TypeError("sequences should be a list of strings")
+
+                    sequences = [sequence.upper().strip() for sequence in sequences]
+                except (ValueError, KeyError, TypeError):
+                    self._send_json(400, {"error": "Invalid request"})
+                    return
+
+                try:
+                    predictions = server.batcher.submit(sequences)
+                except Exception as e:
+                    self._send_json(500, {"error": str(e)})
+                    return
+
+                self._send_json(200, {"predictions": predictions})
+
+            def log_message(self, format, *args):
+                # Access log is disabled
+                pass
+
+        return Handler
+
+    def serve_forever(self) -> None:
+        """
+        Start micro-batching and handle requests until shutdown
+        """
+
+        self.batcher.start()
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.batcher.stop()
+
+    def shutdown(self) -> None:
+        """
+        Stop the server started by serve_forever (from other thread)
+        """
+
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main(args: List[str] = None) -> None:
+    """
+    Console entry point (phages2050-bsp-server) for StructuralProteinServer
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Local Bacteriophage structural protein inference server"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-latency", type=float, default=0.01)
+    add_model_arguments(parser)
+    parsed = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+
+    embedder, classifier = load_models(parsed)
+    server = StructuralProteinServer(
+        embedder=embedder,
+        classifier=classifier,
+        host=parsed.host,
+        port=parsed.port,
+        max_batch_size=parsed.max_batch_size,
+        max_latency=parsed.max_latency,
+        embedding_batch_size=parsed.embedding_batch_size,
+    )
+
+    logger.info("Listening on %s:%d", parsed.host, server.server_address[1])
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,15 @@
 import os
 import base64
+import warnings
 import joblib
 from pathlib import Path
-from io import BytesIO
-from zipfile import ZipFile
-from typing import Dict
+from typing import Dict, Iterator, Optional, Union
 
+import numpy as np
 import pandas as pd
-import requests
 
-from fake_useragent import UserAgent
+from phages2050 import instrumentation
+from phages2050.artifacts import ArtifactStore
 
 
 class BacteriophageStructuralProteinManager:
@@ -27,16 +27,13 @@ class BacteriophageStructuralProteinManager:
         "aHR0cHM6Ly9kZWVwcGV0cmkuYWkvc3RhdGljL3BoYWdlczIw"
         "NTAvYnNwX2xhYmVsX2VuY29kZXJfMjEuMDguMjAyMC56aXA="
     )
-    STATUS_CODE_200 = 200
 
-    def __init__(self, root_dir: str = "bsp_model"):
+    def __init__(self, root_dir: str = "bsp_model", mirror_dir: str = None):
         self.root_dir = root_dir
         self.model_dir = Path(self.root_dir) / "model"
         self.label_encoder_dir = Path(self.root_dir) / "label_encoder"
 
-        if not os.path.exists(self.root_dir):
-            os.makedirs(self.model_dir)
-            os.makedirs(self.label_encoder_dir)
+        self.store = ArtifactStore(mirror_dir=mirror_dir)
 
     @staticmethod
     def _get_path(dir_path: str):
@@ -44,7 +41,9 @@ class BacteriophageStructuralProteinManager:
         Return Path with unzipped file
         """
 
-        files = os.listdir(dir_path)
+        files = [
+            name for name in os.listdir(dir_path) if name != ArtifactStore.MARKER_NAME
+        ]
         if files and len(files) == 1:
             file_path = Path(dir_path) / files[0]
 
@@ -52,19 +51,9 @@ class BacteriophageStructuralProteinManager:
         else:
             raise Exception("BSP model wasn't in the archive")
 
-    @staticmethod
-    def _get_headers() -> Dict:
-        """
-        Return header dict with random User-Agent to support request
-        and to avoid being blocked by the server
-        """
-
-        ua = UserAgent()
-        ua.update()
-
-        return {"User-Agent": ua.random}
-
-    def download_model(self):
+    def download_model(
+        self, model_sha256: str = None, label_encoder_sha256: str = None
+    ) -> Dict:
         """
         Download pre-trained model and label encoder and unzip them into directories
 
@@ -72,24 +61,20 @@ class BacteriophageStructuralProteinManager:
         loaded by BacteriophageStructuralProteinClassifier class instance
         """
 
-        headers = self._get_headers()
-
         # Download classifier model
-        with requests.get(self.BSP_MODEL_URL, headers=headers, timeout=10) as response:
-            assert response.status_code == self.STATUS_CODE_200
-
-            with ZipFile(BytesIO(response.content)) as zip_file:
-                zip_file.extractall(self.model_dir)
-
+        # Directory with the model file is the model downloaded before
+        self.store.fetch(
+            self.BSP_MODEL_URL, self.model_dir, sha256=model_sha256, expected=["*"]
+        )
         model_path = self._get_path(self.model_dir)
 
         # Download labels encoder
-        with requests.get(self.BSP_LABELS_URL, headers=headers, timeout=10) as response:
-            assert response.status_code == self.STATUS_CODE_200
-
-            with ZipFile(BytesIO(response.content)) as zip_file:
-                zip_file.extractall(self.label_encoder_dir)
-
+        self.store.fetch(
+            self.BSP_LABELS_URL,
+            self.label_encoder_dir,
+            sha256=label_encoder_sha256,
+            expected=["*"],
+        )
         label_encoder_path = self._get_path(self.label_encoder_dir)
 
         return {
@@ -97,6 +82,39 @@ class BacteriophageStructuralProteinManager:
             "label_encoder_path": label_encoder_path,
         }
 
+    def export_model(self, model_path: str, label_encoder_path: str) -> Dict:
+        """
+        Save pre-trained model and label encoder in the uncompressed joblib format
+        into <root_dir>/mmap directory and return paths to the exported files
+
+        Numeric arrays from the uncompressed files are memory-mapped by
+        BacteriophageStructuralProteinClassifier instead of being deserialized,
+        so the loading is near-instant and the operating system shares the
+        model pages between processes (e.g. gunicorn workers)
+
+        This procedure should be executed once after download_model
+        """
+
+        mmap_dir = Path(self.root_dir) / "mmap"
+        os.makedirs(mmap_dir, exist_ok=True)
+
+        paths = {}
+        for name, path in [
+            ("model", model_path),
+            ("label_encoder", label_encoder_path),
+        ]:
+            export_path = mmap_dir / f"{name}.joblib"
+
+            if not os.path.exists(export_path):
+                # Never leave half-written file under the final name
+                tmp_path = f"{export_path}.tmp"
+                joblib.dump(joblib.load(path), tmp_path, compress=0)
+                os.replace(tmp_path, export_path)
+
+            paths[f"{name}_path"] = export_path
+
+        return paths
+
 
 class BacteriophageStructuralProteinClassifier:
     """
@@ -121,14 +139,26 @@ class BacteriophageStructuralProteinClassifier:
     SUPPORTED_COLUMNS = ["predicted_index", "predicted_class", "accuracy"]
     FEATURE_SPACE = 1024
 
-    def __init__(self, model_path: str, label_encoder_path: str):
+    # Models already loaded by this process (shared between instances)
+    _loaded: Dict = {}
+
+    def __init__(
+        self, model_path: str, label_encoder_path: str, mmap_mode: Optional[str] = "r"
+    ):
         """
         Check if model and label encoder directory exists
         if yes, then load the model into memory
 
-        This method should be executed once
+        Files exported by BacteriophageStructuralProteinManager.export_model
+        are memory-mapped in mmap_mode ("r" by default, None disables it),
+        compressed files are always loaded into memory
+
+        The model is loaded once per process, the next instances
+        with the same paths reuse it
         """
 
+        self.mmap_mode = mmap_mode
+
         self.model_dir = model_path
         if not os.path.exists(self.model_dir):
             raise Exception("BSP model wasn't downloaded yet")
@@ -144,8 +174,138 @@ class BacteriophageStructuralProteinClassifier:
         Load Machine Learning pre-trained model with label encoder
         """
 
-        self.classifier = joblib.load(self.model_dir)
-        self.le = joblib.load(self.le_dir)
+        self.classifier = self._load(self.model_dir, self.mmap_mode)
+        self.le = self._load(self.le_dir, self.mmap_mode)
+
+    @classmethod
+    def _load(cls, path: str, mmap_mode: Optional[str]):
+        """
+        Return object loaded by joblib, each of the file is loaded once
+        per process unless it was modified on the disk
+        """
+
+        key = (os.path.abspath(path), os.stat(path).st_mtime_ns, mmap_mode)
+
+        if key not in cls._loaded:
+            with warnings.catch_warnings():
+                # Compressed files are loaded into memory as expected
+                warnings.filterwarnings(
+                    "ignore", message=".*not compatible with compressed file.*"
+                )
+                with instrumentation.stage(
+                    "bsp.load", items=1, bytes_read=os.path.getsize(path)
+                ):
+                    cls._loaded[key] = joblib.load(path, mmap_mode=mmap_mode)
+
+        return cls._loaded[key]
+
+    def _get_vectors(
+        self, protein_vectors: Union[np.ndarray, pd.DataFrame]
+    ) -> np.ndarray:
+        """
+        Return 2D array (N x 1024) with protein vectors
+
+        DataFrame returned by BertEmbedding.transform is accepted as well,
+        in that case only BERT_<index> columns are selected
+        """
+
+        if isinstance(protein_vectors, pd.DataFrame):
+            bert_columns = [f"BERT_{index}" for index in range(self.FEATURE_SPACE)]
+
+            if set(bert_columns).issubset(protein_vectors.columns):
+                protein_vectors = protein_vectors[bert_columns]
+
+            protein_vectors = protein_vectors.values
+
+        vectors = np.asarray(protein_vectors)
+
+        # Single vector is processed as a batch with one sample
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+
+        assert vectors.ndim == 2 and vectors.shape[1] == self.FEATURE_SPACE
+
+        return vectors
+
+    def _predict_chunks(
+        self, vectors: np.ndarray, chunk_size: int, top_k: int
+    ) -> Iterator:
+        """
+        Execute classification model chunk by chunk and yield
+        predicted indices, class names and accuracies as
+        2D arrays (chunk size x top_k) ordered from the best prediction
+        """
+
+        for start in range(0, vectors.shape[0], chunk_size):
+            chunk = vectors[start : start + chunk_size]
+
+            # Single model execution per chunk
+            with instrumentation.stage("bsp.predict", items=len(chunk)):
+                proba = self.classifier.predict_proba(chunk)
+
+            if top_k == 1:
+                best = proba.argmax(axis=1).reshape(-1, 1)
+            else:
+                # Select top-k columns without sorting the whole row
+                # and then sort only the selected columns
+                best = np.argpartition(-proba, top_k - 1, axis=1)[:, :top_k]
+                order = np.argsort(-np.take_along_axis(proba, best, axis=1), axis=1)
+                best = np.take_along_axis(best, order, axis=1)
+
+            predicted_index = self.classifier.classes_[best]
+            predicted_class = self.le.inverse_transform(
+                predicted_index.ravel()
+            ).reshape(predicted_index.shape)
+            accuracy = np.round(np.take_along_axis(proba, best, axis=1) * 100.0, 2)
+
+            yield predicted_index, predicted_class, accuracy
+
+    def predict_batch(
+        self,
+        protein_vectors: Union[np.ndarray, pd.DataFrame],
+        top_k: int = 1,
+        chunk_size: int = 10000,
+    ) -> pd.DataFrame:
+        """
+        Execute classification model on many protein vectors at once
+        and return DataFrame with one row per protein and three columns:
+        - "predicted_index" - predicted protein class index
+        - "predicted_class" - predicted protein class name
+        - "accuracy" - accuracy of prediction (0-100%)
+
+        If top_k is greater than 1 then the next best predictions are
+        added as "predicted_index_<rank>", "predicted_class_<rank>"
+        and "accuracy_<rank>" columns (rank starts from 2)
+
+        protein_vectors is represented by array or DataFrame (N x 1024)
+        as a result of BERT embedding. Vectors are classified in chunks
+        (10 000 rows by default) to keep the memory usage bounded
+        """
+
+        vectors = self._get_vectors(protein_vectors)
+
+        top_k = min(top_k, len(self.classifier.classes_))
+        assert top_k >= 1 and chunk_size >= 1
+
+        chunks = list(self._predict_chunks(vectors, chunk_size, top_k))
+
+        if chunks:
+            predicted_index, predicted_class, accuracy = (
+                np.concatenate(arrays) for arrays in zip(*chunks)
+            )
+        else:
+            predicted_index = np.empty((0, top_k), dtype=int)
+            predicted_class = np.empty((0, top_k), dtype=object)
+            accuracy = np.empty((0, top_k), dtype=float)
+
+        data = {}
+        for rank in range(top_k):
+            suffix = f"_{rank + 1}" if rank else ""
+            data[f"{self.SUPPORTED_COLUMNS[0]}{suffix}"] = predicted_index[:, rank]
+            data[f"{self.SUPPORTED_COLUMNS[1]}{suffix}"] = predicted_class[:, rank]
+            data[f"{self.SUPPORTED_COLUMNS[2]}{suffix}"] = accuracy[:, rank]
+
+        return pd.DataFrame(data=data)
 
     def predict(self, protein_vector: pd.DataFrame) -> pd.DataFrame:
         """
@@ -162,16 +322,7 @@ class BacteriophageStructuralProteinClassifier:
         numeric values as a result of BERT embedding
         """
 
-        assert protein_vector.shape == self.FEATURE_SPACE
-
-        predicted_index = self.classifier.predict(protein_vector)[0]
-        predicted_class = self.le.inverse_transform([predicted_index])[0]
-
-        predict_proba = self.classifier.predict_proba(protein_vector)[0][
-            predicted_index
-        ]
-        accuracy = round(predict_proba * 100.0, 2)
-
-        prediction_data = [predicted_index, predicted_class, accuracy]
+        vectors = self._get_vectors(protein_vector)
+        assert vectors.shape[0] == 1
 
-        return pd.DataFrame(data=[prediction_data], columns=self.SUPPORTED_COLUMNS)
+        return self.predict_batch(vectors)
@@ -0,0 +1,34 @@
+import joblib
+import numpy as np
+import pytest
+
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import LabelEncoder
+
+from phages2050.classifiers.proteins.structural_protein import (
+    BacteriophageStructuralProteinClassifier,
+)
+
+
+@pytest.fixture
+def bsp_classifier(tmp_path):
+    """
+    Small classifier trained on random vectors with
+    the same feature space as the pre-trained BSP model
+    """
+
+    rng = np.random.RandomState(0)
+    vectors = rng.normal(size=(60, 1024))
+    labels = np.array(["major_capsid", "portal", "tail_fiber"] * 20)
+
+    le = LabelEncoder().fit(labels)
+    classifier = LogisticRegression(max_iter=200).fit(vectors, le.transform(labels))
+
+    model_path = tmp_path / "model.joblib"
+    label_encoder_path = tmp_path / "label_encoder.joblib"
+    joblib.dump(classifier, model_path)
+    joblib.dump(le, label_encoder_path)
+
+    return BacteriophageStructuralProteinClassifier(
+        model_path=str(model_path), label_encoder_path=str(label_encoder_path)
+    )
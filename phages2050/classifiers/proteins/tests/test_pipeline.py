@@ -0,0 +1,92 @@
+import csv
+
+import numpy as np
+import pytest
+
+from phages2050.classifiers.proteins.pipeline import StructuralProteinPipeline
+
+
+class StubEmbedder:
+    """
+    Offline replacement of BertEmbedding which returns deterministic vectors
+    and can be configured to fail after given number of batches
+    """
+
+    def __init__(self, fail_after: int = None):
+        self.fail_after = fail_after
+        self.calls = 0
+        self.batch_sizes = []
+
+    def embed_batch(self, sequences, batch_size=None):
+        self.batch_sizes.append(batch_size)
+
+        if self.fail_after is not None and self.calls == self.fail_after:
+            raise KeyboardInterrupt
+
+        self.calls += 1
+
+        return np.array(
+            [np.random.RandomState(len(s)).normal(size=1024) for s in sequences]
+        )
+
+
+@pytest.fixture
+def fasta_path(tmp_path):
+    path = tmp_path / "proteins.fasta"
+    path.write_text(
+        "".join(f">protein_{index}\nMAKINE{'L' * index}\n" for index in range(10))
+    )
+
+    return str(path)
+
+
+def _read_rows(path):
+    with open(path, newline="") as handle:
+        return list(csv.reader(handle))
+
+
+def test_pipeline_writes_row_per_protein(bsp_classifier, fasta_path, tmp_path):
+    """
+    This test check if each protein is classified and written
+    to the output CSV file in the input order
+    """
+
+    output_path = str(tmp_path / "output.csv")
+    embedder = StubEmbedder()
+    pipeline = StructuralProteinPipeline(embedder, bsp_classifier, batch_size=3)
+
+    assert pipeline.run(fasta_path, output_path) == 10
+    # Each of the batch is embedded in batches of residues (not one by one)
+    assert embedder.batch_sizes == [4000] * 4
+
+    rows = _read_rows(output_path)
+    assert rows[0] == StructuralProteinPipeline.OUTPUT_COLUMNS
+    assert [row[0] for row in rows[1:]] == [f"protein_{i}" for i in range(10)]
+
+
+def test_pipeline_resumes_from_checkpoint(bsp_classifier, fasta_path, tmp_path):
+    """
+    This test check if interrupted run is resumed from the last
+    completed batch and gives the same result as uninterrupted run
+    """
+
+    expected_path = str(tmp_path / "expected.csv")
+    StructuralProteinPipeline(StubEmbedder(), bsp_classifier, batch_size=3).run(
+        fasta_path, expected_path
+    )
+
+    output_path = str(tmp_path / "output.csv")
+    interrupted = StubEmbedder(fail_after=2)
+    with pytest.raises(KeyboardInterrupt):
+        StructuralProteinPipeline(interrupted, bsp_classifier, batch_size=3).run(
+            fasta_path, output_path
+        )
+
+    resumed = StubEmbedder()
+    StructuralProteinPipeline(resumed, bsp_classifier, batch_size=3).run(
+        fasta_path, output_path
+    )
+
+    # Only the two remaining batches were embedded again
+    assert resumed.calls == 2
+    assert _read_rows(output_path) == _read_rows(expected_path)
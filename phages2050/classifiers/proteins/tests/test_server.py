@@ -0,0 +1,191 @@
+import json
+import time
+import threading
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import numpy as np
+import pytest
+
+from phages2050.classifiers.proteins.server import (
+    MicroBatcher,
+    StructuralProteinServer,
+)
+
+
+class StubEmbedder:
+    """
+    Offline replacement of BertEmbedding which returns deterministic vectors
+    """
+
+    def embed_batch(self, sequences, batch_size=None):
+        assert batch_size is not None
+
+        return np.array(
+            [np.random.RandomState(len(s)).normal(size=1024) for s in sequences]
+        )
+
+
+@pytest.fixture
+def server_url(bsp_classifier):
+    server = StructuralProteinServer(
+        StubEmbedder(), bsp_classifier, port=0, max_batch_size=16, max_latency=0.2
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    host, port = server.server_address
+    yield f"http://{host}:{port}"
+
+    server.shutdown()
+    thread.join()
+
+
+def _post(url, data):
+    request = Request(
+        url,
+        data=json.dumps(data).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def test_concurrent_requests_are_micro_batched(server_url):
+    """
+    This test check if concurrent requests are merged into micro-batches
+    and each of the client receives predictions for its own sequences
+    """
+
+    results = {}
+
+    def client(index):
+        sequences = ["M" * (index + 1)] * (index % 3 + 1)
+        results[index] = _post(f"{server_url}/predict", {"sequences": sequences})
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for index, result in results.items():
+        predictions = result["predictions"]
+
+        assert len(predictions) == index % 3 + 1
+        assert len({p["predicted_class"] for p in predictions}) == 1
+
+    with urlopen(f"{server_url}/metrics") as response:
+        metrics = json.loads(response.read())
+
+    assert metrics["requests_total"] == 8
+    assert metrics["batches_total"] < 8
+    assert metrics["queue_depth"] == 0
+
+
+def test_invalid_sequences_are_rejected(server_url):
+    """
+    This test check if sequences given as a string, dict or list
+    with non-string items are rejected instead of being iterated
+    """
+
+    for sequences in ["MKVLAAGIV", {"MKV": 1}, ["MKV", 1]]:
+        with pytest.raises(HTTPError) as error:
+            _post(f"{server_url}/predict", {"sequences": sequences})
+
+        assert error.value.code == 400
+
+    assert (
+        len(_post(f"{server_url}/predict", {"sequences": ["MKV"]})["predictions"]) == 1
+    )
+
+
+def test_concurrent_submits_share_forward_pass():
+    """
+    This test check if concurrent submits are executed with single
+    predict_fn call and larger request is split into many micro-batches
+    """
+
+    calls = []
+
+    def predict_fn(sequences):
+        calls.append(list(sequences))
+        return [sequence.lower() for sequence in sequences]
+
+    # The batch is executed as soon as it is full (not after max latency)
+    batcher = MicroBatcher(predict_fn, max_batch_size=8, max_latency=5.0)
+    batcher.start()
+
+    results = {}
+
+    def client(index):
+        results[index] = batcher.submit([f"M{index}A", f"M{index}B"])
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1 and len(calls[0]) == 8
+    assert results == {i: [f"m{i}a", f"m{i}b"] for i in range(4)}
+
+    calls.clear()
+    batcher.max_latency = 0.01
+    sequences = [f"P{index}" for index in range(19)]
+
+    assert batcher.submit(sequences) == [s.lower() for s in sequences]
+    assert [len(call) for call in calls] == [8, 8, 3]
+
+    batcher.stop()
+
+
+def test_stopped_batcher_fails_requests():
+    """
+    This test check if submit to stopped batcher raises an error
+    and requests queued when the batcher is stopped fail
+    instead of waiting forever
+    """
+
+    started, release = threading.Event(), threading.Event()
+
+    def predict_fn(sequences):
+        started.set()
+        release.wait()
+        return sequences
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=1, max_latency=0.0)
+
+    with pytest.raises(Exception):
+        batcher.submit(["MKV"])
+
+    batcher.start()
+
+    results = {}
+
+    def client(name):
+        try:
+            results[name] = batcher.submit([name])
+        except Exception as e:
+            results[name] = e
+
+    first = threading.Thread(target=client, args=("first",))
+    first.start()
+    started.wait()
+
+    second = threading.Thread(target=client, args=("second",))
+    second.start()
+    while batcher.queue.qsize() == 0:
+        time.sleep(0.001)
+
+    stopper = threading.Thread(target=batcher.stop)
+    stopper.start()
+    while batcher.running.is_set():
+        time.sleep(0.001)
+    release.set()
+
+    for thread in [first, second, stopper]:
+        thread.join(timeout=5)
+
+    assert results["first"] == ["first"]
+    assert isinstance(results["second"], Exception)
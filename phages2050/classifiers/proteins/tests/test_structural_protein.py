@@ -0,0 +1,61 @@
+import numpy as np
+
+from phages2050.classifiers.proteins.structural_protein import (
+    BacteriophageStructuralProteinManager,
+    BacteriophageStructuralProteinClassifier,
+)
+
+
+def test_predict_batch_is_consistent_with_single_predict(bsp_classifier):
+    """
+    This test check if batch prediction (processed in many chunks)
+    returns the same result as the single vector prediction
+    """
+
+    vectors = np.random.RandomState(1).normal(size=(7, 1024))
+
+    batch_df = bsp_classifier.predict_batch(vectors, chunk_size=3)
+
+    assert list(batch_df.columns) == bsp_classifier.SUPPORTED_COLUMNS
+    assert batch_df.shape[0] == 7
+
+    for index, vector in enumerate(vectors):
+        single_df = bsp_classifier.predict(vector)
+
+        assert single_df.iloc[0].tolist() == batch_df.iloc[index].tolist()
+
+
+def test_predict_batch_top_k_is_ordered(bsp_classifier):
+    """
+    This test check if top-k predictions are sorted from the best one
+    and cover different classes
+    """
+
+    vectors = np.random.RandomState(2).normal(size=(5, 1024))
+
+    df = bsp_classifier.predict_batch(vectors, top_k=3)
+
+    assert (df["accuracy"] >= df["accuracy_2"]).all()
+    assert (df["accuracy_2"] >= df["accuracy_3"]).all()
+
+    classes = df[["predicted_class", "predicted_class_2", "predicted_class_3"]]
+    assert (classes.nunique(axis=1) == 3).all()
+
+
+def test_exported_model_is_memory_mapped(bsp_classifier, tmp_path):
+    """
+    This test check if the model exported to the uncompressed format
+    is memory-mapped and gives the same predictions
+    """
+
+    manager = BacteriophageStructuralProteinManager(root_dir=str(tmp_path / "bsp"))
+    paths = manager.export_model(bsp_classifier.model_dir, bsp_classifier.le_dir)
+
+    mmap_classifier = BacteriophageStructuralProteinClassifier(**paths)
+
+    assert isinstance(mmap_classifier.classifier.coef_, np.memmap)
+
+    vectors = np.random.RandomState(3).normal(size=(4, 1024))
+    assert mmap_classifier.predict_batch(vectors).equals(
+        bsp_classifier.predict_batch(vectors)
+    )
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+from phages2050.classifiers.proteins.structural_protein import (
+    BacteriophageStructuralProteinClassifier,
+)
+from phages2050.classifiers.proteins.training import StructuralProteinTrainer
+from phages2050.features.io.parquet import ParquetWriter
+
+CLASSES = ["major_capsid", "portal", "tail_fiber", "HTJ"]
+
+
+def _get_vectors(size: int, seed: int):
+    """
+    Return random vectors around the center of each class
+    with BERT feature space and their labels
+    """
+
+    centers = np.random.RandomState(0).normal(size=(len(CLASSES), 1024))
+    random_state = np.random.RandomState(seed)
+
+    targets = random_state.randint(len(CLASSES), size=size)
+    vectors = centers[targets] + random_state.normal(scale=2.0, size=(size, 1024))
+
+    return vectors, np.array(CLASSES)[targets]
+
+
+def test_streamed_training_exports_loadable_model(tmp_path):
+    """
+    This test check if the classifier trained chunk by chunk from Parquet
+    file is evaluated with k-fold and exported in the format accepted
+    by BacteriophageStructuralProteinClassifier
+    """
+
+    parquet_path = str(tmp_path / "vectors.parquet")
+
+    with ParquetWriter(parquet_path) as writer:
+        for seed in range(1, 5):
+            vectors, labels = _get_vectors(100, seed)
+            df = pd.DataFrame(
+                vectors, columns=[f"BERT_{index}" for index in range(1024)]
+            )
+            df["class"] = labels
+            writer.write(df)
+
+    trainer = StructuralProteinTrainer(n_splits=4, n_epochs=2)
+    report = trainer.fit(parquet_path)
+
+    assert report.n_samples == 400
+    assert report.classes == sorted(CLASSES)
+    assert len(report.fold_accuracies) == 4
+    assert report.validation_accuracy > 0.9
+    assert report.training_accuracy > 0.9
+
+    classifier = BacteriophageStructuralProteinClassifier(
+        **trainer.export(str(tmp_path / "model"))
+    )
+
+    vectors, labels = _get_vectors(50, seed=10)
+    df = classifier.predict_batch(vectors, top_k=2)
+
+    assert (df["predicted_class"] == labels).mean() > 0.9
+    assert (df["accuracy"] >= df["accuracy_2"]).all()
+
+
+def test_callable_source_skips_unlabeled_vectors():
+    """
+    This test check if vectors without label are skipped and chunks
+    from callable source give the same folds in each of the pass
+    """
+
+    def chunks():
+        for seed in range(3):
+            vectors, labels = _get_vectors(20, seed)
+            labels = labels.astype(object)
+            labels[:5] = None
+
+            yield vectors, labels
+
+    trainer = StructuralProteinTrainer(n_splits=1, n_epochs=1)
+    report = trainer.fit(chunks)
+
+    assert report.n_samples == 45
+    assert report.fold_accuracies == []
+    assert np.isnan(report.validation_accuracy)
+
+    first = [folds for _, _, folds in trainer._iter_folds(chunks)]
+    second = [folds for _, _, folds in trainer._iter_folds(chunks)]
+    assert all(np.array_equal(a, b) for a, b in zip(first, second))
+
+
+def test_class_sorted_parquet_is_interleaved(tmp_path):
+    """
+    This test check if row groups of Parquet file grouped by class are read
+    in a random order with the same folds and only BERT_* columns are used
+    as features (name and other text columns are skipped)
+    """
+
+    parquet_path = str(tmp_path / "sorted.parquet")
+    vectors, labels = _get_vectors(400, seed=1)
+    order = np.argsort(labels, kind="stable")
+
+    df = pd.DataFrame(
+        vectors[order], columns=[f"BERT_{index}" for index in range(1024)]
+    )
+    df.insert(0, "name", [f"protein_{index}" for index in range(len(df))])
+    df["source"] = "millardlab"
+    df["class"] = labels[order]
+
+    with ParquetWriter(parquet_path) as writer:
+        for start in range(0, len(df), 25):
+            writer.write(df.iloc[start : start + 25])
+
+    trainer = StructuralProteinTrainer(n_splits=4, n_epochs=1, shuffle_buffer_size=50)
+
+    in_order = {
+        chunk_vectors[0, 0]: (chunk_labels[0], folds)
+        for chunk_vectors, chunk_labels, folds in trainer._iter_folds(parquet_path)
+    }
+    shuffled = [
+        (chunk_vectors[0, 0], chunk_labels[0], folds)
+        for chunk_vectors, chunk_labels, folds in trainer._iter_folds(
+            parquet_path, np.random.RandomState(0)
+        )
+    ]
+
+    assert len(shuffled) == len(in_order) == 16
+    assert [label for _, label, _ in shuffled] != sorted(
+        label for _, label, _ in shuffled
+    )
+    assert all(np.array_equal(in_order[key][1], folds) for key, _, folds in shuffled)
+
+    report = trainer.fit(parquet_path)
+
+    assert report.n_samples == 400
+    assert report.training_accuracy > 0.9
+    assert report.validation_accuracy > 0.9
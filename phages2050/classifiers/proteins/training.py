@@ -0,0 +1,446 @@
+import os
+import argparse
+import logging
+import joblib
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+import pyarrow.parquet as pq
+
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from phages2050 import instrumentation
+from phages2050.embeddings.store import EmbeddingStore
+from phages2050.features.io.parquet import iter_parquet
+
+logger = logging.getLogger(__name__)
+
+Source = Union[str, EmbeddingStore, Callable[[], Iterable[Tuple[np.ndarray, Sequence]]]]
+
+# Logistic loss (predict_proba) was renamed in newer scikit-learn releases
+LOG_LOSS = "log_loss" if "log_loss" in SGDClassifier.loss_functions else "log"
+
+
+class TrainingReport(NamedTuple):
+    """
+    Number of training samples, class names and k-fold accuracies
+    """
+
+    n_samples: int
+    classes: List[str]
+    fold_accuracies: List[float]
+    validation_accuracy: float
+    training_accuracy: float
+
+
+class StructuralProteinTrainer:
+    """
+    Trainer is responsible to (re)train Bacteriophage Structural Protein
+    classifier out-of-core on labeled protein vectors (e.g. millions of
+    BERT embeddings) which are streamed chunk by chunk from the disk:
+    - Parquet file with label column (e.g. BertEmbedding.transform result)
+    - EmbeddingStore with labels given as {id: label} mapping
+    - callable which returns iterable of (vectors, labels) chunks
+
+    The source is streamed once to fit the label encoder over the full
+    label set and feature scalers, then n_epochs times to train the
+    final model and the k-fold models at once with partial_fit, and once
+    more to evaluate them, so the full matrix is never loaded into memory.
+    Only feature columns (feature_prefix, e.g. BERT_*) of Parquet file are
+    read. Each of the vector is assigned to the fold at random (seeded by
+    the chunk position in the source), so the source should be re-iterable
+    in the same order
+
+    In each of the epoch Parquet row groups are read in a random (seeded)
+    order and vectors are shuffled across consecutive chunks in a buffer
+    of shuffle_buffer_size vectors, so the file grouped by class (e.g.
+    per-class embedding exports) does not bias the model toward the last
+    classes. Row groups should be smaller than the buffer, the other
+    sources are read in their own order and shuffled only in the buffer
+
+    The model (StandardScaler and SGDClassifier pipeline) and the label
+    encoder are exported in the uncompressed joblib format accepted (and
+    memory-mapped) by BacteriophageStructuralProteinClassifier
+
+    Example usage:
+
+        from phages2050.classifiers.proteins.training import StructuralProteinTrainer
+
+        trainer = StructuralProteinTrainer(label_column="class", n_splits=10)
+        report = trainer.fit("bert_proteins.parquet")
+        paths = trainer.export("bsp_model/retrained")
+
+        classifier = BacteriophageStructuralProteinClassifier(**paths)
+    """
+
+    def __init__(
+        self,
+        label_column: str = "class",
+        feature_prefix: str = "BERT_",
+        labels: Mapping = None,
+        n_splits: int = 10,
+        n_epochs: int = 5,
+        alpha: float = 1e-4,
+        seed: int = 0,
+        shuffle_buffer_size: int = 100000,
+    ):
+        """
+        Labels mapping (id: label) is required for EmbeddingStore source,
+        n_splits equal to 1 disables k-fold evaluation
+        """
+
+        assert n_splits >= 1 and n_epochs >= 1 and shuffle_buffer_size >= 1
+
+        self.label_column = label_column
+        self.feature_prefix = feature_prefix
+        self.labels = labels
+        self.n_splits = n_splits
+        self.n_epochs = n_epochs
+        self.alpha = alpha
+        self.seed = seed
+        self.shuffle_buffer_size = shuffle_buffer_size
+
+    def _iter_parquet(
+        self, source: str, random_state: np.random.RandomState = None
+    ) -> Iterator[Tuple[int, np.ndarray, Sequence]]:
+        """
+        Yield row group number, feature columns and labels of each of the
+        row group in the file order or in a random order (if random_state
+        is given), the other columns (e.g. protein name) are not read
+        """
+
+        columns = [
+            name
+            for name in pq.read_schema(source).names
+            if name.startswith(self.feature_prefix)
+        ]
+        if not columns:
+            raise Exception(f"No {self.feature_prefix}* feature columns in {source}")
+
+        row_groups = np.arange(pq.ParquetFile(source).num_row_groups)
+        if random_state is not None:
+            row_groups = random_state.permutation(row_groups)
+
+        chunks = iter_parquet(
+            source, columns=columns + [self.label_column], row_groups=row_groups
+        )
+
+        for index, df in zip(row_groups, chunks):
+            yield int(index), df[columns], df[self.label_column]
+
+    def _iter_chunks(
+        self, source: Source, random_state: np.random.RandomState = None
+    ) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        Yield chunk position in the source, float32 vectors and labels
+        chunk by chunk, vectors without label are skipped
+        """
+
+        if isinstance(source, str):
+            chunks = self._iter_parquet(source, random_state)
+        elif isinstance(source, EmbeddingStore):
+            assert self.labels is not None
+
+            chunks = (
+                (index, vectors, [self.labels.get(vector_id) for vector_id in ids])
+                for index, (ids, vectors) in enumerate(source.iter_chunks())
+            )
+        else:
+            chunks = (
+                (index, vectors, labels)
+                for index, (vectors, labels) in enumerate(source())
+            )
+
+        for index, vectors, labels in chunks:
+            labels = np.asarray(labels, dtype=object)
+            labeled = np.array([label is not None for label in labels], dtype=bool)
+
+            yield (
+                index,
+                np.asarray(vectors, dtype=np.float32)[labeled],
+                labels[labeled].astype(str),
+            )
+
+    def _iter_folds(
+        self, source: Source, random_state: np.random.RandomState = None
+    ) -> Iterator[Tuple[np.ndarray, ...]]:
+        """
+        Yield vectors, labels and fold of each vector chunk by chunk,
+        folds depend only on the chunk position in the source, so they
+        are the same in each of the pass in any order of row groups
+        """
+
+        for index, vectors, labels in self._iter_chunks(source, random_state):
+            if len(vectors):
+                yield vectors, labels, np.random.RandomState(
+                    [self.seed, index]
+                ).randint(self.n_splits, size=len(labels))
+
+    def _iter_shuffled(
+        self, source: Source, random_state: np.random.RandomState
+    ) -> Iterator[Tuple[np.ndarray, ...]]:
+        """
+        Yield vectors, labels and folds of consecutive chunks (in a random
+        order of row groups) shuffled together in batches of at least
+        shuffle_buffer_size vectors (the last one can be smaller)
+        """
+
+        buffer, buffer_size = [], 0
+
+        for chunk in self._iter_folds(source, random_state):
+            buffer.append(chunk)
+            buffer_size += len(chunk[0])
+
+            if buffer_size >= self.shuffle_buffer_size:
+                yield self._shuffle(buffer, random_state)
+                buffer, buffer_size = [], 0
+
+        if buffer:
+            yield self._shuffle(buffer, random_state)
+
+    @staticmethod
+    def _shuffle(
+        chunks: List[Tuple[np.ndarray, ...]], random_state: np.random.RandomState
+    ) -> Tuple[np.ndarray, ...]:
+        """
+        Return vectors, labels and folds of the chunks in a random order
+        """
+
+        order = random_state.permutation(sum(len(chunk[0]) for chunk in chunks))
+
+        return tuple(np.concatenate(arrays)[order] for arrays in zip(*chunks))
+
+    def _get_models(self) -> List[Optional[int]]:
+        """
+        Return fold of each of the trained model (None for the final model),
+        the fold model is trained without vectors of its fold
+        """
+
+        return [None] + (list(range(self.n_splits)) if self.n_splits > 1 else [])
+
+    def _fit_encoders(self, source: Source) -> int:
+        """
+        Fit label encoder over the full label set and scaler of each
+        of the model (scaler of the fold model skips the fold vectors)
+        and return number of samples
+        """
+
+        classes = set()
+        n_samples = 0
+
+        self.scalers = {fold: StandardScaler() for fold in self._get_models()}
+
+        with instrumentation.stage("bsp_training.encoders") as stage:
+            for vectors, labels, folds in self._iter_folds(source):
+                classes.update(labels)
+                n_samples += len(labels)
+
+                for fold, scaler in self.scalers.items():
+                    train = folds != fold
+                    if train.any():
+                        scaler.partial_fit(vectors[train])
+
+                stage.add(items=len(labels), bytes_read=vectors.nbytes)
+
+        if len(classes) < 2:
+            raise Exception("At least 2 protein classes are required")
+
+        self.le = LabelEncoder().fit(sorted(classes))
+
+        return n_samples
+
+    def fit(self, source: Source) -> TrainingReport:
+        """
+        Train the final model on all the vectors and k-fold models
+        (each without one fold) and return accuracy of the final model
+        on training vectors and mean accuracy of k-fold models on their
+        validation folds
+        """
+
+        n_samples = self._fit_encoders(source)
+        classes = np.arange(len(self.le.classes_))
+
+        self.models = {
+            fold: SGDClassifier(loss=LOG_LOSS, alpha=self.alpha, random_state=self.seed)
+            for fold in self._get_models()
+        }
+        random_state = np.random.RandomState(self.seed)
+
+        for epoch in range(self.n_epochs):
+            with instrumentation.stage("bsp_training.fit") as stage:
+                for vectors, labels, folds in self._iter_shuffled(source, random_state):
+                    targets = self.le.transform(labels)
+
+                    for fold, model in self.models.items():
+                        train = folds != fold
+                        if train.any():
+                            model.partial_fit(
+                                self.scalers[fold].transform(vectors[train]),
+                                targets[train],
+                                classes=classes,
+                            )
+
+                    stage.add(items=len(labels), bytes_read=vectors.nbytes)
+
+            logger.info("Epoch %d/%d finished", epoch + 1, self.n_epochs)
+
+        report = self._evaluate(source, n_samples)
+        logger.info(
+            "Training accuracy %.4f, validation accuracy %.4f",
+            report.training_accuracy,
+            report.validation_accuracy,
+        )
+
+        return report
+
+    def _evaluate(self, source: Source, n_samples: int) -> TrainingReport:
+        """
+        Return accuracy of the final model on all the vectors
+        and accuracy of each of the fold model on its fold
+        """
+
+        correct = {fold: 0 for fold in self.models}
+        total = {fold: 0 for fold in self.models}
+
+        with instrumentation.stage("bsp_training.evaluate") as stage:
+            for vectors, labels, folds in self._iter_folds(source):
+                targets = self.le.transform(labels)
+
+                for fold, model in self.models.items():
+                    rows = (
+                        np.ones(len(labels), dtype=bool)
+                        if fold is None
+                        else folds == fold
+                    )
+                    if rows.any():
+                        predicted = model.predict(
+                            self.scalers[fold].transform(vectors[rows])
+                        )
+                        correct[fold] += int((predicted == targets[rows]).sum())
+                        total[fold] += int(rows.sum())
+
+                stage.add(items=len(labels), bytes_read=vectors.nbytes)
+
+        fold_accuracies = [
+            correct[fold] / total[fold]
+            for fold in self.models
+            if fold is not None and total[fold]
+        ]
+        validation_samples = sum(
+            total[fold] for fold in self.models if fold is not None
+        )
+
+        return TrainingReport(
+            n_samples=n_samples,
+            classes=self.le.classes_.tolist(),
+            fold_accuracies=fold_accuracies,
+            validation_accuracy=(
+                sum(correct[fold] for fold in self.models if fold is not None)
+                / validation_samples
+                if validation_samples
+                else float("nan")
+            ),
+            training_accuracy=correct[None] / total[None],
+        )
+
+    def export(self, export_dir: str) -> Dict:
+        """
+        Save the final model and label encoder in the uncompressed joblib
+        format into export_dir directory and return paths to the files,
+        which are accepted by BacteriophageStructuralProteinClassifier
+        """
+
+        os.makedirs(export_dir, exist_ok=True)
+
+        paths = {}
+        for name, value in [
+            ("model", make_pipeline(self.scalers[None], self.models[None])),
+            ("label_encoder", self.le),
+        ]:
+            export_path = Path(export_dir) / f"{name}.joblib"
+
+            # Never leave half-written file under the final name
+            tmp_path = f"{export_path}.tmp"
+            joblib.dump(value, tmp_path, compress=0)
+            os.replace(tmp_path, export_path)
+
+            paths[f"{name}_path"] = str(export_path)
+
+        return paths
+
+
+def main(args: List[str] = None) -> None:
+    """
+    Console entry point (phages2050-bsp-train) for StructuralProteinTrainer
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Bacteriophage structural protein classifier training"
+    )
+    parser.add_argument("parquet_path", help="Parquet file with labeled vectors")
+    parser.add_argument("export_dir", help="output directory with the model")
+    parser.add_argument("--label-column", default="class")
+    parser.add_argument(
+        "--feature-prefix", default="BERT_", help="prefix of the feature columns"
+    )
+    parser.add_argument("--splits", type=int, default=10)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--alpha", type=float, default=1e-4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--shuffle-buffer-size",
+        type=int,
+        default=100000,
+        help="number of vectors shuffled together",
+    )
+    parser.add_argument(
+        "--metrics-path", default=None, help="output JSON file with stage metrics"
+    )
+    parsed = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+
+    if parsed.metrics_path:
+        instrumentation.enable()
+
+    trainer = StructuralProteinTrainer(
+        label_column=parsed.label_column,
+        feature_prefix=parsed.feature_prefix,
+        n_splits=parsed.splits,
+        n_epochs=parsed.epochs,
+        alpha=parsed.alpha,
+        seed=parsed.seed,
+        shuffle_buffer_size=parsed.shuffle_buffer_size,
+    )
+    report = trainer.fit(parsed.parquet_path)
+    paths = trainer.export(parsed.export_dir)
+
+    logger.info(
+        "%d proteins, %d classes, fold accuracies %s, model saved in %s",
+        report.n_samples,
+        len(report.classes),
+        [round(accuracy, 4) for accuracy in report.fold_accuracies],
+        paths["model_path"],
+    )
+
+    if parsed.metrics_path:
+        instrumentation.to_json(parsed.metrics_path)
+
+
+if __name__ == "__main__":
+    main()
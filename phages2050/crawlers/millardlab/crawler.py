@@ -1,27 +1,134 @@
+import os
+import json
+import logging
 from datetime import date
-from typing import List
+from typing import Dict, Iterator, List, NamedTuple, Optional
 
+import numpy as np
 import pandas as pd
 
-from lxml import html
-from lxml.etree import ParserError
+from lxml import etree
+
+from phages2050 import instrumentation
+from phages2050.features.io.parquet import to_parquet
 
 import requests
 
+logger = logging.getLogger(__name__)
+
+
+class MillardLabRecord(NamedTuple):
+    """
+    Single row of the MillardLab bacteriophages table
+    """
+
+    accession: str
+    description: str
+    classification: str
+    genome_length: str
+    mol_gc: str
+
+
+class SnapshotDiff(NamedTuple):
+    """
+    Difference between two MillardLab table snapshots
+    (rows with added, removed and changed accessions)
+    """
+
+    added: pd.DataFrame
+    removed: pd.DataFrame
+    changed: pd.DataFrame
+
+    @property
+    def accessions(self) -> List[str]:
+        """
+        Return accessions which have to be processed again
+        by downstream jobs (added and changed)
+        """
+
+        return sorted(set(self.added.iloc[:, 0]) | set(self.changed.iloc[:, 0]))
+
+    def is_empty(self) -> bool:
+        return self.added.empty and self.removed.empty and self.changed.empty
+
+    def to_df(self) -> pd.DataFrame:
+        """
+        Return all the differences as single DataFrame
+        with additional "Change" column (added, removed or changed)
+        """
+
+        return pd.concat(
+            [
+                self.added.assign(Change="added"),
+                self.removed.assign(Change="removed"),
+                self.changed.assign(Change="changed"),
+            ],
+            ignore_index=True,
+        )
+
+
+def _to_str(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return DataFrame with string values (missing values as empty strings)
+    """
+
+    df = df.astype(object)
+
+    return df.where(df.notna(), "").astype(str)
+
+
+def diff_snapshots(previous: pd.DataFrame, current: pd.DataFrame) -> SnapshotDiff:
+    """
+    Compare two snapshots of the table by accession (first column)
+    and return rows (from current snapshot for added and changed)
+    """
+
+    key = current.columns[0]
+
+    # Values are compared as strings, so snapshot loaded
+    # from CSV file is comparable with parsed table
+    previous = _to_str(previous).drop_duplicates(key, keep="last")
+    current_str = _to_str(current).drop_duplicates(key, keep="last")
+
+    previous_keys = set(previous[key])
+    current_keys = set(current_str[key])
+
+    common = current_str[current_str[key].isin(previous_keys)].set_index(key)
+    common_previous = previous.set_index(key).loc[common.index, common.columns]
+    changed_keys = set(common.index[(common != common_previous).any(axis=1)])
+
+    current = current.drop_duplicates(key, keep="last")
+
+    return SnapshotDiff(
+        added=current[~current[key].isin(previous_keys)].reset_index(drop=True),
+        removed=previous[~previous[key].isin(current_keys)].reset_index(drop=True),
+        changed=current[current[key].isin(changed_keys)].reset_index(drop=True),
+    )
+
 
 class MillardLabPhagesCrawler:
     """
     MillardLab bacteriophages tabular data crawler
-    
-    This class allows you to create DataFrame or save it as CSV with columns:
+
+    This class allows you to create DataFrame or save it as CSV or Parquet
+    with columns:
     - Accession
     - Description
     - Classification
-    - Genome Length(bp)
-    - molGC
-    
+    - Genome Length(bp) (integer)
+    - molGC (float)
+
     Each of the cell is normalised before by strip and upper strings methods
 
+    The HTML response is parsed row by row while it is downloaded, so the memory
+    usage does not depend on the table size. Rows without the expected cells
+    are not included in the result and are available as broken_rows
+
+    Incremental mode (update method) requires snapshot_dir. The table is
+    requested with ETag/Last-Modified conditional headers and compared with
+    the previous snapshot, so only added, removed and changed accessions
+    are returned
+
     Example usage:
 
         from crawlers.millardlab.crawler import MillardLabPhagesCrawler
@@ -31,13 +138,30 @@ class MillardLabPhagesCrawler:
         )
         ml_pc.to_df()
         ml_pc.to_csv()
+
+        ml_pc = MillardLabPhagesCrawler(url=url, snapshot_dir="millardlab")
+        diff = ml_pc.update()
+        fetcher.fetch(diff.accessions, kind="genome", refetch=True)
     """
 
-    def __init__(self, url: str):
+    CHUNK_SIZE = 64 * 1024
+    COLUMN_CLASSES = ["column-1", "column-2", "column-3", "column-4", "column-5"]
+
+    SNAPSHOT_NAME = "snapshot.csv"
+    STATE_NAME = "state.json"
+
+    def __init__(self, url: str, snapshot_dir: str = None):
         self.url = url
+        self.snapshot_dir = snapshot_dir
         self.df = None
+        self.broken_rows = []
+        self.response_headers = {}
+        self.not_modified = False
+        self.request_failed = False
+        self.bytes_read = 0
         today = date.today()
         self.csv_name = f"millardlab_{today}.csv"
+        self.parquet_name = f"millardlab_{today}.parquet"
 
         self.columns = [
             "Accession",
@@ -54,68 +178,133 @@ class MillardLabPhagesCrawler:
         and in uppercase format
         """
 
-        return element.text.strip().upper()
+        return "".join(element.itertext()).strip().upper()
 
-    def _get_html(self) -> str:
+    def _get_chunks(self, headers: Dict = None) -> Iterator[bytes]:
         """
         Request to MillardLab webiste URL
-        and return HTML as string if
+        and yield HTML chunks if
         status code is 200
         """
 
-        try:
-            response = requests.get(self.url)
-
-            if response.status_code == 200:
-                return response.text
-            else:
-                print(f"[DEBUG] Status code is not valid: {response.status_code}")
+        self.response_headers = {}
+        self.not_modified = False
+        self.request_failed = False
 
-                return ""
+        try:
+            with requests.get(self.url, headers=headers, stream=True) as response:
+                if response.status_code == 304:
+                    logger.debug("Table wasn't modified")
+                    self.not_modified = True
+                    return
+
+                if response.status_code != 200:
+                    logger.debug("Status code is not valid: %s", response.status_code)
+                    self.request_failed = True
+                    return
+
+                self.response_headers = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+
+                for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                    self.bytes_read += len(chunk)
+                    yield chunk
         except requests.exceptions.RequestException as e:
-            print(f"[DEBUG] Request exception: {e}")
+            logger.debug("Request exception: %s", e)
+            self.request_failed = True
 
-            return ""
-
-    def _process_element(self, document, xpath: str) -> map:
+    def _process_row(self, row, row_index: int) -> Optional[MillardLabRecord]:
         """
-        Return iterator with normalised elements
+        Return record with normalised cells of the table row, rows without
+        cells (e.g. header) are omitted and rows with missing, duplicated
+        or empty cells are saved as broken
         """
 
-        return map(self._extract_text, document.xpath(xpath))
+        cells = row.findall("td")
+        if not cells:
+            return None
+
+        columns = {}
+        for cell in cells:
+            for class_name in (cell.get("class") or "").split():
+                if class_name in self.COLUMN_CLASSES:
+                    columns.setdefault(class_name, []).append(cell)
+
+        valid = all(len(columns.get(name, [])) == 1 for name in self.COLUMN_CLASSES)
 
-    def _process_html(self) -> List:
+        if valid:
+            # Accession is expected as hyperlink
+            accession_cell = columns[self.COLUMN_CLASSES[0]][0]
+            link = accession_cell.find("a")
+            values = [self._extract_text(link if link is not None else accession_cell)]
+            values += [
+                self._extract_text(columns[name][0]) for name in self.COLUMN_CLASSES[1:]
+            ]
+
+            if values[0]:
+                return MillardLabRecord(*values)
+
+        self.broken_rows.append(
+            {"row": row_index, "cells": [self._extract_text(c) for c in cells]}
+        )
+
+        return None
+
+    def _parse_rows(self, chunks: Iterator[bytes]) -> Iterator[MillardLabRecord]:
         """
-        Extract text from each table cell
+        Single-pass parser which yields record for each of the
+        table row as soon as the row is complete
         """
 
-        try:
-            document = html.document_fromstring(self._get_html())
+        parser = etree.HTMLPullParser(events=("end",), tag="tr")
+        row_index = 0
 
-            # Accession (as hyperlink)
-            acc_numbers = self._process_element(
-                document, "//td[contains(@class, 'column-1')]/a"
-            )
+        def process_events():
+            nonlocal row_index
 
-            # Description
-            descriptions = self._process_element(
-                document, "//td[contains(@class, 'column-2')]"
-            )
+            for _, row in parser.read_events():
+                record = self._process_row(row, row_index)
+                row_index += 1
 
-            # Classification
-            taxonomies = self._process_element(
-                document, "//td[contains(@class, 'column-3')]"
-            )
+                # Processed rows are removed from the document tree
+                # to keep the memory usage bounded
+                row.clear()
+                while row.getprevious() is not None:
+                    del row.getparent()[0]
 
-            # Genome Length(bp)
-            bps = self._process_element(document, "//td[contains(@class, 'column-4')]")
+                if record is not None:
+                    yield record
 
-            # molGC
-            gcs = self._process_element(document, "//td[contains(@class, 'column-5')]")
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield from process_events()
 
-            samples = list(zip(acc_numbers, descriptions, taxonomies, bps, gcs))
-        except ParserError:
-            return []
+        try:
+            parser.close()
+        except etree.XMLSyntaxError:
+            # Empty response
+            return
+
+        yield from process_events()
+
+    def _process_html(self, headers: Dict = None) -> List:
+        """
+        Extract text from each table cell
+        """
+
+        self.broken_rows = []
+        # Bytes of this response only (the crawler can be updated many times)
+        self.bytes_read = 0
+
+        # Table is downloaded and parsed in a single pass
+        with instrumentation.stage("millardlab.crawl") as stage:
+            samples = list(self._parse_rows(self._get_chunks(headers)))
+            stage.add(items=len(samples), bytes_read=self.bytes_read)
+
+        if self.broken_rows:
+            logger.debug("%d broken rows were omitted", len(self.broken_rows))
 
         return samples
 
@@ -127,14 +316,127 @@ class MillardLabPhagesCrawler:
 
         samples = self._process_html()
 
-        self.df = (
+        self.df = self._create_df(samples)
+
+        return self.df
+
+    def _create_df(self, samples: List) -> pd.DataFrame:
+        """
+        Return DataFrame with records sorted by Accession
+        """
+
+        df = (
             pd.DataFrame(data=samples, columns=self.columns)
             .sort_values(self.columns[0])
             .reset_index()
             .drop("index", axis=1)
         )
 
-        return self.df
+        return self._set_dtypes(df)
+
+    def _set_dtypes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Return DataFrame with numeric Genome Length(bp) (nullable integer)
+        and molGC (float) columns, invalid values are missing
+        """
+
+        genome_length = df[self.columns[3]].astype(str).str.replace(",", "")
+
+        return df.assign(
+            **{
+                self.columns[3]: pd.to_numeric(genome_length, errors="coerce")
+                .round()
+                .astype("Int64"),
+                self.columns[4]: pd.to_numeric(
+                    df[self.columns[4]], errors="coerce"
+                ).astype(np.float64),
+            }
+        )
+
+    def _load_state(self) -> Dict:
+        """
+        Return validators (ETag, Last-Modified) of the previous snapshot
+        """
+
+        path = os.path.join(self.snapshot_dir, self.STATE_NAME)
+        if not os.path.exists(path):
+            return {}
+
+        with open(path) as handle:
+            return json.load(handle)
+
+    def _load_snapshot(self) -> Optional[pd.DataFrame]:
+        """
+        Return the previous snapshot or None if it doesn't exist
+        """
+
+        path = os.path.join(self.snapshot_dir, self.SNAPSHOT_NAME)
+        if not os.path.exists(path):
+            return None
+
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+    def _save_snapshot(self, df: pd.DataFrame, state: Dict) -> None:
+        """
+        Replace the previous snapshot and its validators
+        (each file is written atomically)
+        """
+
+        snapshot_path = os.path.join(self.snapshot_dir, self.SNAPSHOT_NAME)
+        df.to_csv(f"{snapshot_path}.tmp", index=False)
+        os.replace(f"{snapshot_path}.tmp", snapshot_path)
+
+        state_path = os.path.join(self.snapshot_dir, self.STATE_NAME)
+        with open(f"{state_path}.tmp", "w") as handle:
+            json.dump(state, handle)
+        os.replace(f"{state_path}.tmp", state_path)
+
+    def update(self) -> SnapshotDiff:
+        """
+        Incremental mode: request the table only if it was modified since
+        the previous snapshot, save the new snapshot and return the
+        difference (all rows are added if there is no previous snapshot)
+        """
+
+        assert self.snapshot_dir is not None
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+        previous = self._load_snapshot()
+
+        headers = {}
+        if previous is not None:
+            state = self._load_state()
+            if state.get("etag"):
+                headers["If-None-Match"] = state["etag"]
+            if state.get("last_modified"):
+                headers["If-Modified-Since"] = state["last_modified"]
+
+        samples = self._process_html(headers)
+
+        if self.not_modified:
+            self.df = self._set_dtypes(previous)
+
+            return diff_snapshots(previous, previous)
+
+        if self.request_failed:
+            raise Exception("MillardLab table wasn't downloaded")
+
+        self.df = self._create_df(samples)
+
+        if previous is None:
+            previous = pd.DataFrame(columns=self.columns)
+
+        diff = diff_snapshots(previous, self.df)
+        logger.debug(
+            "%d added, %d removed and %d changed accessions",
+            len(diff.added),
+            len(diff.removed),
+            len(diff.changed),
+        )
+
+        self._save_snapshot(self.df, self.response_headers)
+
+        return diff
 
     def to_csv(self) -> None:
         """
@@ -145,3 +447,13 @@ class MillardLabPhagesCrawler:
         self.to_df()
 
         self.df.to_csv(self.csv_name, index=False)
+
+    def to_parquet(self) -> None:
+        """
+        Return DataFrame as Parquet file with numeric columns
+        (filename format: millardlab_<YYYY:MM:DD>.parquet)
+        """
+
+        self.to_df()
+
+        to_parquet(self.df, self.parquet_name)
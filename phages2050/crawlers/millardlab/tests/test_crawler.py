@@ -0,0 +1,121 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from phages2050.crawlers.millardlab.crawler import (
+    MillardLabPhagesCrawler,
+    MillardLabRecord,
+)
+
+
+def _row(accession, description, classification, length, gc):
+    return (
+        "<tr>"
+        f'<td class="column-1"><a href="#">{accession}</a></td>'
+        f'<td class="column-2">{description}</td>'
+        f'<td class="column-3">{classification}</td>'
+        f'<td class="column-4">{length}</td>'
+        f'<td class="column-5">{gc}</td>'
+        "</tr>"
+    )
+
+
+HTML = (
+    "<html><body><table>"
+    "<thead><tr><th>Accession</th><th>Description</th></tr></thead><tbody>"
+    + _row("nc_001604 ", "Enterobacteria phage T7", "Autographiviridae", 39937, 48.4)
+    # Broken row without Classification cell
+    + '<tr><td class="column-1"><a>NC_000866</a></td>'
+    '<td class="column-2">Enterobacteria phage T4</td>'
+    '<td class="column-4">168903</td><td class="column-5">35.3</td></tr>'
+    + _row("NC_001416", "Escherichia phage <i>Lambda</i>", "Siphoviridae", 48502, 49.9)
+    + "</tbody></table></body></html>"
+).encode("utf-8")
+
+
+def test_parse_rows_flags_broken_rows_without_shifting_columns():
+    """
+    This test check if the streaming parser (fed with small chunks)
+    returns normalised records and skips the broken row
+    instead of shifting the next columns
+    """
+
+    crawler = MillardLabPhagesCrawler(url="http://localhost")
+    chunks = (HTML[i : i + 16] for i in range(0, len(HTML), 16))
+
+    records = list(crawler._parse_rows(chunks))
+
+    assert records == [
+        MillardLabRecord(
+            "NC_001604", "ENTEROBACTERIA PHAGE T7", "AUTOGRAPHIVIRIDAE", "39937", "48.4"
+        ),
+        MillardLabRecord(
+            "NC_001416", "ESCHERICHIA PHAGE LAMBDA", "SIPHOVIRIDAE", "48502", "49.9"
+        ),
+    ]
+
+    assert len(crawler.broken_rows) == 1
+    assert crawler.broken_rows[0]["cells"][0] == "NC_000866"
+
+
+def test_update_returns_diff_and_uses_conditional_requests(tmp_path):
+    """
+    This test check if the incremental mode returns added, removed
+    and changed accessions and doesn't parse the table again
+    when the server responds with 304 Not Modified
+    """
+
+    page = {"html": HTML, "etag": '"v1"'}
+    requests_headers = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_headers.append(dict(self.headers))
+
+            if self.headers.get("If-None-Match") == page["etag"]:
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("ETag", page["etag"])
+            self.end_headers()
+            self.wfile.write(page["html"])
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    host, port = httpd.server_address
+
+    crawler = MillardLabPhagesCrawler(
+        url=f"http://{host}:{port}/", snapshot_dir=str(tmp_path)
+    )
+
+    try:
+        diff = crawler.update()
+        assert diff.accessions == ["NC_001416", "NC_001604"]
+
+        page["html"] = (
+            "<table>"
+            + _row("NC_001604", "Enterobacteria phage T7", "Podoviridae", 39937, 48.4)
+            + _row("NC_002371", "Salmonella phage P22", "Podoviridae", 41724, 47.1)
+            + "</table>"
+        ).encode("utf-8")
+        page["etag"] = '"v2"'
+
+        diff = crawler.update()
+        assert crawler.bytes_read == len(page["html"])
+        assert list(diff.added["Accession"]) == ["NC_002371"]
+        assert list(diff.removed["Accession"]) == ["NC_001416"]
+        assert list(diff.changed["Accession"]) == ["NC_001604"]
+        assert diff.accessions == ["NC_001604", "NC_002371"]
+        assert requests_headers[-1]["If-None-Match"] == '"v1"'
+
+        diff = crawler.update()
+        assert diff.is_empty()
+        assert crawler.not_modified
+        assert list(crawler.df["Accession"]) == ["NC_001604", "NC_002371"]
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
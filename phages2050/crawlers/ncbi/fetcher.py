@@ -0,0 +1,351 @@
+import os
+import time
+import asyncio
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Set
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from phages2050 import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class RetryableError(Exception):
+    """
+    Temporary NCBI E-utilities error (rate limit or server error)
+    """
+
+
+class RateLimiter:
+    """
+    Asyncio rate limiter which spreads requests evenly
+    to respect the requests per second limit
+    """
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Wait for the next free request slot
+        """
+
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+
+            self.next_slot = max(now, self.next_slot) + self.interval
+
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+
+class NCBISequenceFetcher:
+    """
+    Concurrent fetcher of bacteriophage genomes and proteomes in FASTA
+    format from NCBI Nucleotide database (E-utilities efetch)
+
+    Accessions are requested in batches (many IDs per request) through pooled
+    HTTP connections with the rate limit required by NCBI (3 requests per
+    second, 10 with API key). Temporary errors are retried with exponential
+    backoff. Each of the accession is saved as separate FASTA file:
+    - <output_dir>/genome/<accession>.fasta - complete genome sequence
+    - <output_dir>/proteome/<accession>.fasta - translated coding sequences
+
+    Completed accessions are appended to <output_dir>/<kind>.progress file,
+    so the interrupted run fetches only the remaining accessions
+
+    Example usage:
+
+        from phages2050.crawlers.ncbi.fetcher import NCBISequenceFetcher
+
+        fetcher = NCBISequenceFetcher(output_dir="ncbi", email="user@example.com")
+        fetcher.fetch(ml_pc.to_df()["Accession"], kind="genome")
+        fetcher.fetch(ml_pc.to_df()["Accession"], kind="proteome")
+
+        # In the running event loop (e.g. Jupyter notebook)
+        await fetcher.fetch_async(ml_pc.to_df()["Accession"], kind="genome")
+    """
+
+    EFETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+    RETTYPES = {"genome": "fasta", "proteome": "fasta_cds_aa"}
+    RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        output_dir: str = "ncbi",
+        email: str = None,
+        api_key: str = None,
+        batch_size: int = 50,
+        concurrency: int = 3,
+        requests_per_second: float = None,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        timeout: int = 120,
+        url: str = EFETCH_URL,
+    ):
+        assert batch_size >= 1 and concurrency >= 1
+
+        self.output_dir = Path(output_dir)
+        self.email = email
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second or (10 if api_key else 3)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.url = url
+
+        # Connection pool shared by all the worker threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @staticmethod
+    def _normalize(accession: str) -> str:
+        """
+        Return accession in uppercase format without version
+        """
+
+        return accession.strip().upper().split(".")[0]
+
+    @staticmethod
+    def _get_accession(header: str) -> str:
+        """
+        Return normalized accession of the sequence from the FASTA header
+        (>NC_001604.1 ... or >lcl|NC_001604.1_prot_NP_041954.1_1 ...)
+        """
+
+        sequence_id = header[1:].split()[0]
+        sequence_id = sequence_id.split("|")[-1]
+        sequence_id = sequence_id.split("_prot_")[0].split("_cds_")[0]
+
+        return NCBISequenceFetcher._normalize(sequence_id)
+
+    def _get_progress_path(self, kind: str) -> Path:
+        return self.output_dir / f"{kind}.progress"
+
+    def _load_progress(self, kind: str) -> Set[str]:
+        """
+        Return set of accessions fetched by the previous runs
+        """
+
+        path = self._get_progress_path(kind)
+        if not path.exists():
+            return set()
+
+        with open(path) as handle:
+            return {line.strip() for line in handle if line.strip()}
+
+    def _save_progress(self, kind: str, accessions: Iterable[str]) -> None:
+        """
+        Append completed accessions to the progress file
+        """
+
+        with open(self._get_progress_path(kind), "a") as handle:
+            handle.writelines(f"{accession}\n" for accession in accessions)
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def _get_params(self, batch: List[str], kind: str) -> Dict:
+        params = {
+            "db": "nuccore",
+            "id": ",".join(batch),
+            "rettype": self.RETTYPES[kind],
+            "retmode": "text",
+        }
+        if self.email:
+            params["email"] = self.email
+        if self.api_key:
+            params["api_key"] = self.api_key
+
+        return params
+
+    def _download_batch(self, batch: List[str], kind: str) -> Set[str]:
+        """
+        Request single batch of accessions and stream the response
+        into FASTA files, return set of accessions found in the response
+
+        Files are written with .part suffix and renamed after the whole
+        response was received
+        """
+
+        requested = {self._normalize(accession): accession for accession in batch}
+        kind_dir = self.output_dir / kind
+        handles = {}
+
+        try:
+            with self.session.post(
+                self.url,
+                data=self._get_params(batch, kind),
+                stream=True,
+                timeout=self.timeout,
+            ) as response:
+                if response.status_code in self.RETRYABLE_STATUS_CODES:
+                    raise RetryableError(f"Status code: {response.status_code}")
+                if response.status_code != 200:
+                    raise Exception(f"Invalid status code: {response.status_code}")
+
+                # E-utilities responses are plain text without charset
+                response.encoding = response.encoding or "utf-8"
+
+                handle = None
+                with instrumentation.stage("ncbi.download_batch") as stage:
+                    for line in response.iter_lines(decode_unicode=True):
+                        stage.add(bytes_read=len(line) + 1)
+
+                        if line.startswith(">"):
+                            accession = self._get_accession(line)
+
+                            if accession not in requested:
+                                logger.debug("Unexpected sequence: %s", line)
+                                handle = None
+                                continue
+
+                            if accession not in handles:
+                                handles[accession] = open(
+                                    kind_dir / f"{requested[accession]}.fasta.part",
+                                    "w",
+                                )
+                                stage.add(items=1)
+                            handle = handles[accession]
+
+                        if handle is not None and line:
+                            handle.write(f"{line}\n")
+        except requests.exceptions.RequestException as e:
+            raise RetryableError(str(e))
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+        for accession in handles:
+            part_path = kind_dir / f"{requested[accession]}.fasta.part"
+            os.replace(part_path, kind_dir / f"{requested[accession]}.fasta")
+
+        return {requested[accession] for accession in handles}
+
+    async def _fetch_batch(
+        self,
+        batch: List[str],
+        kind: str,
+        executor: ThreadPoolExecutor,
+        semaphore: asyncio.Semaphore,
+        rate_limiter: RateLimiter,
+    ) -> Set[str]:
+        """
+        Fetch single batch with retries and exponential backoff
+        """
+
+        loop = asyncio.get_running_loop()
+
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await rate_limiter.acquire()
+
+                try:
+                    return await loop.run_in_executor(
+                        executor, self._download_batch, batch, kind
+                    )
+                except RetryableError as e:
+                    if attempt == self.max_retries:
+                        raise
+
+                    delay = self.backoff * 2**attempt
+                    logger.debug("Retry in %ss after error: %s", delay, e)
+                    await asyncio.sleep(delay)
+
+    async def _fetch(self, accessions: List[str], kind: str) -> Dict:
+        """
+        Fetch all the batches concurrently and save progress
+        as soon as each of the batch is completed
+        """
+
+        batches = [
+            accessions[start : start + self.batch_size]
+            for start in range(0, len(accessions), self.batch_size)
+        ]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        rate_limiter = RateLimiter(self.requests_per_second)
+
+        fetched = []
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            tasks = [
+                self._fetch_batch(batch, kind, executor, semaphore, rate_limiter)
+                for batch in batches
+            ]
+
+            for task in asyncio.as_completed(tasks):
+                found = await task
+                self._save_progress(kind, found)
+                fetched.extend(found)
+
+        missing = sorted(set(accessions) - set(fetched))
+        if missing:
+            logger.debug("%d accessions were not found", len(missing))
+
+        return {"fetched": sorted(fetched), "missing": missing}
+
+    async def fetch_async(
+        self, accessions: Iterable[str], kind: str = "genome", refetch: bool = False
+    ) -> Dict:
+        """
+        Fetch genomes (kind="genome") or proteomes (kind="proteome") of the
+        accessions which weren't fetched before and return dict with
+        lists of "fetched" and "missing" (not found) accessions
+
+        If refetch is True then accessions are fetched again even if they
+        were fetched before (e.g. changed accessions from SnapshotDiff)
+        """
+
+        assert kind in self.RETTYPES
+
+        os.makedirs(self.output_dir / kind, exist_ok=True)
+
+        done = set() if refetch else self._load_progress(kind)
+        pending = list(
+            dict.fromkeys(a.strip() for a in accessions if a.strip() not in done)
+        )
+        logger.debug(
+            "%d accessions fetched before, %d pending", len(done), len(pending)
+        )
+
+        if not pending:
+            return {"fetched": [], "missing": []}
+
+        return await self._fetch(pending, kind)
+
+    def fetch(
+        self, accessions: Iterable[str], kind: str = "genome", refetch: bool = False
+    ) -> Dict:
+        """
+        Blocking version of fetch_async, which can be called also from
+        the running event loop (e.g. Jupyter notebook), then the fetch
+        runs on a new event loop in a separate thread
+        """
+
+        coroutine = self.fetch_async(accessions, kind=kind, refetch=refetch)
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coroutine).result()
+
+    def close(self) -> None:
+        """
+        Close pooled HTTP connections
+        """
+
+        self.session.close()
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from phages2050.crawlers.ncbi.fetcher import NCBISequenceFetcher
+
+
+@pytest.fixture
+def stub_server():
+    """
+    Local stub of E-utilities efetch which answers the first request
+    with 429 status code (rate limit) and records requested IDs
+    """
+
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            params = parse_qs(self.rfile.read(length).decode("utf-8"))
+            requests.append(params)
+
+            if len(requests) == 1:
+                self.send_response(429)
+                self.end_headers()
+                return
+
+            ids = [i for i in params["id"][0].split(",") if i != "MISSING"]
+            if params["rettype"][0] == "fasta":
+                body = "".join(f">{i}.1 phage {i}\nACGT\nTTGA\n" for i in ids)
+            else:
+                body = "".join(
+                    f">lcl|{i}.1_prot_X_{n} [gene={n}]\nMAK\n\n"
+                    for i in ids
+                    for n in range(2)
+                )
+
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(body.encode("utf-8"))
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    host, port = httpd.server_address
+    yield f"http://{host}:{port}/efetch.fcgi", requests
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_genomes_and_proteomes_with_resume(stub_server, tmp_path):
+    """
+    This test check if accessions are fetched in batches (after retry),
+    saved as separate FASTA files and not fetched again by the next run
+    """
+
+    url, requests = stub_server
+    accessions = ["NC_001604", "NC_001416", "NC_000866", "MISSING", "MN908947"]
+
+    fetcher = NCBISequenceFetcher(
+        output_dir=str(tmp_path),
+        batch_size=2,
+        requests_per_second=100,
+        backoff=0.01,
+        url=url,
+    )
+
+    result = fetcher.fetch(accessions, kind="genome")
+
+    assert result["missing"] == ["MISSING"]
+    assert sorted(result["fetched"]) == sorted(set(accessions) - {"MISSING"})
+    # One retried request and three batches
+    assert len(requests) == 4
+    assert (tmp_path / "genome" / "NC_001604.fasta").read_text() == (
+        ">NC_001604.1 phage NC_001604\nACGT\nTTGA\n"
+    )
+
+    # Already fetched accessions are skipped
+    result = fetcher.fetch(accessions, kind="genome")
+    assert result["fetched"] == [] and len(requests) == 5
+    assert requests[-1]["id"] == ["MISSING"]
+
+    fetcher.fetch(["NC_001604"], kind="proteome")
+    proteome = (tmp_path / "proteome" / "NC_001604.fasta").read_text()
+    assert proteome.count(">lcl|NC_001604.1_prot_") == 2
+
+
+def test_fetch_in_running_event_loop(stub_server, tmp_path):
+    """
+    This test check if fetch can be called from the running event loop
+    (e.g. Jupyter notebook) and fetch_async can be awaited there
+    """
+
+    url, requests = stub_server
+
+    fetcher = NCBISequenceFetcher(
+        output_dir=str(tmp_path),
+        requests_per_second=100,
+        backoff=0.01,
+        url=url,
+    )
+
+    async def notebook_cell():
+        genomes = fetcher.fetch(["NC_001604"], kind="genome")
+        proteomes = await fetcher.fetch_async(["NC_001604"], kind="proteome")
+
+        return genomes, proteomes
+
+    genomes, proteomes = asyncio.run(notebook_cell())
+
+    assert genomes["fetched"] == proteomes["fetched"] == ["NC_001604"]
+    assert (tmp_path / "proteome" / "NC_001604.fasta").exists()
@@ -0,0 +1,473 @@
+import json
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from scipy.sparse import csr_matrix
+
+from phages2050.embeddings.result import EmbeddingResult
+from phages2050.embeddings.store import EmbeddingStore
+
+
+class IVFIndex:
+    """
+    Approximate nearest neighbour index (inverted file) of embedding vectors
+    (GenomeAvgTransformer, BertEmbedding, ESMEmbedding results)
+
+    Vectors are assigned to the nearest of n_lists centroids (k-means coarse
+    quantizer) and each query is compared only with vectors from nprobe
+    nearest lists. Vectors of the same list are kept in one contiguous
+    array (grown by doubling its capacity), so all the queries which probe
+    the list are scored with single matrix multiplication (BLAS)
+
+    Vectors added before the quantizer is trained are buffered (and searched
+    exactly) until min_train_size vectors (39 x n_lists by default) arrive,
+    or the index is trained explicitly with train on a sample of vectors
+
+    Supported metrics:
+    - cosine - distance is 1 - cosine similarity
+    - l2 - distance is squared euclidean distance
+
+    Example usage:
+
+        index = IVFIndex(n_lists=256, nprobe=8)
+        index.add_result(bert_embedding.transform(df, as_array=True))
+        index.save("bert.ivf.npz")
+
+        ids, distances = index.search(query_vectors, k=10)
+        index.recall(query_vectors, k=10)
+    """
+
+    SUPPORTED_METRICS = ["cosine", "l2"]
+    QUERY_BATCH_SIZE = 1024
+
+    def __init__(
+        self,
+        n_lists: int = 256,
+        nprobe: int = 8,
+        metric: str = "cosine",
+        n_iter: int = 20,
+        train_size: int = 100000,
+        seed: int = 0,
+        min_train_size: int = None,
+    ):
+        assert metric in self.SUPPORTED_METRICS
+        assert n_lists >= 1 and nprobe >= 1
+
+        # k-means needs enough vectors per centroid
+        min_train_size = min_train_size or max(n_lists, min(39 * n_lists, train_size))
+        assert min_train_size >= n_lists
+
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.metric = metric
+        self.n_iter = n_iter
+        self.train_size = train_size
+        self.seed = seed
+        self.min_train_size = min_train_size
+
+        self.centroids = None
+        self.ids: List[str] = []
+
+        # Vectors and rows (positions in ids) of each list, only the first
+        # list_sizes[i] entries of list i are used (the rest is capacity)
+        self.list_vectors: List[np.ndarray] = []
+        self.list_rows: List[np.ndarray] = []
+        self.list_sizes = np.zeros(n_lists, dtype=np.int64)
+
+        # Vectors added before training (rows and vectors)
+        self._untrained: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Return float32 vectors, normalized for cosine metric
+        """
+
+        vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+
+        if self.metric == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.maximum(norms, 1e-12)
+
+        return vectors
+
+    def _scores(self, queries: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """
+        Return query x vector scores (the higher, the closer),
+        for l2 metric ||q||^2 is omitted as it doesn't change the order
+        """
+
+        scores = queries @ vectors.T
+
+        if self.metric == "l2":
+            scores -= 0.5 * np.einsum("ij,ij->i", vectors, vectors)
+
+        return scores
+
+    def _to_distances(self, queries: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        if self.metric == "cosine":
+            return 1.0 - scores
+
+        squared_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        return np.maximum(squared_norms - 2.0 * scores, 0.0)
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Return column indices of k best scores in each row (sorted)
+        """
+
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+
+        return np.take_along_axis(top, order, axis=1)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Return the nearest centroid of each vector
+        """
+
+        return np.concatenate(
+            [
+                np.argmax(self._scores(batch, self.centroids), axis=1)
+                for batch in np.array_split(
+                    vectors, max(1, len(vectors) // self.QUERY_BATCH_SIZE)
+                )
+            ]
+        )
+
+    def train(self, vectors: np.ndarray) -> None:
+        """
+        Train coarse quantizer with k-means on (a sample of) vectors,
+        at least n_lists vectors are required
+        """
+
+        vectors = self._prepare(vectors)
+        random_state = np.random.RandomState(self.seed)
+
+        if len(vectors) < self.n_lists:
+            raise Exception(f"At least {self.n_lists} vectors are required")
+
+        if len(vectors) > self.train_size:
+            vectors = vectors[
+                random_state.choice(len(vectors), self.train_size, replace=False)
+            ]
+
+        self.centroids = vectors[
+            random_state.choice(len(vectors), self.n_lists, replace=False)
+        ].copy()
+
+        for _ in range(self.n_iter):
+            assignment = self._assign(vectors)
+
+            # Sums of the vectors of each list (one-hot matrix product)
+            one_hot = csr_matrix(
+                (
+                    np.ones(len(vectors), dtype=np.float32),
+                    (assignment, np.arange(len(vectors))),
+                ),
+                shape=(self.n_lists, len(vectors)),
+            )
+            sums = np.asarray(one_hot @ vectors, dtype=np.float32)
+            counts = np.bincount(assignment, minlength=self.n_lists)
+
+            # Empty lists are moved to random vectors
+            empty = counts == 0
+            sums[empty] = vectors[random_state.choice(len(vectors), empty.sum())]
+            counts[empty] = 1
+
+            self.centroids = sums / counts[:, None]
+            if self.metric == "cosine":
+                self.centroids = self._prepare(self.centroids)
+
+        self.list_vectors = [
+            np.empty((0, vectors.shape[1]), dtype=np.float32)
+            for _ in range(self.n_lists)
+        ]
+        self.list_rows = [np.empty(0, dtype=np.int64) for _ in range(self.n_lists)]
+        self.list_sizes = np.zeros(self.n_lists, dtype=np.int64)
+
+        # Vectors added before training are assigned to the lists
+        untrained, self._untrained = self._untrained, []
+        for rows, untrained_vectors in untrained:
+            self._append(rows, untrained_vectors)
+
+    def _append(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """
+        Append vectors to their nearest lists, capacity of the list
+        is doubled when it is full (amortized O(1) per vector)
+        """
+
+        lists = self._assign(vectors)
+        order = np.argsort(lists, kind="stable")
+        lists, rows, vectors = lists[order], rows[order], vectors[order]
+
+        changed, starts = np.unique(lists, return_index=True)
+        ends = np.append(starts[1:], len(lists))
+
+        for list_index, start, end in zip(changed, starts, ends):
+            size = self.list_sizes[list_index]
+            new_size = size + end - start
+
+            if new_size > len(self.list_rows[list_index]):
+                capacity = max(new_size, 2 * len(self.list_rows[list_index]), 16)
+
+                list_vectors = np.empty((capacity, vectors.shape[1]), np.float32)
+                list_vectors[:size] = self.list_vectors[list_index][:size]
+                list_rows = np.empty(capacity, dtype=np.int64)
+                list_rows[:size] = self.list_rows[list_index][:size]
+
+                self.list_vectors[list_index] = list_vectors
+                self.list_rows[list_index] = list_rows
+
+            self.list_vectors[list_index][size:new_size] = vectors[start:end]
+            self.list_rows[list_index][size:new_size] = rows[start:end]
+            self.list_sizes[list_index] = new_size
+
+    def add(self, ids: Sequence, vectors: np.ndarray) -> None:
+        """
+        Add vectors with ids, vectors are buffered until the index is trained,
+        which happens automatically when min_train_size vectors are buffered
+        """
+
+        vectors = self._prepare(vectors)
+        assert len(ids) == len(vectors)
+
+        rows = np.arange(len(self.ids), len(self.ids) + len(ids))
+        self.ids.extend(str(vector_id) for vector_id in ids)
+
+        if self.is_trained:
+            self._append(rows, vectors)
+            return
+
+        self._untrained.append((rows, vectors))
+
+        if sum(len(rows) for rows, _ in self._untrained) >= self.min_train_size:
+            self.train(np.vstack([vectors for _, vectors in self._untrained]))
+
+    def add_result(self, result: EmbeddingResult) -> None:
+        self.add(result.ids, result.vectors)
+
+    def add_store(self, store: EmbeddingStore) -> None:
+        """
+        Add all the vectors from the embedding store chunk by chunk
+        """
+
+        for chunk_ids, chunk in store.iter_chunks():
+            self.add(chunk_ids, chunk)
+
+    def _get_list(self, list_index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return rows and vectors of the list (views without capacity)
+        """
+
+        size = self.list_sizes[list_index]
+
+        return self.list_rows[list_index][:size], self.list_vectors[list_index][:size]
+
+    def _get_all(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return rows and vectors of all the lists (or buffered vectors)
+        """
+
+        if self.is_trained:
+            parts = [self._get_list(index) for index in range(self.n_lists)]
+        else:
+            parts = self._untrained
+
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+        return (
+            np.concatenate([rows for rows, _ in parts]),
+            np.vstack([vectors for _, vectors in parts]),
+        )
+
+    def _search_batch(
+        self, queries: np.ndarray, k: int, nprobe: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return rows and scores of k best vectors for the batch of queries
+        """
+
+        probes = self._top_k(self._scores(queries, self.centroids), nprobe)
+
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        for list_index in np.unique(probes):
+            list_rows, list_vectors = self._get_list(list_index)
+            if not len(list_rows):
+                continue
+
+            query_indices = np.nonzero((probes == list_index).any(axis=1))[0]
+
+            scores = np.hstack(
+                [
+                    best_scores[query_indices],
+                    self._scores(queries[query_indices], list_vectors),
+                ]
+            )
+            rows = np.hstack(
+                [
+                    best_rows[query_indices],
+                    np.broadcast_to(list_rows, (len(query_indices), len(list_rows))),
+                ]
+            )
+
+            top = self._top_k(scores, k)
+            best_scores[query_indices] = np.take_along_axis(scores, top, axis=1)
+            best_rows[query_indices] = np.take_along_axis(rows, top, axis=1)
+
+        return best_rows, best_scores
+
+    def _to_result(
+        self, queries: np.ndarray, rows: np.ndarray, scores: np.ndarray
+    ) -> Tuple[List[List[str]], np.ndarray]:
+        """
+        Return ids and distances, missing neighbours (less than k
+        vectors in the probed lists) are skipped
+        """
+
+        distances = self._to_distances(queries, scores)
+        ids = [[self.ids[row] for row in query_rows if row >= 0] for query_rows in rows]
+
+        return ids, distances
+
+    def search(
+        self, queries: np.ndarray, k: int = 10, nprobe: int = None
+    ) -> Tuple[List[List[str]], np.ndarray]:
+        """
+        Return ids (list for each query) and distances (queries x k)
+        of approximate k nearest neighbours (exact before training)
+        """
+
+        assert len(self) > 0
+
+        if not self.is_trained:
+            return self.search_exact(queries, k=k)
+
+        queries = self._prepare(queries)
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+
+        rows, scores = zip(
+            *[
+                self._search_batch(
+                    queries[start : start + self.QUERY_BATCH_SIZE], k, nprobe
+                )
+                for start in range(0, len(queries), self.QUERY_BATCH_SIZE)
+            ]
+        )
+
+        return self._to_result(queries, np.vstack(rows), np.vstack(scores))
+
+    def search_exact(
+        self, queries: np.ndarray, k: int = 10
+    ) -> Tuple[List[List[str]], np.ndarray]:
+        """
+        Return ids and distances of exact k nearest neighbours (brute force)
+        """
+
+        assert len(self) > 0
+
+        queries = self._prepare(queries)
+        all_rows, all_vectors = self._get_all()
+
+        rows, scores = [], []
+        for start in range(0, len(queries), self.QUERY_BATCH_SIZE):
+            batch_scores = self._scores(
+                queries[start : start + self.QUERY_BATCH_SIZE], all_vectors
+            )
+            top = self._top_k(batch_scores, k)
+
+            rows.append(all_rows[top])
+            scores.append(np.take_along_axis(batch_scores, top, axis=1))
+
+        return self._to_result(queries, np.vstack(rows), np.vstack(scores))
+
+    def recall(self, queries: np.ndarray, k: int = 10, nprobe: int = None) -> float:
+        """
+        Return recall@k of approximate search against exact search
+        (fraction of exact neighbours found by the index)
+        """
+
+        approximate, _ = self.search(queries, k=k, nprobe=nprobe)
+        exact, _ = self.search_exact(queries, k=k)
+
+        found = sum(len(set(a) & set(e)) for a, e in zip(approximate, exact))
+
+        return found / sum(len(e) for e in exact)
+
+    def save(self, path: str) -> None:
+        """
+        Save index as NumPy archive (.npz), vectors are saved sorted
+        by list (list i is vectors[offsets[i]:offsets[i + 1]]), untrained
+        index is saved without centroids and offsets (buffered vectors)
+        """
+
+        rows, vectors = self._get_all()
+
+        lists = (
+            {
+                "centroids": self.centroids,
+                "offsets": np.concatenate([[0], np.cumsum(self.list_sizes)]),
+            }
+            if self.is_trained
+            else {}
+        )
+
+        params = {
+            "n_lists": self.n_lists,
+            "nprobe": self.nprobe,
+            "metric": self.metric,
+            "n_iter": self.n_iter,
+            "train_size": self.train_size,
+            "seed": self.seed,
+            "min_train_size": self.min_train_size,
+        }
+
+        with open(path, "wb") as handle:
+            np.savez(
+                handle,
+                params=np.array(json.dumps(params)),
+                ids=np.array(self.ids, dtype=str),
+                vectors=vectors,
+                rows=rows,
+                **lists,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        """
+        Return index loaded from NumPy archive (.npz)
+        """
+
+        if not Path(path).exists():
+            raise Exception(f"Index file {path} doesn't exist")
+
+        with np.load(path) as data:
+            index = cls(**json.loads(str(data["params"])))
+            index.ids = data["ids"].tolist()
+
+            if "centroids" not in data.files:
+                if len(data["rows"]):
+                    index._untrained = [(data["rows"], data["vectors"])]
+
+                return index
+
+            index.centroids = data["centroids"]
+            offsets = data["offsets"]
+            index.list_vectors = np.split(data["vectors"], offsets[1:-1])
+            index.list_rows = np.split(data["rows"], offsets[1:-1])
+            index.list_sizes = np.diff(offsets)
+
+        return index
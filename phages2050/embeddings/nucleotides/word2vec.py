@@ -1,15 +1,8 @@
 import os
 import base64
-from io import BytesIO
-from zipfile import ZipFile
-from typing import Dict
 from pathlib import Path
 
-import requests
-
-from gensim.models.word2vec import Word2Vec
-
-from fake_useragent import UserAgent
+from phages2050.artifacts import ArtifactStore
 
 
 class Word2VecModelManager:
@@ -22,27 +15,13 @@ class Word2VecModelManager:
         "aHR0cHM6Ly9kZWVwcGV0cmkuYWkvc3RhdGljL3BoYWdlczIwNTAv"
         "d29yZDJ2ZWMtZW1iZWRkaW5nLTIxLjA3LjIwMjAuemlw"
     )
-    STATUS_CODE_200 = 200
+    WORD2VEC_FILE_NAME = "word2vec-embedding-21.07.2020.pkl"
 
-    def __init__(self, model_dir: str = "word2vec_model"):
+    def __init__(self, model_dir: str = "word2vec_model", mirror_dir: str = None):
         self.model_dir = model_dir
+        self.store = ArtifactStore(mirror_dir=mirror_dir)
 
-        if not os.path.exists(model_dir):
-            os.mkdir(self.model_dir)
-
-    @staticmethod
-    def _get_headers() -> Dict:
-        """
-        Return header dict with random User-Agent to support request
-        and to avoid being blocked by the server
-        """
-
-        ua = UserAgent()
-        ua.update()
-
-        return {"User-Agent": ua.random}
-
-    def download_model(self) -> Path:
+    def download_model(self, sha256: str = None) -> Path:
         """
         Download Word2Vec pre-trained model and unzip it into directory
 
@@ -50,23 +29,12 @@ class Word2VecModelManager:
         loaded by Word2VecEmbedding class instance
         """
 
-        path = Path(self.model_dir)
-        # If model directory exists then return it immediately
-        if os.path.exists(path) and os.listdir(path):
-            print("[DEBUG] Word2Vec model exists")
-            return path
-        else:
-            print("[DEBUG] Word2Vec model is downloading now")
-
-        headers = self._get_headers()
-
-        with requests.get(self.WORD2VEC_URL, headers=headers) as response:
-            assert response.status_code == self.STATUS_CODE_200
-
-            with ZipFile(BytesIO(response.content)) as zip_file:
-                zip_file.extractall(self.model_dir)
-
-        return path
+        return self.store.fetch(
+            self.WORD2VEC_URL,
+            self.model_dir,
+            sha256=sha256,
+            expected=[self.WORD2VEC_FILE_NAME],
+        )
 
 
 class Word2VecEmbedding:
@@ -84,6 +52,9 @@ class Word2VecEmbedding:
         if not os.path.exists(self.model_pkl_file):
             raise Exception("Word2Vec model wasn't downloaded yet")
 
+        # gensim is heavy, so it's imported on demand
+        from gensim.models.word2vec import Word2Vec
+
         self.model = Word2Vec.load(self.model_pkl_file)
         self.feature_space = self.model.vector_size
 
@@ -1,18 +1,17 @@
 import os
 import base64
-from io import BytesIO
-from zipfile import ZipFile
-from typing import List, Dict
+import logging
+from typing import List, Union
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-import requests
 
-from fake_useragent import UserAgent
+from phages2050 import instrumentation
+from phages2050.artifacts import ArtifactStore
+from phages2050.embeddings.result import EmbeddingResult
 
-from bio_embeddings.embed.prottrans_bert_bfd_embedder import ProtTransBertBFDEmbedder
-
-import torch
+logger = logging.getLogger(__name__)
 
 
 class BertModelManager:
@@ -25,27 +24,12 @@ class BertModelManager:
         "aHR0cDovL21haW50ZW5hbmNlLmRhbGxhZ28udXMvcHVibGljL2Vt"
         "YmVkZGluZ3MvZW1iZWRkaW5nX21vZGVscy9iZXJ0L2JlcnQuemlw"
     )
-    STATUS_CODE_200 = 200
 
-    def __init__(self, model_dir: str = "bert_model"):
+    def __init__(self, model_dir: str = "bert_model", mirror_dir: str = None):
         self.model_dir = model_dir
+        self.store = ArtifactStore(mirror_dir=mirror_dir)
 
-        if not os.path.exists(model_dir):
-            os.mkdir(self.model_dir)
-
-    @staticmethod
-    def _get_headers() -> Dict:
-        """
-        Return header dict with random User-Agent to support request
-        and to avoid being blocked by the server
-        """
-
-        ua = UserAgent()
-        ua.update()
-
-        return {"User-Agent": ua.random}
-
-    def download_model(self) -> Path:
+    def download_model(self, sha256: str = None) -> Path:
         """
         Download BERT pre-trained model and unzip it into directory
 
@@ -53,23 +37,13 @@ class BertModelManager:
         loaded by BertEmbedding class instance
         """
 
-        path = Path(self.model_dir) / "bert"
-        # If model directory exists then return it immediately
-        if os.path.exists(path):
-            print("[DEBUG] BERT model exists")
-            return path
-        else:
-            print("[DEBUG] BERT model is downloading now")
-
-        headers = self._get_headers()
-
-        with requests.get(self.BERT_URL, headers=headers) as response:
-            assert response.status_code == self.STATUS_CODE_200
-
-            with ZipFile(BytesIO(response.content)) as zip_file:
-                zip_file.extractall(self.model_dir)
-
-        return path
+        # Model extracted by the previous versions (without marker) is reused
+        return (
+            self.store.fetch(
+                self.BERT_URL, self.model_dir, sha256=sha256, expected=["bert"]
+            )
+            / "bert"
+        )
 
 
 class BertEmbedding:
@@ -85,6 +59,8 @@ class BertEmbedding:
     FEATURE_SPACE = 1024
     SUPPORTED_COLUMNS = ["sequence", "class"]
     SUPPORTED_COLUMNS_AVG = ["sequence", "name"]
+    # Residues per forward pass of embed_batch
+    BATCH_SIZE = 4000
 
     def __init__(self, model_dir: str, cuda_device: int = None):
         """
@@ -96,6 +72,12 @@ class BertEmbedding:
         if not os.path.exists(self.model_dir):
             raise Exception("BERT model wasn't downloaded yet")
 
+        # bio_embeddings and torch are heavy, so they are imported on demand
+        import torch
+        from bio_embeddings.embed.prottrans_bert_bfd_embedder import (
+            ProtTransBertBFDEmbedder,
+        )
+
         self.embedder = ProtTransBertBFDEmbedder(model_directory=self.model_dir)
 
         self.cuda_device = cuda_device
@@ -112,31 +94,68 @@ class BertEmbedding:
 
         self.columns = [f"BERT_{index}" for index in range(self.FEATURE_SPACE)]
 
-    def _get_vectors(self, df: pd.DataFrame, bacteriophage_level: bool = False) -> List:
+    def _get_vectors(
+        self, df: pd.DataFrame, bacteriophage_level: bool = False
+    ) -> np.ndarray:
         """
-        Return the embedding result represented by lists or averaged list with 1024 digits
+        Return the embedding result represented by float32 array (N x 1024)
+        or averaged array (1 x 1024)
         """
 
-        with torch.no_grad():
-            vectors = []
+        import torch
 
-            for protein in df.itertuples():
-                embedding = self.embedder.embed(protein.sequence)
-                protein_vector = self.embedder.reduce_per_protein(embedding)
-                vectors.append(protein_vector)
+        # Vectors are written directly into preallocated array
+        vectors = np.empty((df.shape[0], self.FEATURE_SPACE), dtype=np.float32)
 
-            if bacteriophage_level:
-                print("[DEBUG] Protein vectors are averaging to form a bacteriophage")
+        with torch.no_grad(), instrumentation.stage("bert.forward", items=len(df)):
+            for index, sequence in enumerate(df.sequence):
+                embedding = self.embedder.embed(sequence)
+                vectors[index] = self.embedder.reduce_per_protein(embedding)
 
-                vectors = [
-                    torch.tensor(vectors, device=self.device).mean(dim=0).tolist()
-                ]
+        if bacteriophage_level:
+            logger.debug("Protein vectors are averaging to form a bacteriophage")
+
+            vectors = vectors.mean(axis=0, dtype=np.float64, keepdims=True)
 
         return vectors
 
+    def embed_batch(
+        self, sequences: List[str], batch_size: int = BATCH_SIZE
+    ) -> np.ndarray:
+        """
+        Return the embedding result for list of protein sequences
+        as 2D array (N x 1024)
+
+        Sequences are passed through the model together in batches
+        of at most batch_size residues instead of one by one
+        """
+
+        # bio_embeddings embeds sequences one by one without batch size
+        assert batch_size is not None and batch_size >= 1
+
+        if not sequences:
+            return np.empty((0, self.FEATURE_SPACE), dtype=np.float32)
+
+        import torch
+
+        with torch.no_grad(), instrumentation.stage(
+            "bert.forward", items=len(sequences)
+        ):
+            vectors = [
+                self.embedder.reduce_per_protein(embedding)
+                for embedding in self.embedder.embed_many(
+                    sequences, batch_size=batch_size
+                )
+            ]
+
+        return np.array(vectors, dtype=np.float32)
+
     def transform(
-        self, df: pd.DataFrame, bacteriophage_level: bool = False
-    ) -> pd.DataFrame:
+        self,
+        df: pd.DataFrame,
+        bacteriophage_level: bool = False,
+        as_array: bool = False,
+    ) -> Union[pd.DataFrame, EmbeddingResult]:
         """
         Execute BERT embedding on DataFrame with two supported type of columns:
         - "sequence" and "class"
@@ -145,6 +164,9 @@ class BertEmbedding:
         The first case is expected for single protein vectorization
         The second case is expected for set of proteins which represent
         single bacteriophage
+
+        If as_array is True then EmbeddingResult (float32 array with "class"
+        or "name" values as ids) is returned instead of DataFrame
         """
 
         if bacteriophage_level:
@@ -156,18 +178,21 @@ class BertEmbedding:
             # "sequence" and "class" columns are expected
             assert self.SUPPORTED_COLUMNS == list(df[self.SUPPORTED_COLUMNS].columns)
 
-        data = self._get_vectors(df, bacteriophage_level)
+        vectors = self._get_vectors(df, bacteriophage_level)
         self._set_column_names()
 
-        result_df = pd.DataFrame(data=data, columns=self.columns)
-
         if bacteriophage_level:
             # Set first value as "name" column value
-            result_df[self.SUPPORTED_COLUMNS_AVG[1]] = df[
-                self.SUPPORTED_COLUMNS_AVG[1]
-            ].values[0]
+            id_column = self.SUPPORTED_COLUMNS_AVG[1]
+            ids = df[id_column].values[:1]
         else:
             # Set each "class" column value
-            result_df[self.SUPPORTED_COLUMNS[1]] = df[self.SUPPORTED_COLUMNS[1]].values
+            id_column = self.SUPPORTED_COLUMNS[1]
+            ids = df[id_column].values
+
+        result = EmbeddingResult(ids=ids, vectors=vectors, prefix="BERT")
+
+        if as_array:
+            return result
 
-        return result_df
+        return result.to_df(id_column=id_column, id_first=False)
@@ -1,12 +1,21 @@
 import os
-from typing import List, Dict
+from typing import Dict, List, NamedTuple, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
-import torch
+from phages2050 import instrumentation
+from phages2050.embeddings.result import EmbeddingResult, ResidueEmbeddingResult
 
-import esm
-from esm import FastaBatchedDataset
+
+class ESMRepresentations(NamedTuple):
+    """
+    Mean-pooled (and optionally per-residue) representations of each of the
+    requested layer, computed in a single forward pass of the model
+    """
+
+    mean: Dict[int, EmbeddingResult]
+    residues: Dict[int, ResidueEmbeddingResult]
 
 
 class ESMEmbedding:
@@ -16,6 +25,21 @@ class ESMEmbedding:
     single bacteriophage
 
     In the case of set of proteins the vectorization returns averaged numeric vector
+
+    Several layers (repr_layers list, e.g. [-1, 33]) and per-residue
+    representations (float16, without padding) can be returned
+    from the same forward pass with transform_layers
+
+    Example usage:
+
+        esm_embedding = ESMEmbedding(repr_layers=[34, 33])
+        df = esm_embedding.transform("proteins.fasta")  # the first layer (34)
+
+        representations = esm_embedding.transform_layers(
+            "proteins.fasta", per_residue=True
+        )
+        representations.mean[33].vectors
+        representations.residues[34].get("protein_label")
     """
 
     CPU = "cpu"
@@ -28,14 +52,21 @@ class ESMEmbedding:
         uniref: str = UNIREF50,
         toks_per_batch: int = 4096,
         extra_toks_per_seq: int = 1,
-        repr_layers: int = 34,
+        repr_layers: Union[int, List[int]] = 34,
         cuda_device: int = None,
     ):
+        """
+        Negative repr_layers are counted from the last layer (-1 is the last one)
+        """
+
         self.uniref = uniref
         self.toks_per_batch = toks_per_batch
         self.extra_toks_per_seq = extra_toks_per_seq
         self.repr_layers = repr_layers
 
+        # torch and esm are heavy, so they are imported on demand
+        import torch
+
         # Select GPU card (if you have more than one)
         if cuda_device is not None and torch.cuda.is_available():
             available_devices = self._get_cuda_devices()
@@ -56,6 +87,8 @@ class ESMEmbedding:
         Return dict with cuda devices (id: name) if exists
         """
 
+        import torch
+
         gpu_device_count = torch.cuda.device_count()
 
         return {
@@ -71,6 +104,8 @@ class ESMEmbedding:
         loaded by ESMEmbedding class instance
         """
 
+        import esm
+
         if self.uniref == self.UNIREF50:
             # 34 layer transformer model with 670M params, trained on Uniref50 Sparse.
             self.model, self.alphabet = esm.pretrained.esm1_t34_670M_UR50S()
@@ -82,9 +117,22 @@ class ESMEmbedding:
 
         self.model.cuda(device=self.device)
 
+        self._set_layers()
+
+    def _set_layers(self) -> None:
+        """
+        Set a list with non-negative numbers of the requested model layers
+        """
+
+        repr_layers = (
+            [self.repr_layers]
+            if isinstance(self.repr_layers, int)
+            else list(self.repr_layers)
+        )
+
         self.layers = [
             (i + self.model.num_layers + 1) % (self.model.num_layers + 1)
-            for i in [self.repr_layers]
+            for i in repr_layers
         ]
 
     def _get_data(self, fasta_path):
@@ -94,7 +142,15 @@ class ESMEmbedding:
         Each of the sample label have to be unique, in other case assertion exception is raised
         """
 
-        dataset = FastaBatchedDataset.from_file(fasta_path)
+        import torch
+        from esm import FastaBatchedDataset
+
+        with instrumentation.stage(
+            "esm.read", bytes_read=os.path.getsize(fasta_path)
+        ) as stage:
+            dataset = FastaBatchedDataset.from_file(fasta_path)
+            stage.add(items=len(dataset))
+
         batch_converter = self.alphabet.get_batch_converter()
         batches = dataset.get_batch_indices(
             self.toks_per_batch, self.extra_toks_per_seq
@@ -111,72 +167,159 @@ class ESMEmbedding:
 
         self.columns = [f"ESM_{index}" for index in range(self.FEATURE_SPACE)]
 
-    def _get_vectors(self, batched_data, bacteriophage_level: bool = False) -> List:
+    def _forward(
+        self, batched_data, per_residue: bool = False
+    ) -> Tuple[list, Dict[int, np.ndarray], Dict[int, Tuple[List, np.ndarray]]]:
         """
-        Return the embedding result represented by lists or averaged list with 1280 digits
+        Return labels, mean representation (float32 array N x 1280) of each
+        of the layer and optionally per-residue representation (lengths and
+        flat float16 array) of each of the layer, all from one forward pass
+
+        Labels are in the model order (proteins are batched by length)
         """
 
-        protein_tensors = []
+        import torch
+
+        labels, lengths = [], []
+        means = {layer: [] for layer in self.layers}
+        residues = {layer: [] for layer in self.layers}
+
+        with torch.no_grad(), instrumentation.stage("esm.forward") as stage:
+            for batch_idx, (batch_labels, strs, toks) in enumerate(batched_data):
+                stage.add(items=len(batch_labels))
 
-        with torch.no_grad():
-            for batch_idx, (labels, strs, toks) in enumerate(batched_data):
                 toks = toks.to(device=self.device, non_blocking=True)
 
                 out = self.model(toks, repr_layers=self.layers)
 
-                representations = {
-                    layer: t.to(device=self.device)
-                    for layer, t in out["representations"].items()
-                }
-
-                for i, label in enumerate(labels):
-                    result = {
-                        "label": label,
-                        "mean_representations": {
-                            layer: t[i, 1: len(strs[i]) + 1].mean(0)
-                            for layer, t in representations.items()
-                        },
-                    }
-
-                    protein_tensors.append(result)
-
-        mean_representations = [
-            tensor["mean_representations"][self.repr_layers]
-            for tensor in protein_tensors
-        ]
-        vectors = torch.stack(mean_representations, dim=0)
+                labels.extend(batch_labels)
+                batch_lengths = [len(sequence) for sequence in strs]
+                lengths.extend(batch_lengths)
+
+                for layer in self.layers:
+                    t = out["representations"][layer]
+
+                    # Beginning of sequence token and padding are skipped
+                    segments = [
+                        t[i, 1 : length + 1] for i, length in enumerate(batch_lengths)
+                    ]
+
+                    means[layer].append(
+                        torch.stack([segment.mean(0) for segment in segments])
+                    )
+
+                    if per_residue:
+                        # One float16 copy to CPU memory for the whole batch
+                        residues[layer].append(torch.cat(segments).half().cpu().numpy())
+
+        # Empty FASTA file, there is nothing to concatenate
+        if not labels:
+            empty = np.empty((0, self.FEATURE_SPACE), dtype=np.float32)
+
+            return (
+                labels,
+                {layer: empty for layer in self.layers},
+                (
+                    {layer: ([], empty.astype(np.float16)) for layer in self.layers}
+                    if per_residue
+                    else {}
+                ),
+            )
+
+        means = {
+            layer: torch.cat(tensors).float().cpu().numpy()
+            for layer, tensors in means.items()
+        }
+
+        if not per_residue:
+            return labels, means, {}
+
+        return (
+            labels,
+            means,
+            {
+                layer: (lengths, np.concatenate(arrays))
+                for layer, arrays in residues.items()
+            },
+        )
+
+    def _get_vectors(
+        self, batched_data, bacteriophage_level: bool = False
+    ) -> Tuple[list, np.ndarray]:
+        """
+        Return labels and the embedding result of the first layer
+        represented by float32 array (N x 1280) or averaged array (1 x 1280)
+
+        Labels are in the model order (proteins are batched by length)
+        """
+
+        labels, means, _ = self._forward(batched_data)
+        vectors = means[self.layers[0]]
 
         # Organism level
         if bacteriophage_level:
-            vectors = vectors.mean(dim=0).reshape(1, -1)
+            vectors = vectors.mean(axis=0, dtype=np.float32).reshape(1, -1)
 
-        return vectors.cpu().numpy()
+        return labels, vectors
+
+    def transform_layers(
+        self, fasta_path: str, per_residue: bool = False
+    ) -> ESMRepresentations:
+        """
+        Execute transformer embedding based on FASTA input file and return
+        mean-pooled EmbeddingResult of each of the repr_layers (and
+        ResidueEmbeddingResult if per_residue is True) with FASTA labels as ids
+
+        Results are keyed by non-negative layer number (e.g. -1 -> 34)
+        """
+
+        batched_data = self._get_data(fasta_path)
+        labels, means, residues = self._forward(batched_data, per_residue)
+
+        return ESMRepresentations(
+            mean={
+                layer: EmbeddingResult(ids=labels, vectors=vectors, prefix="ESM")
+                for layer, vectors in means.items()
+            },
+            residues={
+                layer: ResidueEmbeddingResult(
+                    ids=labels,
+                    vectors=vectors,
+                    offsets=np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]),
+                    prefix="ESM",
+                )
+                for layer, (lengths, vectors) in residues.items()
+            },
+        )
 
     def transform(
-        self, fasta_path: str, bacteriophage_level: bool = False
-    ) -> pd.DataFrame:
+        self, fasta_path: str, bacteriophage_level: bool = False, as_array: bool = False
+    ) -> Union[pd.DataFrame, EmbeddingResult]:
         """
         Execute transformer embedding directly based on FASTA input file
 
         The first case is expected for single protein vectorization
         The second case is expected for set of proteins which represent
         single bacteriophage
+
+        Rows are in the model order (proteins are batched by length), so
+        each of them is identified by FASTA label ("name" column) or by
+        FASTA file name in the second case. If as_array is True then
+        EmbeddingResult (float32 array with the same ids) is returned
+        instead of DataFrame
         """
 
         fname, ext = os.path.splitext(os.path.basename(fasta_path))
 
         batched_data = self._get_data(fasta_path)
-        data = self._get_vectors(batched_data, bacteriophage_level)
+        labels, vectors = self._get_vectors(batched_data, bacteriophage_level)
         self._set_column_names()
 
-        result_df = pd.DataFrame(data, columns=self.columns)
+        ids = [fname] if bacteriophage_level else labels
 
-        if bacteriophage_level:
-            result_df.insert(0, "name", [fname])
-        else:
-            proteins_count = result_df.shape[0]
-            result_df.insert(
-                0, "name", [f"protein_{index}" for index in range(proteins_count)]
-            )
+        result = EmbeddingResult(ids=ids, vectors=vectors, prefix="ESM")
+
+        if as_array:
+            return result
 
-        return result_df
+        return result.to_df(id_column="name")
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from phages2050.embeddings.proteins.bert import BertEmbedding
+
+
+class StubEmbedder:
+    """
+    Replacement of bio_embeddings embedder which records batch sizes
+    """
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def embed_many(self, sequences, batch_size=None):
+        self.batch_sizes.append(batch_size)
+
+        return [np.full((len(sequence), 1024), len(sequence)) for sequence in sequences]
+
+    @staticmethod
+    def reduce_per_protein(embedding):
+        return embedding.mean(axis=0)
+
+
+def test_embed_batch_passes_residue_budget():
+    """
+    This test check if sequences are embedded together with batch
+    size of residues instead of one by one (batch_size=None)
+    """
+
+    pytest.importorskip("torch")
+
+    embedding = BertEmbedding.__new__(BertEmbedding)
+    embedding.embedder = StubEmbedder()
+
+    vectors = embedding.embed_batch(["MKV", "MKVLA"])
+
+    assert embedding.embedder.batch_sizes == [BertEmbedding.BATCH_SIZE]
+    assert vectors.shape == (2, 1024) and vectors.dtype == np.float32
+    assert vectors[:, 0].tolist() == [3, 5]
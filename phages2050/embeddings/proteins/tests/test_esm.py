@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+
+from phages2050.embeddings.proteins.esm import ESMEmbedding
+
+PADDING_IDX = 1
+CLS_IDX = 0
+
+
+class StubAlphabet:
+    """
+    Replacement of esm Alphabet which prepends the beginning of sequence
+    token and pads the batch to the longest sequence
+    """
+
+    def get_batch_converter(self):
+        import torch
+
+        def convert(raw_batch):
+            labels, strs = zip(*raw_batch)
+            toks = torch.full(
+                (len(strs), max(len(sequence) for sequence in strs) + 1),
+                PADDING_IDX,
+                dtype=torch.int64,
+            )
+            for i, sequence in enumerate(strs):
+                toks[i, 0] = CLS_IDX
+                toks[i, 1 : len(sequence) + 1] = 2
+
+            return list(labels), list(strs), toks
+
+        return convert
+
+
+class StubModel:
+    """
+    Replacement of esm model, representation of the token is equal
+    to 100 * layer + position (and -1000 for the padding)
+    """
+
+    num_layers = 4
+    embed_dim = 3
+
+    def __init__(self):
+        self.repr_layers = []
+
+    def __call__(self, toks, repr_layers):
+        import torch
+
+        self.repr_layers.append(list(repr_layers))
+
+        positions = torch.arange(toks.shape[1], dtype=torch.float32)
+        positions = positions.expand(toks.shape[0], -1).unsqueeze(-1)
+        padding = (toks == PADDING_IDX).unsqueeze(-1)
+
+        return {
+            "representations": {
+                layer: torch.where(
+                    padding,
+                    torch.tensor(-1000.0),
+                    positions + 100 * layer,
+                ).expand(-1, -1, self.embed_dim)
+                for layer in repr_layers
+            }
+        }
+
+
+def get_embedding(batches):
+    """
+    Return ESMEmbedding with the stub model which reads given batches
+    """
+
+    import torch
+
+    embedding = ESMEmbedding.__new__(ESMEmbedding)
+    embedding.device = torch.device("cpu")
+    embedding.model = StubModel()
+    embedding.alphabet = StubAlphabet()
+    embedding.repr_layers = [-1, 2]
+    embedding._set_layers()
+
+    convert = embedding.alphabet.get_batch_converter()
+    embedding._get_data = lambda fasta_path: [convert(batch) for batch in batches]
+
+    return embedding
+
+
+def test_transform_layers_per_residue():
+    """
+    This test check if mean and per-residue representations of each
+    of the requested layer are returned from one forward pass per batch
+    without the beginning of sequence token and padding
+    """
+
+    pytest.importorskip("torch")
+
+    embedding = get_embedding([[("p1", "MK"), ("p2", "MKVL")], [("p3", "MKV")]])
+
+    representations = embedding.transform_layers("proteins.fasta", per_residue=True)
+
+    assert embedding.layers == [4, 2]
+    assert embedding.model.repr_layers == [[4, 2], [4, 2]]
+    assert sorted(representations.mean) == sorted(representations.residues) == [2, 4]
+
+    for layer in [4, 2]:
+        mean = representations.mean[layer]
+        residues = representations.residues[layer]
+
+        assert mean.ids == residues.ids == ["p1", "p2", "p3"]
+        assert mean.vectors[:, 0].tolist() == [
+            100 * layer + 1.5,
+            100 * layer + 2.5,
+            100 * layer + 2,
+        ]
+
+        assert residues.offsets.tolist() == [0, 2, 6, 9]
+        assert residues.vectors.shape == (9, 3)
+        assert residues.get("p2")[:, 0].tolist() == [
+            100 * layer + position for position in [1, 2, 3, 4]
+        ]
+        assert residues.get("p3")[:, 0].tolist() == [
+            100 * layer + position for position in [1, 2, 3]
+        ]
+
+
+def test_transform_layers_empty():
+    """
+    This test check if empty results are returned for FASTA file without proteins
+    """
+
+    pytest.importorskip("torch")
+
+    embedding = get_embedding([])
+
+    representations = embedding.transform_layers("empty.fasta", per_residue=True)
+
+    for layer in [4, 2]:
+        assert len(representations.mean[layer].vectors) == 0
+        assert len(representations.residues[layer]) == 0
+        assert representations.residues[layer].offsets.tolist() == [0]
+
+
+def test_transform_names_rows_with_fasta_labels():
+    """
+    This test check if DataFrame rows (in the model order) are named
+    with FASTA labels like the ids of the array result
+    """
+
+    pytest.importorskip("torch")
+
+    embedding = get_embedding([[("p2", "MKVL")], [("p1", "MK")]])
+
+    df = embedding.transform("proteins.fasta")
+    result = embedding.transform("proteins.fasta", as_array=True)
+
+    assert df["name"].tolist() == result.ids == ["p2", "p1"]
+    assert df["ESM_0"].tolist() == [402.5, 401.5]
@@ -0,0 +1,191 @@
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+class EmbeddingResult:
+    """
+    Embedding result represented by contiguous float32 array (N x feature space)
+    and list of N sample identifiers
+
+    DataFrame with <prefix>_<index> columns is created on demand as a thin
+    view of the array (vectors are not copied)
+
+    Example usage:
+
+        result = bert_embedding.transform(df, as_array=True)
+        result.vectors  # numpy.ndarray (N x 1024), float32
+        result.ids  # e.g. protein classes or names
+        result.to_df()
+    """
+
+    def __init__(self, ids: Sequence, vectors: np.ndarray, prefix: str = "feature"):
+        """
+        Vectors are converted into C-contiguous float32 array,
+        which doesn't copy them if they already have such format
+        (e.g. torch.Tensor.numpy() result on CPU)
+        """
+
+        self.ids = list(ids)
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.prefix = prefix
+
+        assert self.vectors.ndim == 2 and self.vectors.shape[0] == len(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def feature_space(self) -> int:
+        return self.vectors.shape[1]
+
+    @property
+    def columns(self):
+        """
+        Return a list with embedding column names
+        """
+
+        return [f"{self.prefix}_{index}" for index in range(self.feature_space)]
+
+    def to_df(self, id_column: str = "name", id_first: bool = True) -> pd.DataFrame:
+        """
+        Return DataFrame with embedding columns and identifiers column
+        (as the first or the last one)
+        """
+
+        df = pd.DataFrame(data=self.vectors, columns=self.columns, copy=False)
+
+        if id_first:
+            df.insert(0, id_column, self.ids)
+        else:
+            df[id_column] = self.ids
+
+        return df
+
+
+class ResidueEmbeddingResult:
+    """
+    Per-residue embedding result of proteins with different lengths
+
+    Residue vectors of all the proteins are stored in one flat float16
+    array (total residues x feature space) with offsets of each protein
+    (N + 1), so the result is not padded to the longest protein. Vectors
+    of the protein are returned as a view of the flat array
+
+    Example usage:
+
+        representations = esm_embedding.transform_layers(fasta_path, per_residue=True)
+        result = representations.residues[34]
+        result[0]  # numpy.ndarray (protein length x 1280), float16
+        result.get("protein_1")
+        result.mean()  # EmbeddingResult with averaged vectors
+
+        result.save("residues.npz")
+        ResidueEmbeddingResult.load("residues.npz")
+    """
+
+    def __init__(
+        self,
+        ids: Sequence,
+        vectors: np.ndarray,
+        offsets: np.ndarray,
+        prefix: str = "feature",
+    ):
+        self.ids = list(ids)
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float16)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.prefix = prefix
+
+        assert self.vectors.ndim == 2
+        assert len(self.offsets) == len(self.ids) + 1
+        assert self.offsets[0] == 0 and self.offsets[-1] == len(self.vectors)
+        assert np.all(np.diff(self.offsets) >= 0)
+
+        self._positions = None
+
+    @classmethod
+    def from_arrays(
+        cls, ids: Sequence, arrays: List[np.ndarray], prefix: str = "feature"
+    ) -> "ResidueEmbeddingResult":
+        """
+        Create result from a list of (protein length x feature space) arrays
+        """
+
+        lengths = [len(array) for array in arrays]
+        offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+
+        if arrays:
+            vectors = np.concatenate(arrays).astype(np.float16, copy=False)
+        else:
+            vectors = np.empty((0, 0), dtype=np.float16)
+
+        return cls(ids=ids, vectors=vectors, offsets=offsets, prefix=prefix)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.vectors[self.offsets[index] : self.offsets[index + 1]]
+
+    @property
+    def feature_space(self) -> int:
+        return self.vectors.shape[1]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def get(self, sample_id) -> np.ndarray:
+        """
+        Return residue vectors of the protein with given id
+        """
+
+        if self._positions is None:
+            self._positions = {
+                sample_id: index for index, sample_id in enumerate(self.ids)
+            }
+
+        return self[self._positions[sample_id]]
+
+    def mean(self) -> EmbeddingResult:
+        """
+        Return EmbeddingResult with average residue vector of each protein
+        (float32, zeros for empty protein)
+        """
+
+        sums = np.zeros((len(self), self.feature_space), dtype=np.float32)
+        lengths = self.lengths
+        non_empty = lengths > 0
+
+        if non_empty.any():
+            # Sum of each non-empty protein segment at once
+            sums[non_empty] = np.add.reduceat(
+                self.vectors, self.offsets[:-1][non_empty], axis=0, dtype=np.float32
+            )
+            sums[non_empty] /= lengths[non_empty, None]
+
+        return EmbeddingResult(ids=self.ids, vectors=sums, prefix=self.prefix)
+
+    def save(self, path: str) -> None:
+        """
+        Save ids, flat vectors and offsets as uncompressed .npz file
+        """
+
+        np.savez(
+            path,
+            ids=np.array([str(sample_id) for sample_id in self.ids]),
+            vectors=self.vectors,
+            offsets=self.offsets,
+            prefix=np.array(self.prefix),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ResidueEmbeddingResult":
+        with np.load(path) as data:
+            return cls(
+                ids=data["ids"].tolist(),
+                vectors=data["vectors"],
+                offsets=data["offsets"],
+                prefix=str(data["prefix"]),
+            )
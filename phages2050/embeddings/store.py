@@ -0,0 +1,306 @@
+import io
+import os
+import csv
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from phages2050.embeddings.result import EmbeddingResult
+
+
+class EmbeddingStore:
+    """
+    Persistent, append-only store of embedding vectors (BERT, ESM, Word2Vec)
+
+    Vectors are saved in fixed-size chunk files (chunk_<index>.npy) which are
+    memory-mapped, so only the requested rows are read from the disk. Each of
+    the vector is identified by unique sequence id and described by SHA-1 hash
+    of the sequence and the name of the model which produced it (index.tsv)
+
+    Directory layout:
+    - meta.json - feature space, dtype (float16 or float32) and chunk size
+    - index.tsv - id, sequence hash, model name, chunk and row of each vector
+    - chunk_<index>.npy - vectors (chunk size x feature space)
+
+    Example usage:
+
+        store = EmbeddingStore("bert_store", feature_space=1024)
+        store.append_result(bert_embedding.transform(df, as_array=True), model="bert")
+
+        vectors = store.get(["protein_1", "protein_2"])
+    """
+
+    META_NAME = "meta.json"
+    INDEX_NAME = "index.tsv"
+    SUPPORTED_DTYPES = ["float16", "float32"]
+
+    def __init__(
+        self,
+        root_dir: str,
+        feature_space: int = None,
+        dtype: str = None,
+        chunk_size: int = None,
+    ):
+        """
+        Existing store is opened with its own parameters (given parameters
+        have to match them), new store requires feature_space and is
+        created with float32 dtype and 65536 vectors per chunk by default
+        """
+
+        self.root_dir = Path(root_dir)
+        meta_path = self.root_dir / self.META_NAME
+
+        if meta_path.exists():
+            with open(meta_path) as handle:
+                meta = json.load(handle)
+
+            for name, value in [
+                ("feature_space", feature_space),
+                ("dtype", dtype),
+                ("chunk_size", chunk_size),
+            ]:
+                if value is not None and value != meta[name]:
+                    raise Exception(
+                        f"Store {root_dir} has {name} {meta[name]}, not {value}"
+                    )
+        else:
+            if feature_space is None:
+                raise Exception("Feature space is required for the new store")
+
+            dtype = dtype or "float32"
+            chunk_size = chunk_size or 65536
+
+            assert dtype in self.SUPPORTED_DTYPES and chunk_size >= 1
+
+            meta = {
+                "feature_space": feature_space,
+                "dtype": dtype,
+                "chunk_size": chunk_size,
+            }
+
+            os.makedirs(self.root_dir, exist_ok=True)
+            with open(meta_path, "w") as handle:
+                json.dump(meta, handle)
+
+        self.feature_space = meta["feature_space"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.chunk_size = meta["chunk_size"]
+
+        self._chunks = {}
+        self._load_index()
+
+    @staticmethod
+    def get_hash(sequence: str) -> str:
+        """
+        Return SHA-1 hash of normalized sequence
+        """
+
+        return hashlib.sha1(sequence.upper().strip().encode("utf-8")).hexdigest()
+
+    def _load_index(self) -> None:
+        """
+        Load location (chunk, row), hash and model of each vector,
+        incomplete last line of the index is skipped (the index is opened
+        read-only, the line is truncated by the next append)
+        """
+
+        self._locations: Dict[str, Tuple[int, int]] = {}
+        self._hashes: Dict[str, str] = {}
+        self._models: Dict[str, str] = {}
+        self._ids_by_hash: Dict[str, str] = {}
+
+        # Size of the complete lines, if the index ends with incomplete one
+        self._index_end: Optional[int] = None
+
+        index_path = self.root_dir / self.INDEX_NAME
+        if not index_path.exists():
+            return
+
+        with open(index_path, "rb") as handle:
+            content = handle.read()
+
+        # Crash in the middle of append can leave incomplete last line
+        complete = content.rfind(b"\n") + 1
+        if complete < len(content):
+            self._index_end = complete
+
+        lines = io.StringIO(content[:complete].decode("utf-8"), newline="")
+
+        for vector_id, sequence_hash, model, chunk, row in csv.reader(
+            lines, delimiter="\t"
+        ):
+            self._add_to_index(vector_id, sequence_hash, model, int(chunk), int(row))
+
+    def _add_to_index(
+        self, vector_id: str, sequence_hash: str, model: str, chunk: int, row: int
+    ) -> None:
+        self._locations[vector_id] = (chunk, row)
+        self._hashes[vector_id] = sequence_hash
+        self._models[vector_id] = model
+
+        if sequence_hash:
+            self._ids_by_hash.setdefault(sequence_hash, vector_id)
+
+    def _get_chunk(self, chunk: int, writable: bool = False) -> np.memmap:
+        """
+        Return memory-mapped chunk, new chunk file is created if needed
+        """
+
+        path = self.root_dir / f"chunk_{chunk:05d}.npy"
+
+        if writable:
+            if not path.exists():
+                return np.lib.format.open_memmap(
+                    path,
+                    mode="w+",
+                    dtype=self.dtype,
+                    shape=(self.chunk_size, self.feature_space),
+                )
+
+            return np.load(path, mmap_mode="r+")
+
+        if chunk not in self._chunks:
+            self._chunks[chunk] = np.load(path, mmap_mode="r")
+
+        return self._chunks[chunk]
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def __contains__(self, vector_id: str) -> bool:
+        return vector_id in self._locations
+
+    @property
+    def ids(self) -> List[str]:
+        """
+        Return ids in the order of appending
+        """
+
+        return list(self._locations)
+
+    def get_id(self, sequence: str) -> Optional[str]:
+        """
+        Return id of the vector computed for the same sequence (or None),
+        so the sequence doesn't have to be embedded again
+        """
+
+        return self._ids_by_hash.get(self.get_hash(sequence))
+
+    def append(
+        self,
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        model: str,
+        sequences: Sequence[str] = None,
+    ) -> None:
+        """
+        Append vectors (N x feature space) with unique ids, the name of the
+        model and (optionally) sequences which are saved as hashes
+
+        Vectors are written to the chunk files before the index, so the
+        interrupted append never exposes incomplete vectors
+        """
+
+        ids = [str(vector_id) for vector_id in ids]
+        vectors = np.asarray(vectors)
+
+        assert vectors.ndim == 2 and vectors.shape == (len(ids), self.feature_space)
+        assert sequences is None or len(sequences) == len(ids)
+
+        duplicates = {vector_id for vector_id in ids if vector_id in self._locations}
+        if duplicates or len(set(ids)) != len(ids):
+            raise Exception(f"Ids already exist in the store: {sorted(duplicates)}")
+
+        hashes = (
+            [self.get_hash(sequence) for sequence in sequences]
+            if sequences is not None
+            else [""] * len(ids)
+        )
+
+        start = len(self._locations)
+        positions = np.arange(start, start + len(ids))
+        chunks, rows = positions // self.chunk_size, positions % self.chunk_size
+
+        for chunk in np.unique(chunks):
+            mask = chunks == chunk
+
+            chunk_array = self._get_chunk(int(chunk), writable=True)
+            chunk_array[rows[mask]] = vectors[mask].astype(self.dtype, copy=False)
+            chunk_array.flush()
+            del chunk_array
+
+        index_path = self.root_dir / self.INDEX_NAME
+
+        # Incomplete last line is removed, so the append starts from a new line
+        if self._index_end is not None:
+            with open(index_path, "rb+") as handle:
+                handle.truncate(self._index_end)
+            self._index_end = None
+
+        with open(index_path, "a", newline="") as handle:
+            writer = csv.writer(handle, delimiter="\t")
+
+            for vector_id, sequence_hash, chunk, row in zip(ids, hashes, chunks, rows):
+                writer.writerow([vector_id, sequence_hash, model, chunk, row])
+                self._add_to_index(vector_id, sequence_hash, model, chunk, row)
+
+    def append_result(
+        self, result: EmbeddingResult, model: str, sequences: Sequence[str] = None
+    ) -> None:
+        """
+        Append vectors from the embedding result (as_array=True)
+        """
+
+        self.append(result.ids, result.vectors, model=model, sequences=sequences)
+
+    def get(self, ids: Sequence[str]) -> np.ndarray:
+        """
+        Return vectors (N x feature space) in the order of ids, only
+        the requested rows are read from the memory-mapped chunks
+        """
+
+        locations = np.array(
+            [self._locations[str(vector_id)] for vector_id in ids], dtype=np.int64
+        ).reshape(-1, 2)
+
+        vectors = np.empty((len(locations), self.feature_space), dtype=self.dtype)
+
+        for chunk in np.unique(locations[:, 0]):
+            mask = locations[:, 0] == chunk
+            vectors[mask] = self._get_chunk(int(chunk))[locations[mask, 1]]
+
+        return vectors
+
+    def get_metadata(self, ids: Sequence[str] = None) -> pd.DataFrame:
+        """
+        Return DataFrame with id, hash and model of the vectors
+        (all of them by default)
+        """
+
+        ids = self.ids if ids is None else [str(vector_id) for vector_id in ids]
+
+        return pd.DataFrame(
+            {
+                "id": ids,
+                "hash": [self._hashes[vector_id] for vector_id in ids],
+                "model": [self._models[vector_id] for vector_id in ids],
+            }
+        )
+
+    def iter_chunks(self) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """
+        Yield ids and memory-mapped vectors chunk by chunk,
+        so the whole store is processed with bounded memory
+        """
+
+        ids = self.ids
+
+        for start in range(0, len(ids), self.chunk_size):
+            chunk_ids = ids[start : start + self.chunk_size]
+            chunk = self._get_chunk(start // self.chunk_size)
+
+            yield chunk_ids, chunk[: len(chunk_ids)]
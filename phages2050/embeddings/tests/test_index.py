@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from phages2050.embeddings.index import IVFIndex
+from phages2050.embeddings.result import EmbeddingResult
+
+
+def _get_clustered_vectors(n: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    random_state = np.random.RandomState(seed)
+    centers = random_state.normal(size=(20, dim)) * 5
+
+    return centers[random_state.randint(20, size=n)] + random_state.normal(
+        size=(n, dim)
+    )
+
+
+def test_incremental_search_and_recall(tmp_path):
+    """
+    This test check if vectors added in batches are found by approximate
+    search with high recall and the index is the same after reloading
+    """
+
+    vectors = _get_clustered_vectors(2000)
+    ids = [f"phage_{index}" for index in range(2000)]
+
+    index = IVFIndex(n_lists=16, nprobe=4, metric="l2")
+    index.add_result(EmbeddingResult(ids[:1500], vectors[:1500]))
+    index.add(ids[1500:], vectors[1500:])
+
+    assert len(index) == 2000
+
+    neighbours, distances = index.search(vectors[[10, 1800]], k=5)
+
+    assert [n[0] for n in neighbours] == ["phage_10", "phage_1800"]
+    assert distances.shape == (2, 5) and np.all(np.diff(distances, axis=1) >= 0)
+
+    queries = _get_clustered_vectors(100, seed=1)
+    assert index.recall(queries, k=10) > 0.9
+    assert index.recall(queries, k=10, nprobe=16) == 1.0
+
+    index.save(tmp_path / "index.npz")
+    loaded = IVFIndex.load(tmp_path / "index.npz")
+
+    assert loaded.search(queries, k=10)[0] == index.search(queries, k=10)[0]
+
+
+def test_cosine_metric():
+    """
+    This test check if cosine distance ignores vector length
+    """
+
+    index = IVFIndex(n_lists=2, nprobe=2, metric="cosine")
+    index.add(["x", "y", "z"], [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+
+    neighbours, distances = index.search([[10.0, 0.5]], k=3)
+
+    assert neighbours == [["x", "z", "y"]]
+    assert distances[0, 0] < 0.01
+
+
+def test_small_batches_before_training():
+    """
+    This test check if the first small batches are buffered (and searched
+    exactly) without shrinking the number of lists, and vectors added
+    after training are found right after each insert
+    """
+
+    vectors = _get_clustered_vectors(1000)
+    ids = [f"phage_{index}" for index in range(1000)]
+
+    index = IVFIndex(n_lists=16, nprobe=16, metric="l2", min_train_size=500)
+
+    with pytest.raises(Exception):
+        index.train(vectors[:10])
+
+    index.add(ids[:10], vectors[:10])
+
+    assert not index.is_trained
+    assert index.search(vectors[[3]], k=1)[0] == [["phage_3"]]
+
+    for start in range(10, 1000, 70):
+        index.add(ids[start : start + 70], vectors[start : start + 70])
+        last = min(start + 69, 999)
+
+        assert index.search(vectors[[last]], k=1)[0] == [[f"phage_{last}"]]
+
+    assert index.is_trained and index.n_lists == 16
+    assert index.list_sizes.sum() == 1000
+    assert index.recall(vectors[::50], k=10) == 1.0
+
+
+def test_untrained_index_round_trip(tmp_path):
+    """
+    This test check if the index with less than min_train_size vectors
+    (and the empty one) is saved with its buffered vectors, searched
+    after reloading and trained when more vectors are added
+    """
+
+    vectors = _get_clustered_vectors(600)
+    ids = [f"phage_{index}" for index in range(600)]
+
+    IVFIndex(n_lists=16).save(tmp_path / "empty.npz")
+    assert len(IVFIndex.load(tmp_path / "empty.npz")) == 0
+
+    index = IVFIndex(n_lists=16, nprobe=16, metric="l2", min_train_size=500)
+    index.add(ids[:100], vectors[:100])
+    index.save(tmp_path / "index.npz")
+
+    loaded = IVFIndex.load(tmp_path / "index.npz")
+
+    assert not loaded.is_trained and len(loaded) == 100
+    assert loaded.search(vectors[:5], k=3)[0] == index.search(vectors[:5], k=3)[0]
+
+    loaded.add(ids[100:], vectors[100:])
+
+    assert loaded.is_trained and loaded.list_sizes.sum() == 600
+    assert loaded.search(vectors[[42]], k=1)[0] == [["phage_42"]]
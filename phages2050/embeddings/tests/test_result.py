@@ -0,0 +1,70 @@
+import numpy as np
+
+from phages2050.embeddings.result import EmbeddingResult, ResidueEmbeddingResult
+
+
+def test_float32_vectors_are_not_copied():
+    """
+    This test check if contiguous float32 array is used without copy
+    and DataFrame view has named columns with ids
+    """
+
+    vectors = np.random.RandomState(0).normal(size=(3, 4)).astype(np.float32)
+
+    result = EmbeddingResult(ids=["a", "b", "c"], vectors=vectors, prefix="ESM")
+
+    assert result.vectors is vectors
+
+    df = result.to_df()
+
+    assert list(df.columns) == ["name", "ESM_0", "ESM_1", "ESM_2", "ESM_3"]
+    assert df["name"].tolist() == ["a", "b", "c"]
+    assert np.shares_memory(df["ESM_0"].values, vectors)
+
+
+def test_float64_vectors_are_converted():
+    """
+    This test check if float64 vectors are converted into float32
+    """
+
+    result = EmbeddingResult(ids=[0, 1], vectors=np.ones((2, 3)))
+
+    assert result.vectors.dtype == np.float32
+    assert result.vectors.flags["C_CONTIGUOUS"]
+    assert result.to_df(id_column="class", id_first=False).columns[-1] == "class"
+
+
+def test_residue_vectors_are_stored_without_padding(tmp_path):
+    """
+    This test check if per-residue vectors of proteins with different
+    lengths are stored as one float16 array and restored after save
+    """
+
+    random_state = np.random.RandomState(0)
+    arrays = [random_state.normal(size=(length, 4)) for length in [3, 0, 5, 1]]
+
+    result = ResidueEmbeddingResult.from_arrays(
+        ["a", "b", "c", "d"], arrays, prefix="ESM"
+    )
+
+    assert result.vectors.shape == (9, 4)
+    assert result.vectors.dtype == np.float16
+    assert result.lengths.tolist() == [3, 0, 5, 1]
+    assert np.shares_memory(result[2], result.vectors)
+    np.testing.assert_allclose(result.get("c"), arrays[2], atol=1e-2)
+
+    mean = result.mean()
+    assert mean.columns[0] == "ESM_0"
+    np.testing.assert_allclose(
+        mean.vectors,
+        [array.mean(axis=0) if len(array) else np.zeros(4) for array in arrays],
+        atol=1e-2,
+    )
+
+    result.save(str(tmp_path / "residues.npz"))
+    loaded = ResidueEmbeddingResult.load(str(tmp_path / "residues.npz"))
+
+    assert loaded.ids == result.ids
+    assert loaded.prefix == "ESM"
+    np.testing.assert_array_equal(loaded.vectors, result.vectors)
+    np.testing.assert_array_equal(loaded.offsets, result.offsets)
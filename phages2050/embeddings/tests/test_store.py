@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from phages2050.embeddings.result import EmbeddingResult
+from phages2050.embeddings.store import EmbeddingStore
+
+
+def test_append_and_get_across_chunks(tmp_path):
+    """
+    This test check if vectors appended in batches are spread over
+    chunks and returned in the requested order after reopening
+    """
+
+    vectors = np.random.RandomState(0).normal(size=(10, 4)).astype(np.float32)
+    ids = [f"protein_{index}" for index in range(10)]
+
+    store = EmbeddingStore(tmp_path / "store", feature_space=4, chunk_size=4)
+    store.append(ids[:3], vectors[:3], model="bert", sequences=["MKV", "MKA", "MKL"])
+    store.append_result(EmbeddingResult(ids[3:], vectors[3:]), model="esm")
+
+    store = EmbeddingStore(tmp_path / "store")
+
+    assert len(store) == 10 and "protein_7" in store
+    assert len(list((tmp_path / "store").glob("chunk_*.npy"))) == 3
+
+    order = [9, 0, 5, 3, 4]
+    np.testing.assert_array_equal(store.get([ids[i] for i in order]), vectors[order])
+
+    assert store.get_id("mka") == "protein_1"
+    assert store.get_metadata(["protein_0", "protein_9"])["model"].tolist() == [
+        "bert",
+        "esm",
+    ]
+
+    chunks = list(store.iter_chunks())
+    assert [len(chunk_ids) for chunk_ids, _ in chunks] == [4, 4, 2]
+    np.testing.assert_array_equal(np.vstack([c for _, c in chunks]), vectors)
+
+
+def test_float16_store_and_duplicates(tmp_path):
+    """
+    This test check if float16 store keeps half precision vectors,
+    rejects ids which already exist and conflicting dtype
+    """
+
+    store = EmbeddingStore(tmp_path, feature_space=2, dtype="float16")
+    store.append(["a", "b"], np.array([[0.5, 1.0], [2.0, -1.0]]), model="word2vec")
+
+    result = store.get(["b", "a"])
+
+    assert result.dtype == np.float16
+    np.testing.assert_array_equal(result, [[2.0, -1.0], [0.5, 1.0]])
+
+    with pytest.raises(Exception):
+        store.append(["b"], np.zeros((1, 2)), model="word2vec")
+
+    assert len(store) == 2
+
+    # Parameters of the existing store can't be changed
+    assert EmbeddingStore(tmp_path, dtype="float16").dtype == np.float16
+    with pytest.raises(Exception):
+        EmbeddingStore(tmp_path, dtype="float32")
+
+
+def test_incomplete_index_line_is_repaired(tmp_path):
+    """
+    This test check if incomplete last line of the index (interrupted
+    append) is skipped on load without modifying the index and the next
+    append starts from a new line
+    """
+
+    store = EmbeddingStore(tmp_path, feature_space=2)
+    store.append(["a", "b"], np.array([[0.5, 1.0], [2.0, -1.0]]), model="bert")
+
+    with open(tmp_path / EmbeddingStore.INDEX_NAME, "a") as handle:
+        handle.write("c\t\tbe")
+
+    store = EmbeddingStore(tmp_path)
+    assert store.ids == ["a", "b"]
+    assert (tmp_path / EmbeddingStore.INDEX_NAME).read_text().endswith("c\t\tbe")
+
+    store.append(["c"], np.array([[3.0, 3.0]]), model="bert")
+
+    store = EmbeddingStore(tmp_path)
+    assert store.ids == ["a", "b", "c"]
+    np.testing.assert_array_equal(store.get(["c", "a"]), [[3.0, 3.0], [0.5, 1.0]])
@@ -0,0 +1,330 @@
+import json
+from typing import Callable, Iterable, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from sklearn.decomposition import IncrementalPCA
+from sklearn.manifold import TSNE
+from sklearn.random_projection import SparseRandomProjection
+
+from phages2050 import instrumentation
+from phages2050.embeddings.result import EmbeddingResult
+from phages2050.embeddings.store import EmbeddingStore
+from phages2050.features.io.parquet import iter_parquet, to_parquet
+
+Source = Union[
+    EmbeddingStore,
+    EmbeddingResult,
+    np.ndarray,
+    str,
+    Callable[[], Iterable[Tuple[Sequence, np.ndarray]]],
+]
+
+
+class LandmarkProjection:
+    """
+    Scalable 2D/3D projection of DNA embeddings, protein embeddings
+    or features for bacteriophages exploration
+
+    Vectors are streamed chunk by chunk twice, so the whole matrix
+    (e.g. 100k x 1280 ESM embeddings) is never loaded into memory:
+    1. Sparse random projection (optional) and incremental PCA are fitted
+       on each chunk and the landmarks are sampled (reservoir sampling)
+    2. Non-linear layout (t-SNE, or UMAP if umap-learn is installed) is
+       computed only for the landmarks in PCA space
+    3. Each of the vector is projected out-of-sample as inverse distance
+       weighted average of the layout of its nearest landmarks
+
+    Layout "pca" returns the first PCA components without landmarks.
+    Coordinates are saved as Parquet (id, x, y, z) or compact JSON file
+
+    Example usage:
+
+        from phages2050.explore.projection import LandmarkProjection
+
+        projection = LandmarkProjection(n_components=3, n_landmarks=5000)
+        ids, coordinates = projection.fit_transform(EmbeddingStore("esm_store"))
+
+        projection.save("phages_3d.json", ids, coordinates)
+    """
+
+    LAYOUTS = ["tsne", "umap", "pca"]
+    AXES = ["x", "y", "z"]
+    BLOCK_SIZE = 1024
+
+    def __init__(
+        self,
+        n_components: int = 3,
+        layout: str = "tsne",
+        n_pca_components: int = 50,
+        n_random_components: int = None,
+        n_landmarks: int = 5000,
+        n_neighbors: int = 10,
+        perplexity: float = 30.0,
+        chunk_size: int = 10000,
+        seed: int = 0,
+    ):
+        """
+        Vectors are reduced with random projection to n_random_components
+        (if given) before PCA, which speeds up PCA of very wide vectors
+        """
+
+        assert n_components in (2, 3)
+        assert layout in self.LAYOUTS
+        assert n_pca_components >= n_components
+
+        self.n_components = n_components
+        self.layout = layout
+        self.n_pca_components = n_pca_components
+        self.n_random_components = n_random_components
+        self.n_landmarks = n_landmarks
+        self.n_neighbors = n_neighbors
+        self.perplexity = perplexity
+        self.chunk_size = chunk_size
+        self.seed = seed
+
+    def _iter_chunks(self, source: Source) -> Iterator[Tuple[List, np.ndarray]]:
+        """
+        Yield ids and float32 vectors chunk by chunk from EmbeddingStore,
+        EmbeddingResult, array (e.g. memory-mapped), Parquet file (the first
+        column with ids) or callable which returns such chunks
+        """
+
+        if isinstance(source, EmbeddingStore):
+            chunks = source.iter_chunks()
+        elif isinstance(source, str):
+            chunks = (
+                (df.iloc[:, 0].tolist(), df.iloc[:, 1:].to_numpy())
+                for df in iter_parquet(source)
+            )
+        elif callable(source):
+            chunks = source()
+        else:
+            if isinstance(source, EmbeddingResult):
+                ids, vectors = source.ids, source.vectors
+            else:
+                ids, vectors = range(len(source)), source
+
+            chunks = (
+                (
+                    list(ids[start : start + self.chunk_size]),
+                    vectors[start : start + self.chunk_size],
+                )
+                for start in range(0, len(vectors), self.chunk_size)
+            )
+
+        for chunk_ids, chunk in chunks:
+            yield list(chunk_ids), np.asarray(chunk, dtype=np.float32)
+
+    def _reduce(self, vectors: np.ndarray) -> np.ndarray:
+        if self.random_projection is None:
+            return vectors
+
+        return self.random_projection.transform(vectors).astype(np.float32)
+
+    def _sample_landmarks(self, ids: List, vectors: np.ndarray) -> None:
+        """
+        Reservoir sampling of the landmarks, each of the vectors
+        seen so far is a landmark with the same probability
+        """
+
+        positions = self.n_seen + np.arange(len(vectors))
+        self.n_seen += len(vectors)
+
+        # Reservoir is filled with the first vectors
+        filled = positions < self.n_landmarks
+        slots = positions.copy()
+        slots[~filled] = self.random_state.randint(0, positions[~filled] + 1)
+
+        selected = slots < self.n_landmarks
+        # The last assignment wins, like in the sequential algorithm
+        self.landmarks[slots[selected]] = vectors[selected]
+        for slot, index in zip(slots[selected], np.flatnonzero(selected)):
+            self.landmark_ids[slot] = ids[index]
+
+    def _get_layout(self, landmarks: np.ndarray) -> np.ndarray:
+        """
+        Return non-linear layout of the landmarks
+        """
+
+        if self.layout == "umap":
+            # umap-learn is an optional dependency
+            from umap import UMAP
+
+            model = UMAP(n_components=self.n_components, random_state=self.seed)
+        else:
+            model = TSNE(
+                n_components=self.n_components,
+                perplexity=min(self.perplexity, (len(landmarks) - 1) / 3),
+                init="pca",
+                random_state=self.seed,
+            )
+
+        return model.fit_transform(landmarks).astype(np.float32)
+
+    def fit(self, source: Source) -> "LandmarkProjection":
+        """
+        Fit random projection and incremental PCA on streamed chunks,
+        sample the landmarks and compute their layout
+        """
+
+        self.random_state = np.random.RandomState(self.seed)
+        self.random_projection = None
+        self.pca = IncrementalPCA(n_components=self.n_pca_components)
+
+        self.n_seen = 0
+        self.landmarks = None
+        self.landmark_ids = [None] * self.n_landmarks
+
+        # PCA is fitted on batches with at least n_pca_components vectors
+        pending = []
+
+        with instrumentation.stage("projection.fit") as stage:
+            for ids, vectors in self._iter_chunks(source):
+                if not len(vectors):
+                    continue
+
+                if self.n_random_components and self.random_projection is None:
+                    self.random_projection = SparseRandomProjection(
+                        n_components=self.n_random_components,
+                        random_state=self.seed,
+                    ).fit(vectors)
+
+                vectors = self._reduce(vectors)
+
+                if self.landmarks is None:
+                    self.landmarks = np.empty(
+                        (self.n_landmarks, vectors.shape[1]), dtype=np.float32
+                    )
+                self._sample_landmarks(ids, vectors)
+
+                pending.append(vectors)
+                if sum(len(batch) for batch in pending) >= self.n_pca_components:
+                    self.pca.partial_fit(np.vstack(pending))
+                    pending = []
+
+                stage.add(items=len(vectors))
+
+            if not hasattr(self.pca, "components_"):
+                raise Exception(
+                    f"At least {self.n_pca_components} vectors are required"
+                )
+
+            n_landmarks = min(self.n_seen, self.n_landmarks)
+            # Landmarks in PCA space are kept in float64, so the distance
+            # of the landmark to itself is close to 0
+            self.landmarks = self.pca.transform(self.landmarks[:n_landmarks]).astype(
+                np.float64
+            )
+            self.landmark_norms = (self.landmarks**2).sum(axis=1)
+            self.landmark_ids = self.landmark_ids[:n_landmarks]
+
+        with instrumentation.stage("projection.layout", items=n_landmarks):
+            if self.layout == "pca":
+                self.landmark_coordinates = self.landmarks[
+                    :, : self.n_components
+                ].astype(np.float32)
+            else:
+                self.landmark_coordinates = self._get_layout(self.landmarks)
+
+        return self
+
+    def _project_block(self, reduced: np.ndarray) -> np.ndarray:
+        """
+        Return inverse distance weighted average of the layout
+        of the nearest landmarks for each of the reduced vector
+        """
+
+        # Squared Euclidean distances to all the landmarks
+        distances = (
+            (reduced**2).sum(axis=1, keepdims=True)
+            - 2 * reduced @ self.landmarks.T
+            + self.landmark_norms
+        )
+        distances = np.sqrt(np.maximum(distances, 0))
+
+        n_neighbors = min(self.n_neighbors, len(self.landmarks))
+        neighbors = np.argpartition(distances, n_neighbors - 1, axis=1)[:, :n_neighbors]
+        neighbor_distances = np.take_along_axis(distances, neighbors, axis=1)
+
+        # Landmarks (distance 0) keep their own layout coordinates
+        weights = 1 / np.maximum(neighbor_distances, 1e-6)
+        weights /= weights.sum(axis=1, keepdims=True)
+
+        return np.einsum("nk,nkc->nc", weights, self.landmark_coordinates[neighbors])
+
+    def transform_vectors(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Return coordinates of the vectors (N x n_components)
+        """
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        reduced = self.pca.transform(self._reduce(vectors)).astype(np.float64)
+
+        if self.layout == "pca":
+            return reduced[:, : self.n_components].astype(np.float32)
+
+        coordinates = np.empty((len(reduced), self.n_components), dtype=np.float32)
+
+        # Distance matrix of the block (BLOCK_SIZE x n_landmarks) is bounded
+        for start in range(0, len(reduced), self.BLOCK_SIZE):
+            block = reduced[start : start + self.BLOCK_SIZE]
+            coordinates[start : start + self.BLOCK_SIZE] = self._project_block(block)
+
+        return coordinates
+
+    def iter_transform(self, source: Source) -> Iterator[Tuple[List, np.ndarray]]:
+        """
+        Yield ids and coordinates chunk by chunk
+        """
+
+        for ids, vectors in self._iter_chunks(source):
+            with instrumentation.stage("projection.transform", items=len(vectors)):
+                coordinates = self.transform_vectors(vectors)
+
+            yield ids, coordinates
+
+    def fit_transform(self, source: Source) -> Tuple[List, np.ndarray]:
+        """
+        Fit the projection and return ids and coordinates of all the vectors
+        (source is streamed twice)
+        """
+
+        self.fit(source)
+
+        ids, coordinates = [], []
+        for chunk_ids, chunk_coordinates in self.iter_transform(source):
+            ids.extend(chunk_ids)
+            coordinates.append(chunk_coordinates)
+
+        if not coordinates:
+            return ids, np.empty((0, self.n_components), dtype=np.float32)
+
+        return ids, np.vstack(coordinates)
+
+    def save(self, path: str, ids: Sequence, coordinates: np.ndarray) -> None:
+        """
+        Save coordinates as Parquet file (id, x, y, z columns) or as compact
+        JSON file ({"ids": [...], "axes": [...], "coordinates": [x, y, z, ...]})
+        which can be rendered directly by the front end
+        """
+
+        axes = self.AXES[: coordinates.shape[1]]
+
+        if path.endswith(".json"):
+            with open(path, "w") as handle:
+                json.dump(
+                    {
+                        "ids": [str(sample_id) for sample_id in ids],
+                        "axes": axes,
+                        "coordinates": np.round(coordinates, 4).ravel().tolist(),
+                    },
+                    handle,
+                    separators=(",", ":"),
+                )
+        else:
+            df = pd.DataFrame(data=coordinates, columns=axes)
+            df.insert(0, "id", [str(sample_id) for sample_id in ids])
+
+            to_parquet(df, path, float32=True)
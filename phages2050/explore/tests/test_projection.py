@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+
+from phages2050.embeddings.result import EmbeddingResult
+from phages2050.embeddings.store import EmbeddingStore
+from phages2050.explore.projection import LandmarkProjection
+from phages2050.features.io.parquet import read_parquet
+
+
+def _get_clusters(n_samples: int = 1200, n_features: int = 64):
+    """
+    Vectors of 3 well separated clusters with cluster labels
+    """
+
+    random_state = np.random.RandomState(0)
+    centers = random_state.normal(scale=5, size=(3, n_features))
+    labels = random_state.randint(0, 3, n_samples)
+    vectors = centers[labels] + random_state.normal(size=(n_samples, n_features))
+
+    return vectors.astype(np.float32), labels
+
+
+def _get_neighbour_purity(coordinates: np.ndarray, labels: np.ndarray) -> float:
+    """
+    Fraction of points with the same label as their nearest neighbour
+    """
+
+    distances = ((coordinates[:, None] - coordinates[None]) ** 2).sum(axis=2)
+    np.fill_diagonal(distances, np.inf)
+
+    return float((labels[distances.argmin(axis=1)] == labels).mean())
+
+
+def test_landmark_tsne_projection_from_store(tmp_path):
+    """
+    This test check if vectors streamed from EmbeddingStore are projected
+    in 2D with t-SNE layout of the landmarks and clusters are preserved
+    """
+
+    vectors, labels = _get_clusters()
+    ids = [f"phage_{index}" for index in range(len(vectors))]
+
+    store = EmbeddingStore(tmp_path / "store", feature_space=64, chunk_size=256)
+    store.append(ids, vectors, model="esm")
+
+    projection = LandmarkProjection(
+        n_components=2,
+        n_pca_components=10,
+        n_random_components=32,
+        n_landmarks=200,
+        chunk_size=256,
+    )
+    projected_ids, coordinates = projection.fit_transform(store)
+
+    assert projected_ids == ids
+    assert coordinates.shape == (1200, 2) and coordinates.dtype == np.float32
+    assert len(set(projection.landmark_ids)) == 200
+    assert _get_neighbour_purity(coordinates, labels) > 0.95
+
+    # Landmarks keep their layout coordinates
+    rows = [ids.index(landmark_id) for landmark_id in projection.landmark_ids]
+    np.testing.assert_allclose(
+        coordinates[rows], projection.landmark_coordinates, atol=1e-3
+    )
+
+
+def test_pca_projection_is_deterministic_and_saved(tmp_path):
+    """
+    This test check if PCA layout is the same for each run
+    and coordinates are saved as Parquet and compact JSON files
+    """
+
+    vectors, labels = _get_clusters(n_samples=500)
+    result = EmbeddingResult([f"phage_{index}" for index in range(500)], vectors)
+
+    projection = LandmarkProjection(layout="pca", n_pca_components=5, chunk_size=64)
+
+    ids, coordinates = projection.fit_transform(result)
+    _, other_coordinates = LandmarkProjection(
+        layout="pca", n_pca_components=5, chunk_size=64
+    ).fit_transform(result)
+
+    np.testing.assert_array_equal(coordinates, other_coordinates)
+    assert _get_neighbour_purity(coordinates, labels) > 0.95
+
+    projection.save(str(tmp_path / "phages.parquet"), ids, coordinates)
+    df = read_parquet(str(tmp_path / "phages.parquet"))
+    assert df.columns.tolist() == ["id", "x", "y", "z"] and len(df) == 500
+
+    projection.save(str(tmp_path / "phages.json"), ids, coordinates)
+    with open(tmp_path / "phages.json") as handle:
+        data = json.load(handle)
+    assert data["axes"] == ["x", "y", "z"]
+    assert len(data["coordinates"]) == 3 * len(data["ids"])
@@ -0,0 +1,162 @@
+from typing import Tuple
+
+import numpy as np
+
+# Nucleotide codes (case insensitive), any other character is invalid
+INVALID_CODE = 4
+NUCLEOTIDE_CODES = np.full(256, INVALID_CODE, dtype=np.uint8)
+for code, nucleotides in enumerate(["Aa", "Cc", "Gg", "Tt"]):
+    NUCLEOTIDE_CODES[[ord(nucleotide) for nucleotide in nucleotides]] = code
+
+
+def encode_sequence(sequence: str) -> np.ndarray:
+    """
+    Return DNA sequence as array of nucleotide codes
+    (A=0, C=1, G=2, T=3, other characters=4)
+    """
+
+    return NUCLEOTIDE_CODES[
+        np.frombuffer(sequence.encode("ascii", errors="replace"), dtype=np.uint8)
+    ]
+
+
+def get_reverse_complement(codes: np.ndarray) -> np.ndarray:
+    """
+    Return reverse complement of encoded sequence
+    (invalid characters remain invalid)
+    """
+
+    return np.where(codes == INVALID_CODE, INVALID_CODE, 3 - codes)[::-1]
+
+
+def get_kmer_codes(codes: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return 2-bit packed codes (uint64) of all the k-mers (k <= 32) of encoded
+    sequence and mask of valid k-mers (without invalid characters)
+
+    Codes of windows with power of 2 length are built by doubling and
+    combined according to binary representation of k, so the whole
+    sequence is processed O(log k) times instead of k times
+    """
+
+    assert 1 <= k <= 32
+
+    n = len(codes) - k + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=bool)
+
+    invalid = np.concatenate([[0], np.cumsum(codes == INVALID_CODE)])
+    valid = invalid[k:] - invalid[:-k] == 0
+
+    window, size = np.minimum(codes, 3).astype(np.uint64), 1
+    values, values_size = None, 0
+
+    while True:
+        if k & size:
+            if values is None:
+                values, values_size = window, size
+            else:
+                m = len(codes) - values_size - size + 1
+                values = (values[:m] << np.uint64(2 * size)) | window[
+                    values_size : values_size + m
+                ]
+                values_size += size
+
+        if size * 2 > k:
+            break
+
+        window = (window[:-size] << np.uint64(2 * size)) | window[size:]
+        size *= 2
+
+    return values, valid
+
+
+def get_reverse_complement_codes(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Return codes of reverse complements of the k-mer codes, complement is
+    bitwise negation and 2-bit groups are reversed with bit swaps
+    """
+
+    with np.errstate(over="ignore"):
+        x = ~values
+
+        for shift, mask in [
+            (2, 0x3333333333333333),
+            (4, 0x0F0F0F0F0F0F0F0F),
+            (8, 0x00FF00FF00FF00FF),
+            (16, 0x0000FFFF0000FFFF),
+        ]:
+            shift, mask = np.uint64(shift), np.uint64(mask)
+            x = ((x >> shift) & mask) | ((x & mask) << shift)
+
+        x = (x >> np.uint64(32)) | (x << np.uint64(32))
+
+        return x >> np.uint64(64 - 2 * k)
+
+
+def get_canonical_kmer_codes(codes: np.ndarray, k: int) -> np.ndarray:
+    """
+    Return canonical codes (minimum of the k-mer and its reverse complement)
+    of all the valid k-mers of encoded sequence
+    """
+
+    forward, valid = get_kmer_codes(codes, k)
+    forward = forward[valid]
+
+    return np.minimum(forward, get_reverse_complement_codes(forward, k))
+
+
+# Amino acid codes (case insensitive), ambiguous and non-standard amino acids
+# (B, J, O, U, X, Z) share the code of X, any other character is invalid
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+AMBIGUOUS_AMINO_ACID_CODE = len(AMINO_ACIDS)
+INVALID_AMINO_ACID_CODE = AMBIGUOUS_AMINO_ACID_CODE + 1
+AMINO_ACID_CODES = np.full(256, INVALID_AMINO_ACID_CODE, dtype=np.uint8)
+for code, amino_acid in enumerate(AMINO_ACIDS):
+    AMINO_ACID_CODES[[ord(amino_acid), ord(amino_acid.lower())]] = code
+for amino_acid in "BJOUXZ":
+    AMINO_ACID_CODES[[ord(amino_acid), ord(amino_acid.lower())]] = (
+        AMBIGUOUS_AMINO_ACID_CODE
+    )
+
+
+def encode_protein(sequence: str) -> np.ndarray:
+    """
+    Return protein sequence as array of amino acid codes
+    (20 standard amino acids = 0-19, ambiguous = 20, other characters = 21)
+    """
+
+    return AMINO_ACID_CODES[
+        np.frombuffer(sequence.encode("ascii", errors="replace"), dtype=np.uint8)
+    ]
+
+
+def get_ngram_codes(
+    codes: np.ndarray, n: int, alphabet_size: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return codes (uint64, base alphabet_size numbers) of all the n-grams of
+    encoded sequence and mask of valid n-grams (codes < alphabet_size)
+
+    Codes are rolled with Horner's scheme, each step
+    processes the whole sequence at once
+    """
+
+    assert n >= 1 and alphabet_size**n < 2**64
+
+    m = len(codes) - n + 1
+    if m <= 0:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=bool)
+
+    invalid = np.concatenate([[0], np.cumsum(codes >= alphabet_size)])
+    valid = invalid[n:] - invalid[:-n] == 0
+
+    window = np.minimum(codes, alphabet_size - 1).astype(np.uint64)
+    base = np.uint64(alphabet_size)
+
+    values = window[:m].copy()
+    for offset in range(1, n):
+        values *= base
+        values += window[offset : offset + m]
+
+    return values, valid
@@ -0,0 +1,360 @@
+import os
+from functools import cached_property
+from itertools import islice, product
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Mapping, Union
+
+import numpy as np
+import pandas as pd
+
+from Bio.SeqRecord import SeqRecord
+from Bio.SeqIO.FastaIO import FastaIterator
+
+from phages2050 import instrumentation
+from phages2050.features.encoding import (
+    INVALID_CODE,
+    encode_sequence,
+    get_kmer_codes,
+    get_reverse_complement,
+)
+from phages2050.features.extractors.orfs import ORFFinder
+from phages2050.features.io.parquet import ParquetWriter
+
+
+def _get_kmer_names(prefix: str, k: int) -> List[str]:
+    """
+    Return names of all the k-mers in code order (AA..., AC..., ...)
+    """
+
+    return [f"{prefix}_{''.join(kmer)}" for kmer in product("ACGT", repeat=k)]
+
+
+class GenomeFeatureExtractor:
+    """
+    Feature extraction from genome (DNA) sequence for
+    Machine Learning classification or deeper analysis
+
+    Sequence is encoded as integers and all the features are
+    calculated with NumPy bincounts and cumulative sums:
+    - genome length and GC content
+    - GC skew (G - C) / (G + C) and the profile of cumulative GC skew
+      (minimum and maximum with relative positions, windowed skew deviation)
+    - dinucleotide relative abundance (Karlin rho, both strands)
+    - codon usage of ORFs found in both strands
+    - tetranucleotide frequencies
+
+    Example usage:
+
+        from features.extractors.genomes import GenomeFeatureExtractor
+
+        gfe = GenomeFeatureExtractor(genome_sequence=FastaReader('NC_001604.fasta').get_sequence())
+        gfe.get_features()
+    """
+
+    SKEW_FEATURE_NAMES = [
+        "genome_length",
+        "gc_content",
+        "gc_skew",
+        "gc_skew_min",
+        "gc_skew_min_position",
+        "gc_skew_max",
+        "gc_skew_max_position",
+        "gc_skew_window_std",
+    ]
+    DINUCLEOTIDE_NAMES = _get_kmer_names("rho", 2)
+    CODON_NAMES = _get_kmer_names("codon", 3)
+    TETRANUCLEOTIDE_NAMES = _get_kmer_names("tetra", 4)
+
+    FEATURE_NAMES = (
+        SKEW_FEATURE_NAMES + DINUCLEOTIDE_NAMES + CODON_NAMES + TETRANUCLEOTIDE_NAMES
+    )
+
+    def __init__(
+        self,
+        genome_sequence: Union[str, SeqRecord],
+        skew_window: int = 1000,
+        orf_finder: ORFFinder = None,
+    ):
+        self.genome_sequence = self._normalize(genome_sequence)
+        self.skew_window = skew_window
+        self.orf_finder = orf_finder or ORFFinder()
+
+        self.codes = encode_sequence(self.genome_sequence)
+        self.counts = np.bincount(self.codes, minlength=INVALID_CODE + 1)
+
+    @staticmethod
+    def _normalize(source: Union[str, SeqRecord]) -> str:
+        """
+        Normalize each genome sequence
+        to uppercase and without blank chars
+        """
+
+        # If source is a string
+        if isinstance(source, str):
+            entry = source
+        # If source is a BioPython object with seq field
+        else:
+            entry = source.seq
+
+        return str(entry).upper().strip()
+
+    @staticmethod
+    def _get_frequencies(counts: np.ndarray, names: List[str]) -> Mapping[str, float]:
+        total = counts.sum()
+        frequencies = counts / total if total else np.zeros(len(counts))
+
+        return dict(zip(names, frequencies.tolist()))
+
+    def _calculate_gc_features(self) -> Mapping[str, float]:
+        """
+        GC content is the fraction of G and C among valid nucleotides
+
+        GC skew is calculated for the whole genome, its cumulative profile
+        (sum of +1 for G and -1 for C) reaches the minimum near the origin
+        and the maximum near the terminus of replication. Standard deviation
+        of GC skew in windows describes its local variation
+        """
+
+        valid = self.counts[:INVALID_CODE].sum()
+        c, g = self.counts[1], self.counts[2]
+
+        skew_steps = (self.codes == 2).astype(np.int64) - (self.codes == 1)
+        cumulative_skew = np.cumsum(skew_steps)
+        length = max(len(self.codes), 1)
+
+        features = {
+            "genome_length": len(self.codes),
+            "gc_content": (g + c) / valid if valid else 0.0,
+            "gc_skew": (g - c) / (g + c) if g + c else 0.0,
+            "gc_skew_min": 0,
+            "gc_skew_min_position": 0.0,
+            "gc_skew_max": 0,
+            "gc_skew_max_position": 0.0,
+            "gc_skew_window_std": 0.0,
+        }
+
+        if len(cumulative_skew):
+            features.update(
+                {
+                    "gc_skew_min": int(cumulative_skew.min()),
+                    "gc_skew_min_position": cumulative_skew.argmin() / length,
+                    "gc_skew_max": int(cumulative_skew.max()),
+                    "gc_skew_max_position": cumulative_skew.argmax() / length,
+                }
+            )
+
+        # (G - C) and (G + C) of each window from cumulative sums
+        n_windows = len(self.codes) // self.skew_window
+        if n_windows > 1:
+            boundaries = self.skew_window * np.arange(n_windows + 1)
+            gc = np.concatenate([[0], np.cumsum((self.codes == 1) | (self.codes == 2))])
+            skew = np.concatenate([[0], cumulative_skew])
+
+            window_gc = np.diff(gc[boundaries])
+            window_skew = np.diff(skew[boundaries])
+
+            window_skew = window_skew[window_gc > 0] / window_gc[window_gc > 0]
+            features["gc_skew_window_std"] = float(window_skew.std())
+
+        return features
+
+    def _count_kmers(self, codes: np.ndarray, k: int) -> np.ndarray:
+        values, valid = get_kmer_codes(codes, k)
+
+        return np.bincount(values[valid].astype(np.int64), minlength=4**k)
+
+    def _calculate_dinucleotide_relative_abundance(self) -> Mapping[str, float]:
+        """
+        Dinucleotide relative abundance rho(XY) = f(XY) / (f(X) f(Y)) is
+        calculated from the sequence and its reverse complement (Karlin),
+        values different from 1 are the genomic signature of the organism
+        """
+
+        reverse = get_reverse_complement(self.codes)
+
+        mononucleotides = self.counts[:INVALID_CODE] + self.counts[:INVALID_CODE][::-1]
+        dinucleotides = self._count_kmers(self.codes, 2) + self._count_kmers(reverse, 2)
+
+        if not dinucleotides.sum():
+            return dict(zip(self.DINUCLEOTIDE_NAMES, [0.0] * 16))
+
+        f_mono = mononucleotides / mononucleotides.sum()
+        f_di = dinucleotides / dinucleotides.sum()
+
+        expected = np.outer(f_mono, f_mono).ravel()
+        rho = np.divide(f_di, expected, out=np.zeros(16), where=expected > 0)
+
+        return dict(zip(self.DINUCLEOTIDE_NAMES, rho.tolist()))
+
+    def _calculate_codon_usage(self) -> Mapping[str, float]:
+        """
+        Codon usage is the frequency of each codon
+        in the ORFs found in both strands
+        """
+
+        counts = self.orf_finder.count_codons(self.genome_sequence)
+
+        return self._get_frequencies(counts, self.CODON_NAMES)
+
+    def _calculate_tetranucleotide_frequencies(self) -> Mapping[str, float]:
+        """
+        Tetranucleotide frequencies are the frequencies of all
+        256 overlapping 4-mers of the sequence
+        """
+
+        return self._get_frequencies(
+            self._count_kmers(self.codes, 4), self.TETRANUCLEOTIDE_NAMES
+        )
+
+    def get_features(self) -> Mapping[str, Union[int, float]]:
+        """
+        Return full feature space for single genome as Python dict
+        """
+
+        features = self._calculate_gc_features()
+
+        features.update(self._calculate_dinucleotide_relative_abundance())
+
+        features.update(self._calculate_codon_usage())
+
+        features.update(self._calculate_tetranucleotide_frequencies())
+
+        return features
+
+
+def _get_genome_features(genome_sequence: Union[str, SeqRecord]) -> Mapping:
+    return GenomeFeatureExtractor(genome_sequence=genome_sequence).get_features()
+
+
+class MultifastaGenomeFeatureExtractor:
+    """
+    Feature extraction from genomes sequences from multifasta file
+
+    Genomes are processed in parallel (process pool with n_jobs workers),
+    this class allows you to create DataFrame or save it as CSV or Parquet
+
+    Example usage:
+
+        from features.extractors.genomes import MultifastaGenomeFeatureExtractor
+
+        mgfe = MultifastaGenomeFeatureExtractor(fasta_path='genomes.fasta')
+        mgfe.to_df()
+        mgfe.to_csv()
+        mgfe.to_parquet()
+    """
+
+    def __init__(
+        self,
+        fasta_path: str = None,
+        records: Iterable[SeqRecord] = None,
+        n_jobs: int = None,
+    ):
+        """
+        Genomes are read from the FASTA file or
+        taken from the iterable of SeqRecord objects
+        """
+
+        assert (fasta_path is None) != (records is None)
+
+        self.fasta_path = fasta_path
+        self.n_jobs = n_jobs
+
+        self.records = records
+
+    @staticmethod
+    def _fasta_reader(filename: str) -> Iterator:
+        """
+        Read FASTA file content including multifasta format
+        """
+
+        with open(filename) as handle:
+            for record in FastaIterator(handle):
+                yield record
+
+    def _iter_entries(self) -> Iterator:
+        """
+        Yield each entry (genome) from the multifasta or given records
+        one by one, without loading all of them into memory
+        """
+
+        # Records iterable could be already consumed by entries
+        if "entries" in self.__dict__:
+            yield from self.entries
+        elif self.records is not None:
+            yield from self.records
+        else:
+            yield from self._fasta_reader(self.fasta_path)
+
+    @cached_property
+    def entries(self) -> List:
+        """
+        Return all the entries, loaded on the first access
+        """
+
+        return self._get_entries()
+
+    def _get_entries(self) -> List:
+        """
+        Extract each entry (genome) from the multifasta or given records
+        """
+
+        if self.records is not None:
+            return list(self.records)
+
+        with instrumentation.stage(
+            "genome_features.read", bytes_read=os.path.getsize(self.fasta_path)
+        ) as stage:
+            entries = list(self._fasta_reader(self.fasta_path))
+            stage.add(items=len(entries))
+
+        return entries
+
+    def _get_features_df(self, entries: List) -> pd.DataFrame:
+        """
+        Return extracted features from given genomes as DataFrame
+        """
+
+        sequences = [str(entry.seq) for entry in entries]
+
+        with instrumentation.stage(
+            "genome_features.extract", items=len(sequences)
+        ), ProcessPoolExecutor(max_workers=self.n_jobs or os.cpu_count()) as executor:
+            data = list(executor.map(_get_genome_features, sequences, chunksize=8))
+
+        return pd.DataFrame(data=data, columns=GenomeFeatureExtractor.FEATURE_NAMES)
+
+    def to_df(self) -> pd.DataFrame:
+        """
+        Return extracted features from each genomes as DataFrame
+        """
+
+        return self._get_features_df(self.entries)
+
+    def to_csv(self, csv_fname: str) -> None:
+        """
+        Return DataFrame as CSV file
+        (filename format: <csv_fname>.csv)
+        """
+
+        df = self.to_df()
+        df.to_csv(csv_fname, index=False)
+
+    def to_parquet(self, parquet_fname: str, row_group_size: int = 1000) -> None:
+        """
+        Save DataFrame as Parquet file under the given path
+
+        Genomes are read, extracted and saved chunk by chunk
+        (row group with at most row_group_size genomes),
+        so the records iterable is consumed lazily
+        """
+
+        entries = self._iter_entries()
+        chunks = iter(lambda: list(islice(entries, row_group_size)), [])
+
+        with ParquetWriter(parquet_fname) as writer:
+            for chunk in chunks:
+                writer.write(self._get_features_df(chunk))
+
+            # File without genomes still has the features schema
+            if writer.writer is None:
+                writer.write(self._get_features_df([]))
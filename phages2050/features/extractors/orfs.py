@@ -0,0 +1,292 @@
+from typing import Iterable, Iterator, List, NamedTuple, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from Bio import SeqIO
+from Bio.Data.CodonTable import unambiguous_dna_by_id
+from Bio.Seq import Seq
+from Bio.SeqIO.FastaIO import FastaIterator
+from Bio.SeqRecord import SeqRecord
+
+from phages2050 import instrumentation
+from phages2050.features.encoding import (
+    encode_sequence,
+    get_kmer_codes,
+    get_reverse_complement,
+)
+
+
+class ORF(NamedTuple):
+    """
+    Open reading frame predicted in the genome (0-based, end exclusive
+    coordinates on the forward strand, stop codon included)
+    """
+
+    id: str
+    name: str
+    strand: int
+    frame: int
+    start: int
+    end: int
+    protein: str
+
+
+class ORFFinder:
+    """
+    Open reading frame (ORF) finder and translator for bacteriophage genomes
+
+    Genome is encoded as integers and each of the codon as its code
+    (0-63, 64 for codons with invalid characters). Start and stop codons
+    are detected in all six frames at once, the longest ORF (from the first
+    start codon) is called for each stop codon and the proteins are translated
+    in bulk with codon lookup table (bacterial translation table by default).
+    ORFs with invalid characters (e.g. N) are skipped
+
+    Example usage:
+
+        from phages2050.features.extractors.orfs import ORFFinder
+
+        finder = ORFFinder(min_protein_length=30)
+        orfs = finder.find(genome_sequence, name="NC_001604")
+
+        proteins = finder.iter_fasta("genomes.fasta")
+        MultifastaProteinFeatureExtractor(records=proteins).to_df()
+    """
+
+    INVALID_CODON = 64
+    COLUMNS = ["id", "name", "strand", "frame", "start", "end", "sequence"]
+
+    def __init__(
+        self,
+        min_protein_length: int = 30,
+        table_id: int = 11,
+        start_codons: Sequence[str] = ("ATG",),
+    ):
+        """
+        Minimum protein length is given in amino acids (without stop codon),
+        start codons have to be the start codons of the translation table
+        """
+
+        table = unambiguous_dna_by_id[table_id]
+
+        assert min_protein_length >= 1
+        assert set(start_codons) <= set(table.start_codons)
+
+        self.min_protein_length = min_protein_length
+        self.table_id = table_id
+        self.start_codons = list(start_codons)
+
+        # Amino acid (ASCII) of each codon code, X for invalid codons
+        self.amino_acids = np.full(self.INVALID_CODON + 1, ord("X"), dtype=np.uint8)
+        for codon, amino_acid in table.forward_table.items():
+            self.amino_acids[self._get_codon_code(codon)] = ord(amino_acid)
+
+        self.is_stop = np.zeros(self.INVALID_CODON + 1, dtype=bool)
+        self.is_stop[[self._get_codon_code(codon) for codon in table.stop_codons]] = 1
+
+        self.is_start = np.zeros(self.INVALID_CODON + 1, dtype=bool)
+        self.is_start[[self._get_codon_code(codon) for codon in start_codons]] = 1
+
+    @staticmethod
+    def _get_codon_code(codon: str) -> int:
+        values, _ = get_kmer_codes(encode_sequence(codon), 3)
+
+        return int(values[0])
+
+    def _get_codons(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Return code of the codon which starts at each position
+        """
+
+        values, valid = get_kmer_codes(codes, 3)
+
+        return np.where(valid, values, self.INVALID_CODON).astype(np.int64)
+
+    def _locate(self, codons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return starts and stops (positions of stop codons) of ORFs
+        found in all three frames of the strand
+        """
+
+        positions = np.arange(len(codons))
+
+        starts, stops = [], []
+
+        for frame in range(3):
+            frame_positions = positions[frame::3]
+            frame_codons = codons[frame::3]
+
+            frame_starts = frame_positions[self.is_start[frame_codons]]
+            frame_stops = frame_positions[self.is_stop[frame_codons]]
+
+            # The first start codon before each stop codon (the longest ORF)
+            next_stop = np.searchsorted(frame_stops, frame_starts)
+            has_stop = next_stop < len(frame_stops)
+            next_stop, frame_starts = next_stop[has_stop], frame_starts[has_stop]
+
+            _, first = np.unique(next_stop, return_index=True)
+
+            starts.append(frame_starts[first])
+            stops.append(frame_stops[next_stop[first]])
+
+        starts, stops = np.concatenate(starts), np.concatenate(stops)
+        long_enough = (stops - starts) // 3 >= self.min_protein_length
+
+        return starts[long_enough], stops[long_enough]
+
+    @staticmethod
+    def _get_codon_positions(
+        starts: np.ndarray, stops: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return positions of all the codons of ORFs (without stop codons)
+        and offsets of each ORF in the positions array
+        """
+
+        lengths = (stops - starts) // 3
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+        codon_positions = np.repeat(starts - 3 * offsets[:-1], lengths)
+        codon_positions += 3 * np.arange(offsets[-1])
+
+        return codon_positions, offsets
+
+    def _find_strand(self, codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, List]:
+        """
+        Return starts, stops and proteins of ORFs found in the strand,
+        all the proteins are translated at once
+        """
+
+        codons = self._get_codons(codes)
+        starts, stops = self._locate(codons)
+        codon_positions, offsets = self._get_codon_positions(starts, stops)
+
+        amino_acids = self.amino_acids[codons[codon_positions]]
+        # Alternative start codons are translated as methionine
+        amino_acids[offsets[:-1]] = ord("M")
+
+        text = amino_acids.tobytes().decode("ascii")
+        proteins = [text[offsets[i] : offsets[i + 1]] for i in range(len(starts))]
+
+        # ORFs with invalid characters (e.g. N) are skipped
+        valid = np.array(["X" not in protein for protein in proteins], dtype=bool)
+        proteins = [protein for protein in proteins if "X" not in protein]
+
+        return starts[valid], stops[valid], proteins
+
+    def count_codons(self, sequence: str) -> np.ndarray:
+        """
+        Return counts of 64 codons (in code order) of the ORFs
+        found in both strands of the DNA sequence (without stop codons)
+        """
+
+        codes = encode_sequence(str(sequence))
+        counts = np.zeros(self.INVALID_CODON + 1, dtype=np.int64)
+
+        for strand_codes in [codes, get_reverse_complement(codes)]:
+            codons = self._get_codons(strand_codes)
+            codon_positions, _ = self._get_codon_positions(*self._locate(codons))
+
+            counts += np.bincount(
+                codons[codon_positions], minlength=self.INVALID_CODON + 1
+            )
+
+        return counts[: self.INVALID_CODON]
+
+    def find(self, sequence: str, name: str = "genome") -> List[ORF]:
+        """
+        Return ORFs found in both strands of the DNA sequence
+        sorted by the position in the genome
+        """
+
+        codes = encode_sequence(str(sequence))
+        length = len(codes)
+
+        orfs = []
+
+        with instrumentation.stage("orfs.find") as stage:
+            reverse = get_reverse_complement(codes)
+
+            for strand, strand_codes in [(1, codes), (-1, reverse)]:
+                starts, stops, proteins = self._find_strand(strand_codes)
+
+                for start, stop, protein in zip(
+                    starts.tolist(), stops.tolist(), proteins
+                ):
+                    if strand == 1:
+                        orfs.append((start, stop + 3, strand, start % 3, protein))
+                    else:
+                        orfs.append(
+                            (
+                                length - stop - 3,
+                                length - start,
+                                strand,
+                                start % 3,
+                                protein,
+                            )
+                        )
+
+            stage.add(items=len(orfs))
+
+        orfs.sort()
+
+        return [
+            ORF(f"{name}_orf_{index + 1}", name, strand, frame, start, end, protein)
+            for index, (start, end, strand, frame, protein) in enumerate(orfs)
+        ]
+
+    @staticmethod
+    def to_record(orf: ORF) -> SeqRecord:
+        """
+        Return protein as SeqRecord with ORF coordinates in the description
+        """
+
+        strand = "+" if orf.strand == 1 else "-"
+
+        return SeqRecord(
+            Seq(orf.protein),
+            id=orf.id,
+            description=f"{orf.name}:{orf.start}-{orf.end}({strand})",
+        )
+
+    def iter_records(self, genomes: Iterable[SeqRecord]) -> Iterator[SeqRecord]:
+        """
+        Yield protein records of ORFs found in each of the genome record
+        """
+
+        for genome in genomes:
+            for orf in self.find(str(genome.seq), name=genome.id):
+                yield self.to_record(orf)
+
+    def iter_fasta(self, fasta_path: str) -> Iterator[SeqRecord]:
+        """
+        Yield protein records of ORFs found in each of the genome
+        from (multi) FASTA file, genomes are read one by one
+        """
+
+        with open(fasta_path) as handle:
+            yield from self.iter_records(FastaIterator(handle))
+
+    def to_df(self, orfs: Iterable[ORF]) -> pd.DataFrame:
+        """
+        Return DataFrame with ORFs, "sequence" and "name" columns
+        are expected by BertEmbedding (bacteriophage level)
+        """
+
+        return pd.DataFrame(data=list(orfs), columns=self.COLUMNS)
+
+    def to_fasta(
+        self, proteins: Iterable[Union[ORF, SeqRecord]], fasta_path: str
+    ) -> int:
+        """
+        Save proteins as FASTA file (e.g. for ESMEmbedding or
+        StructuralProteinPipeline) and return number of proteins
+        """
+
+        records = (
+            self.to_record(protein) if isinstance(protein, ORF) else protein
+            for protein in proteins
+        )
+
+        return SeqIO.write(records, fasta_path, "fasta")
@@ -1,4 +1,7 @@
-from typing import Mapping, Union, List, Iterator
+import os
+from functools import cached_property
+from itertools import islice
+from typing import Iterable, Mapping, Union, List, Iterator
 
 from Bio.SeqRecord import SeqRecord
 from Bio.SeqUtils.ProtParam import ProteinAnalysis
@@ -6,6 +9,9 @@ from Bio.SeqIO.FastaIO import FastaIterator
 
 import pandas as pd
 
+from phages2050 import instrumentation
+from phages2050.features.io.parquet import ParquetWriter
+
 
 class ProteinFeatureExtractor:
     """
@@ -124,7 +130,7 @@ class ProteinFeatureExtractor:
         with binding partners
         """
 
-        return sum(self.protein_analysis.flexibility())
+        return sum(self.protein_analysis.flexibility(), 0.0)
 
     def _calculate_molar_extinction_coefficient(self) -> Mapping[str, float]:
         """
@@ -187,7 +193,7 @@ class MultifastaProteinFeatureExtractor:
     """
     Feature extraction from proteins sequences from multifasta file
 
-    This class allows you to create DataFrame or save it as CSV
+    This class allows you to create DataFrame or save it as CSV or Parquet
 
     Example usage:
 
@@ -196,12 +202,23 @@ class MultifastaProteinFeatureExtractor:
         mpfe = MultifastaProteinFeatureExtractor(protein_sequence='multifasta-example.fasta')
         mpfe.to_df()
         mpfe.to_csv()
+        mpfe.to_parquet()
+
+        # Proteins predicted by ORFFinder without intermediate FASTA file
+        mpfe = MultifastaProteinFeatureExtractor(records=orf_finder.iter_fasta('genomes.fasta'))
     """
 
-    def __init__(self, fasta_path: str):
+    def __init__(self, fasta_path: str = None, records: Iterable[SeqRecord] = None):
+        """
+        Proteins are read from the FASTA file or
+        taken from the iterable of SeqRecord objects
+        """
+
+        assert (fasta_path is None) != (records is None)
+
         self.fasta_path = fasta_path
 
-        self.entries = self._get_entires()
+        self.records = records
 
     @staticmethod
     def _fasta_reader(filename: str) -> Iterator:
@@ -213,32 +230,68 @@ class MultifastaProteinFeatureExtractor:
             for record in FastaIterator(handle):
                 yield record
 
-    def _get_entires(self) -> List:
+    def _iter_entries(self) -> Iterator:
+        """
+        Yield each entry (protein) from the multifasta or given records
+        one by one, without loading all of them into memory
+        """
+
+        # Records iterable could be already consumed by entries
+        if "entries" in self.__dict__:
+            yield from self.entries
+        elif self.records is not None:
+            yield from self.records
+        else:
+            yield from self._fasta_reader(self.fasta_path)
+
+    @cached_property
+    def entries(self) -> List:
+        """
+        Return all the entries, loaded on the first access
+        """
+
+        return self._get_entries()
+
+    def _get_entries(self) -> List:
         """
-        Extract each entry (protein) from the multifasta
+        Extract each entry (protein) from the multifasta or given records
         """
 
-        entries = list(self._fasta_reader(self.fasta_path))
+        if self.records is not None:
+            return list(self.records)
+
+        with instrumentation.stage(
+            "protein_features.read", bytes_read=os.path.getsize(self.fasta_path)
+        ) as stage:
+            entries = list(self._fasta_reader(self.fasta_path))
+            stage.add(items=len(entries))
 
         return entries
 
-    def to_df(self) -> pd.DataFrame:
+    @staticmethod
+    def _get_features_df(entries: List) -> pd.DataFrame:
         """
-        Return extracted features from each proteins as DataFrame
+        Return extracted features from given proteins as DataFrame
         """
 
         data = []
 
-        for protein_sequence in self.entries:
-            protein_features = ProteinFeatureExtractor(
-                protein_sequence=protein_sequence
-            ).get_features()
+        with instrumentation.stage("protein_features.extract", items=len(entries)):
+            for protein_sequence in entries:
+                protein_features = ProteinFeatureExtractor(
+                    protein_sequence=protein_sequence
+                ).get_features()
+
+                data.append(protein_features)
 
-            data.append(protein_features)
+        return pd.DataFrame(data=data, columns=ProteinFeatureExtractor.FEATURE_NAMES)
 
-        df = pd.DataFrame(data=data, columns=ProteinFeatureExtractor.FEATURE_NAMES)
+    def to_df(self) -> pd.DataFrame:
+        """
+        Return extracted features from each proteins as DataFrame
+        """
 
-        return df
+        return self._get_features_df(self.entries)
 
     def to_csv(self, csv_fname: str) -> None:
         """
@@ -248,3 +301,23 @@ class MultifastaProteinFeatureExtractor:
 
         df = self.to_df()
         df.to_csv(csv_fname, index=False)
+
+    def to_parquet(self, parquet_fname: str, row_group_size: int = 10000) -> None:
+        """
+        Save DataFrame as Parquet file under the given path
+
+        Proteins are read, extracted and saved chunk by chunk
+        (row group with at most row_group_size proteins),
+        so the records iterable is consumed lazily
+        """
+
+        entries = self._iter_entries()
+        chunks = iter(lambda: list(islice(entries, row_group_size)), [])
+
+        with ParquetWriter(parquet_fname) as writer:
+            for chunk in chunks:
+                writer.write(self._get_features_df(chunk))
+
+            # File without proteins still has the features schema
+            if writer.writer is None:
+                writer.write(self._get_features_df([]))
@@ -0,0 +1,58 @@
+import numpy as np
+
+from phages2050.features.extractors.genomes import (
+    GenomeFeatureExtractor,
+    MultifastaGenomeFeatureExtractor,
+)
+
+
+def test_gc_and_kmer_features():
+    """
+    This test check if GC features and tetranucleotide frequencies
+    are equal to the ones counted in Python string
+    """
+
+    sequence = "ggGCCATnATGCGCGTTAGCAAATTTGGGCCCATGC" * 50 + "ATG" + "GCT" * 40 + "TAA"
+
+    features = GenomeFeatureExtractor(genome_sequence=sequence).get_features()
+    sequence = sequence.upper()
+
+    g, c = sequence.count("G"), sequence.count("C")
+    assert features["genome_length"] == len(sequence)
+    assert np.isclose(features["gc_content"], (g + c) / (len(sequence) - 50))
+    assert np.isclose(features["gc_skew"], (g - c) / (g + c))
+
+    tetranucleotides = [
+        sequence[x : x + 4]
+        for x in range(len(sequence) - 3)
+        if "N" not in sequence[x : x + 4]
+    ]
+    assert np.isclose(
+        features["tetra_GCCA"], tetranucleotides.count("GCCA") / len(tetranucleotides)
+    )
+
+    codon_usage = [features[name] for name in GenomeFeatureExtractor.CODON_NAMES]
+    assert np.isclose(sum(codon_usage), 1.0)
+    assert features["codon_TAA"] == features["codon_TAG"] == 0.0
+    assert features["codon_GCT"] > 0.5
+
+    assert list(features) == GenomeFeatureExtractor.FEATURE_NAMES
+
+
+def test_multifasta_genome_features(tmp_path):
+    """
+    This test check if each genome from multifasta file
+    is represented by single row with all the features
+    """
+
+    random_state = np.random.RandomState(0)
+    genomes = ["".join(random_state.choice(list("ACGT"), 5000)) for _ in range(3)]
+
+    fasta = tmp_path / "genomes.fasta"
+    fasta.write_text("".join(f">g{i}\n{genome}\n" for i, genome in enumerate(genomes)))
+
+    df = MultifastaGenomeFeatureExtractor(fasta_path=fasta, n_jobs=2).to_df()
+
+    assert df.shape == (3, len(GenomeFeatureExtractor.FEATURE_NAMES))
+    assert df["genome_length"].tolist() == [5000] * 3
+    assert np.allclose(df["rho_AA"], 1.0, atol=0.2)
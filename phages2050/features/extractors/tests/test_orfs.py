@@ -0,0 +1,71 @@
+import numpy as np
+
+from Bio.Seq import Seq
+
+from phages2050.features.extractors.orfs import ORFFinder
+from phages2050.features.extractors.proteins import MultifastaProteinFeatureExtractor
+
+
+def _find_orfs(sequence: str, min_protein_length: int) -> list:
+    """
+    Return (start, end, protein) of the longest ORFs on the forward strand
+    found codon by codon with Biopython translation
+    """
+
+    orfs = []
+
+    for frame in range(3):
+        start = None
+
+        for position in range(frame, len(sequence) - 2, 3):
+            codon = sequence[position : position + 3]
+
+            if codon == "ATG" and start is None:
+                start = position
+
+            if codon in ("TAA", "TAG", "TGA"):
+                if start is not None and (position - start) // 3 >= min_protein_length:
+                    protein = str(Seq(sequence[start:position]).translate(table=11))
+                    orfs.append((start, position + 3, protein))
+
+                start = None
+
+    return orfs
+
+
+def test_six_frames_orfs_are_translated(tmp_path):
+    """
+    This test check if ORFs from both strands are equal to codon by codon
+    search and translation and proteins are passed to the feature extractor
+    """
+
+    sequence = "".join(np.random.RandomState(0).choice(list("ACGT"), 20000))
+    length = len(sequence)
+
+    expected = _find_orfs(sequence, 30) + [
+        (length - end, length - start, protein)
+        for start, end, protein in _find_orfs(
+            str(Seq(sequence).reverse_complement()), 30
+        )
+    ]
+
+    finder = ORFFinder(min_protein_length=30)
+    orfs = finder.find(sequence, name="phage")
+
+    assert sorted((orf.start, orf.end, orf.protein) for orf in orfs) == sorted(expected)
+    assert [orf.start for orf in orfs] == sorted(orf.start for orf in orfs)
+    assert {orf.strand for orf in orfs} == {1, -1}
+    assert orfs[0].id == "phage_orf_1"
+
+    df = finder.to_df(orfs)
+    assert len(df) == len(orfs) and (df["name"] == "phage").all()
+
+    (tmp_path / "phage.fasta").write_text(f">phage\n{sequence}\n>short\nATGNNNTAA\n")
+    records = list(finder.iter_fasta(tmp_path / "phage.fasta"))
+
+    assert [record.id for record in records] == [orf.id for orf in orfs]
+
+    features = MultifastaProteinFeatureExtractor(records=records[:3]).to_df()
+    assert features["protein_length"].tolist() == [len(orf.protein) for orf in orfs[:3]]
+
+    assert finder.to_fasta(orfs[:2], tmp_path / "proteins.fasta") == 2
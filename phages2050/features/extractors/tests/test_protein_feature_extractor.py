@@ -1,4 +1,12 @@
-from phages2050.features.extractors.proteins import ProteinFeatureExtractor
+import pyarrow.parquet as pq
+
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from phages2050.features.extractors.proteins import (
+    MultifastaProteinFeatureExtractor,
+    ProteinFeatureExtractor,
+)
 
 
 def test_normalize_static_method_with_source_as_str():
@@ -14,3 +22,42 @@ def test_normalize_static_method_with_source_as_str():
     expected_sequence = "MAKINELLRESTTTNSNSIGRPNLVALTRATTKLIYSDIVATQRTNQPVAA"
 
     assert normalized_sequence == expected_sequence
+
+
+def test_to_parquet_streams_records(tmp_path):
+    """
+    This test check if records are consumed lazily, chunk by chunk,
+    and saved under the given path as row groups
+    """
+
+    consumed = []
+
+    def records():
+        for index in range(5):
+            consumed.append(index)
+            yield SeqRecord(Seq("MKVL" * (index + 1)), id=f"protein_{index}")
+
+    extractor = MultifastaProteinFeatureExtractor(records=records())
+    assert consumed == []
+
+    path = str(tmp_path / "features")
+    extractor.to_parquet(path, row_group_size=2)
+
+    parquet_file = pq.ParquetFile(path)
+    assert consumed == list(range(5))
+    assert parquet_file.num_row_groups == 3
+    assert parquet_file.metadata.num_rows == 5
+
+
+def test_entries_are_loaded_once():
+    """
+    This test check if entries are loaded on the first access and
+    the consumed records iterable is still extracted from them
+    """
+
+    records = (SeqRecord(Seq(sequence)) for sequence in ["MKVL", "MKVLMKVL"])
+    extractor = MultifastaProteinFeatureExtractor(records=records)
+
+    assert [str(entry.seq) for entry in extractor.entries] == ["MKVL", "MKVLMKVL"]
+    assert extractor.entries is extractor.entries
+    assert len(extractor.to_df()) == len(extractor.to_df()) == 2
@@ -5,6 +5,8 @@ import pandas as pd
 from Bio.SeqIO.FastaIO import FastaIterator
 from Bio.SeqRecord import SeqRecord
 
+from phages2050 import instrumentation
+
 
 class FastaReader:
     """
@@ -51,8 +53,12 @@ class FastaReader:
 
         sequence: str = ""
 
-        for entry in self._fasta_reader(self.fasta_file_path):
-            sequence += f"{self._normalize(entry)} "
+        with instrumentation.stage(
+            "fasta.read", bytes_read=os.path.getsize(self.fasta_file_path)
+        ) as stage:
+            for entry in self._fasta_reader(self.fasta_file_path):
+                sequence += f"{self._normalize(entry)} "
+                stage.add(items=1)
 
         return sequence.strip()
 
@@ -0,0 +1,108 @@
+from typing import Iterator, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class ParquetWriter:
+    """
+    Streaming writer of DataFrames into single Parquet file
+
+    Each of the written DataFrame is saved as separate row group, so tables
+    larger than memory can be written chunk by chunk. Float64 columns can be
+    saved as float32 (embeddings), which halves the file size
+
+    Example usage:
+
+        with ParquetWriter("embeddings.parquet", float32=True) as writer:
+            for df in chunks:
+                writer.write(df)
+    """
+
+    def __init__(self, path: str, compression: str = "zstd", float32: bool = False):
+        self.path = path
+        self.compression = compression
+        self.float32 = float32
+        self.writer = None
+
+    def _to_table(self, df: pd.DataFrame) -> pa.Table:
+        """
+        Return Arrow table with (optionally) float32 columns
+        """
+
+        if self.float32:
+            float_columns = df.select_dtypes(include=[np.float64]).columns
+            df = df.astype({column: np.float32 for column in float_columns})
+
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    def write(self, df: pd.DataFrame) -> None:
+        """
+        Append DataFrame as the next row group
+        """
+
+        table = self._to_table(df)
+
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(
+                self.path, table.schema, compression=self.compression
+            )
+
+        self.writer.write_table(table)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def to_parquet(
+    df: pd.DataFrame,
+    path: str,
+    compression: str = "zstd",
+    float32: bool = False,
+    row_group_size: int = 100000,
+) -> None:
+    """
+    Save DataFrame as Parquet file with row groups
+    of at most row_group_size rows
+    """
+
+    with ParquetWriter(path, compression=compression, float32=float32) as writer:
+        for start in range(0, max(len(df), 1), row_group_size):
+            writer.write(df.iloc[start : start + row_group_size])
+
+
+def read_parquet(path: str, columns: List[str] = None) -> pd.DataFrame:
+    """
+    Return DataFrame loaded from Parquet file (only selected columns)
+    """
+
+    return pq.read_table(path, columns=columns).to_pandas()
+
+
+def iter_parquet(
+    path: str, columns: List[str] = None, row_groups: Sequence[int] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield DataFrame for each of the row group (all of them in the file
+    order or only selected in the given order), so the file
+    is processed chunk by chunk with bounded memory
+    """
+
+    parquet_file = pq.ParquetFile(path)
+
+    if row_groups is None:
+        row_groups = range(parquet_file.num_row_groups)
+
+    for index in row_groups:
+        yield parquet_file.read_row_group(int(index), columns=columns).to_pandas()
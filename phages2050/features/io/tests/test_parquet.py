@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from phages2050.features.io.parquet import (
+    ParquetWriter,
+    to_parquet,
+    read_parquet,
+    iter_parquet,
+)
+
+
+def test_embeddings_are_saved_as_float32_row_groups(tmp_path):
+    """
+    This test check if embedding DataFrame is saved with float32 columns
+    in row groups and loaded back without changing the values
+    """
+
+    vectors = np.random.RandomState(0).normal(size=(25, 8))
+    df = pd.DataFrame(vectors, columns=[f"BERT_{index}" for index in range(8)])
+    df["class"] = "portal"
+
+    path = str(tmp_path / "embeddings.parquet")
+    to_parquet(df, path, float32=True, row_group_size=10)
+
+    loaded = read_parquet(path)
+
+    assert (loaded.dtypes[:8] == np.float32).all()
+    assert np.allclose(loaded.iloc[:, :8].values, vectors.astype(np.float32))
+    assert list(loaded["class"].unique()) == ["portal"]
+
+    chunks = list(iter_parquet(path, columns=["BERT_0"]))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert list(chunks[0].columns) == ["BERT_0"]
+
+
+def test_streaming_writer_appends_row_groups(tmp_path):
+    """
+    This test check if each written DataFrame is appended to the same file
+    """
+
+    path = str(tmp_path / "features.parquet")
+
+    with ParquetWriter(path) as writer:
+        for start in range(0, 6, 2):
+            writer.write(pd.DataFrame({"protein_length": [start, start + 1]}))
+
+    assert read_parquet(path)["protein_length"].tolist() == list(range(6))
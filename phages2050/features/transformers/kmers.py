@@ -1,4 +1,4 @@
-from typing import Set, Union, List
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Set, Tuple, Union
 
 import numpy as np
 import pandas as pd
@@ -6,16 +6,79 @@ import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 from pandas.core.series import Series
 
-from gensim.models.word2vec import Word2Vec
-from gensim.models.fasttext import FastText
+from phages2050 import instrumentation
+from phages2050.embeddings.result import EmbeddingResult
+from phages2050.features.encoding import (
+    INVALID_CODE,
+    encode_sequence,
+    get_kmer_codes,
+)
 
-from pandarallel import pandarallel
+if TYPE_CHECKING:
+    from gensim.models.word2vec import Word2Vec
+    from gensim.models.fasttext import FastText
 
 
 # Parallelization has a cost, so parallelization is efficient only
 # if the amount of calculation to parallelize is high enough.
 # For very little amount of data, using parallelization is not always worth it.
-pandarallel.initialize()
+# Workers are initialized once, on the first parallel transformation
+_pandarallel_initialized = False
+
+
+def _initialize_pandarallel() -> None:
+    global _pandarallel_initialized
+
+    if not _pandarallel_initialized:
+        from pandarallel import pandarallel
+
+        pandarallel.initialize()
+        _pandarallel_initialized = True
+
+
+def _get_kmer_table(
+    gensim_model: Union["FastText", "Word2Vec"], k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return row of each of the 4^k k-mer codes in vectors (-1 if the k-mer
+    has no vector) and float32 vectors with the last row of zeros
+
+    FastText model (with subword n-grams) has vector of each k-mer,
+    vectors of k-mers out of the vocabulary are synthesized once
+    from n-grams and appended after the vocabulary vectors
+    """
+
+    words = gensim_model.wv.index2word
+
+    kmer_rows = np.full(4**k, -1, dtype=np.int64)
+    for index, word in enumerate(words):
+        values, valid = get_kmer_codes(encode_sequence(word), k)
+        if len(word) == k and valid.all():
+            kmer_rows[values[0]] = index
+
+    vectors = [np.asarray(gensim_model.wv.vectors, dtype="float32")]
+
+    missing = np.flatnonzero(kmer_rows < 0)
+    if len(missing) and hasattr(gensim_model.wv, "vectors_ngrams"):
+        # Nucleotides of each code, the most significant first
+        shifts = np.arange(2 * (k - 1), -1, -2, dtype=np.uint64)
+        digits = (missing.astype(np.uint64)[:, None] >> shifts) & np.uint64(3)
+        letters = np.frombuffer(b"ACGT", dtype=np.uint8)[digits]
+        missing_words = [
+            word.decode("ascii")
+            for word in np.ascontiguousarray(letters).view(f"S{k}").ravel()
+        ]
+
+        vectors.append(
+            np.asarray(gensim_model.wv[missing_words], dtype="float32").reshape(
+                len(missing), -1
+            )
+        )
+        kmer_rows[missing] = len(words) + np.arange(len(missing))
+
+    vectors.append(np.zeros((1, gensim_model.vector_size), dtype="float32"))
+
+    return kmer_rows, np.vstack(vectors)
 
 
 class KMersTransformer(BaseEstimator, TransformerMixin):
@@ -71,7 +134,10 @@ class KMersTransformer(BaseEstimator, TransformerMixin):
         # sequence column is expected
         assert list(df.columns) == ["sequence"]
 
-        return df.sequence.parallel_apply(self._extract_kmers_from_sequence)
+        _initialize_pandarallel()
+
+        with instrumentation.stage("kmers.transform", items=len(df)):
+            return df.sequence.parallel_apply(self._extract_kmers_from_sequence)
 
 
 class GenomeAvgTransformer(TransformerMixin, BaseEstimator):
@@ -82,68 +148,410 @@ class GenomeAvgTransformer(TransformerMixin, BaseEstimator):
     numerical representations of individual words but not of entire documents
     With this class it can average each k-mer of a DNA so that the
     generated Bacteriophage vector is actually a centroid of all k-mers in feature space
+
+    Vectors of all 4^k k-mers are looked up once (lookup table), k-mers out
+    of the vocabulary are skipped for Word2Vec and synthesized from subword
+    n-grams for fastText, so averaging does not use the model at all
     """
 
-    def __init__(self, gensim_model: Union[FastText, Word2Vec]):
+    def __init__(self, gensim_model: Union["FastText", "Word2Vec"]):
         """
-        It support Word2Vec as well as fastText embedding model
+        It support Word2Vec as well as fastText embedding model,
+        k is the length of words (k-mers) in the model vocabulary
         """
 
-        self.gensim_model: Union[FastText, Word2Vec] = gensim_model
+        self.gensim_model: Union["FastText", "Word2Vec"] = gensim_model
+        self.k = len(self.gensim_model.wv.index2word[0])
         self.columns = [
             f"feature_{index}" for index in range(self.gensim_model.vector_size)
         ]
 
-    def average_word_vectors(self, words: List[str], vocabulary: Set) -> np.array:
+        assert self.k <= 12
+
+        with instrumentation.stage("genome_avg.table", items=4**self.k):
+            self.kmer_rows, self.vectors = _get_kmer_table(self.gensim_model, self.k)
+
+    def _get_rows(self, sentence: str) -> np.ndarray:
         """
-        Return fixed-length numeric vector for each DNA sequence
+        Return vectors rows of k-mers (words separated by space) which have
+        vector, words with other length or characters are skipped
         """
 
-        # Filter only words supported by the vocabulary
-        supported_words: list = [word for word in words if word in vocabulary]
+        raw = np.frombuffer(sentence.encode("ascii", errors="replace"), np.uint8)
+        spaces = np.flatnonzero(raw == ord(" "))
 
-        if supported_words:
-            # Return average fixed-length numeric vector
-            # including all the k-mers in the sequence
-            feature_vector: np.array = np.mean(
-                self.gensim_model[supported_words], axis=0, dtype="float64"
-            )
-        else:
-            # Return fixed-length numeric vector with zeros
-            # if the k-mers (words) weren't in the vocabulary
-            feature_vector: np.array = np.zeros(
-                (self.gensim_model.vector_size,), dtype="float64"
-            )
+        # Words are between spaces, only words with k characters are k-mers
+        starts = np.concatenate([[0], spaces + 1])
+        ends = np.concatenate([spaces, [len(raw)]])
+        starts = starts[ends - starts == self.k]
+
+        values, valid = get_kmer_codes(encode_sequence(sentence), self.k)
+        starts = starts[valid[starts]]
+
+        rows = self.kmer_rows[values[starts]]
+
+        return rows[rows >= 0]
+
+    def _average(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Return average of vectors rows (zeros if there are no rows)
+        """
+
+        if not len(rows):
+            return np.zeros((self.gensim_model.vector_size,), dtype="float32")
+
+        # Vectors are weighted by number of occurrences of each k-mer
+        # (accumulated in float64 and stored as float32 like the model)
+        counts = np.bincount(rows, minlength=len(self.vectors))
+        used = np.flatnonzero(counts)
+
+        return (
+            counts[used].astype("float64")
+            @ self.vectors[used].astype("float64")
+            / len(rows)
+        ).astype("float32")
 
-        return feature_vector
+    def average_word_vectors(
+        self, words: List[str], vocabulary: Set = None
+    ) -> np.array:
+        """
+        Return fixed-length numeric vector for each DNA sequence
+
+        Vocabulary is not used, k-mers without vector are skipped
+        according to the lookup table
+        """
+
+        return self._average(self._get_rows(" ".join(words)))
 
     def averaged_word_vectorizer(self, column_with_kmers_seqs) -> np.array:
         """
         Execute DNA averaged vector transformer on each k-mer sequence
-        and return as array of numeric values
+        and return as float32 array of numeric values
         """
 
-        # Unique set of words
-        vocabulary: set = set(self.gensim_model.wv.index2word)
+        # Vectors are written directly into preallocated array
+        features = np.empty(
+            (len(column_with_kmers_seqs), self.gensim_model.vector_size),
+            dtype="float32",
+        )
 
-        features: list = [
-            self.average_word_vectors(
-                # Split k-mer sequence with spaces into a list with k-mers (words)
-                words=sentence.split(),
-                vocabulary=vocabulary,
-            )
-            for sentence in column_with_kmers_seqs
-        ]
+        for index, sentence in enumerate(column_with_kmers_seqs):
+            features[index] = self._average(self._get_rows(sentence))
 
-        return np.array(features)
+        return features
 
-    def transform(self, column_with_kmers_seqs: Series) -> pd.DataFrame:
+    def transform(
+        self, column_with_kmers_seqs: Series, as_array: bool = False
+    ) -> Union[pd.DataFrame, EmbeddingResult]:
         """
         Execute DNA averaged vector transformer on each k-mer sequence
         and return it Pandas DataFrame with fixed-length numeric vector space
+
+        If as_array is True then EmbeddingResult (float32 array with
+        Series index values as ids) is returned instead of DataFrame
+        """
+
+        with instrumentation.stage(
+            "genome_avg.transform", items=len(column_with_kmers_seqs)
+        ):
+            result = EmbeddingResult(
+                ids=getattr(
+                    column_with_kmers_seqs, "index", range(len(column_with_kmers_seqs))
+                ),
+                vectors=self.averaged_word_vectorizer(column_with_kmers_seqs),
+            )
+
+        if as_array:
+            return result
+
+        # DataFrame is a view of the float32 array (without ids column)
+        return pd.DataFrame(data=result.vectors, columns=self.columns, copy=False)
+
+
+class _WindowAggregator:
+    """
+    Streaming state of GenomeWindowTransformer for single DNA sequence
+
+    Sequence chunks are buffered and encoded in batches of complete steps,
+    k-mer vectors are summed per step (block) and window sums are
+    computed from cumulative sums of the last blocks, so each of the
+    k-mer vector is read once (O(n) regardless of window size)
+    """
+
+    def __init__(
+        self,
+        kmer_rows: np.ndarray,
+        vectors: np.ndarray,
+        k: int,
+        window: int,
+        step: int,
+        batch_size: int,
+    ):
+        self.kmer_rows = kmer_rows
+        self.vectors = vectors
+        self.k = k
+        self.step = step
+        self.blocks_per_window = window // step
+        self.batch_size = max(batch_size, step + k - 1)
+
+        self.texts: List[str] = []
+        self.text_length = 0
+        self.codes = np.empty(0, dtype=np.uint8)
+
+        # The last (blocks per window - 1) block sums and counts
+        feature_space = vectors.shape[1]
+        self.pending_sums = np.empty((0, feature_space), dtype=np.float64)
+        self.pending_counts = np.empty(0, dtype=np.int64)
+        self.next_window_start = 0
+
+    def _process(self, final: bool = False) -> Tuple[np.ndarray, np.ndarray]:
         """
+        Return starts and averaged vectors of windows completed
+        by the buffered blocks
+        """
+
+        codes = np.concatenate(
+            [self.codes, encode_sequence("".join(self.texts))]
+            + ([np.full(self.k - 1, INVALID_CODE, dtype=np.uint8)] if final else [])
+        )
+        self.texts, self.text_length = [], 0
+
+        n_blocks = max(len(codes) - self.k + 1, 0) // self.step
+        n_positions = n_blocks * self.step
+        self.codes = codes[n_positions:]
+
+        # Vector of each k-mer (the last, zero row for invalid or unknown ones)
+        values, valid = get_kmer_codes(codes[: n_positions + self.k - 1], self.k)
+        rows = np.where(valid, self.kmer_rows[values], -1)
+        found = rows >= 0
+        rows[~found] = len(self.vectors) - 1
+
+        block_vectors = self.vectors[rows].reshape(
+            n_blocks, self.step, self.vectors.shape[1]
+        )
+        block_found = found.reshape(n_blocks, self.step)
+
+        # K-mers which start in the last k - 1 positions of the block
+        # end outside of the window which ends with this block
+        tail = slice(self.step - self.k + 1, self.step)
+        tail_sums = block_vectors[:, tail].sum(axis=1, dtype=np.float64)
+        tail_counts = block_found[:, tail].sum(axis=1)
+
+        sums = np.concatenate(
+            [self.pending_sums, block_vectors.sum(axis=1, dtype=np.float64)]
+        )
+        counts = np.concatenate([self.pending_counts, block_found.sum(axis=1)])
+
+        n_windows = len(sums) - self.blocks_per_window + 1
+        if n_windows <= 0:
+            self.pending_sums, self.pending_counts = sums, counts
+            return np.empty(0, dtype=np.int64), np.empty((0, sums.shape[1]), "float32")
+
+        cumulative_sums = np.concatenate([np.zeros((1, sums.shape[1])), sums.cumsum(0)])
+        cumulative_counts = np.concatenate([[0], counts.cumsum()])
 
-        return pd.DataFrame(
-            data=self.averaged_word_vectorizer(column_with_kmers_seqs),
-            columns=self.columns,
+        w = self.blocks_per_window
+        window_sums = (
+            cumulative_sums[w:] - cumulative_sums[:-w] - tail_sums[-n_windows:]
         )
+        window_counts = (
+            cumulative_counts[w:] - cumulative_counts[:-w] - tail_counts[-n_windows:]
+        )
+
+        averages = np.zeros(window_sums.shape, dtype="float32")
+        np.divide(
+            window_sums,
+            window_counts[:, None],
+            out=averages,
+            where=window_counts[:, None] > 0,
+            casting="unsafe",
+        )
+
+        starts = self.next_window_start + self.step * np.arange(n_windows)
+        self.next_window_start += self.step * n_windows
+
+        self.pending_sums, self.pending_counts = sums[n_windows:], counts[n_windows:]
+
+        return starts, averages
+
+    def feed(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Buffer sequence chunk and return windows completed by the batch
+        (None if the batch is not complete yet)
+        """
+
+        self.texts.append(text)
+        self.text_length += len(text)
+
+        if len(self.codes) + self.text_length < self.batch_size:
+            return None
+
+        return self._process()
+
+    def finish(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the remaining windows (the last, partial block is skipped)
+        """
+
+        return self._process(final=True)
+
+
+class GenomeWindowTransformer(TransformerMixin, BaseEstimator):
+    """
+    Average k-mers in sliding windows along DNA sequence (e.g. bacterial
+    chromosome) to represent each window with word embedding
+
+    Each of the k-mer is mapped into embedding row once (lookup table of
+    all 4^k k-mers) and vectors of windows (10 kb by default) with step
+    (1 kb by default) are computed from cumulative sums of per step sums.
+    Window vector is equal to GenomeAvgTransformer vector of the window
+    sequence, the last windows which are shorter than window are skipped
+
+    Sequence is processed in batches, so chromosome-length sequence
+    (or FASTA file) is transformed with bounded memory
+
+    Example usage:
+
+        gwt = GenomeWindowTransformer(w2v.model, window=10000, step=1000)
+
+        for record_id, starts, vectors in gwt.iter_fasta("chromosome.fasta"):
+            ...
+
+        gwt.transform(FastaReader("chromosome.fasta").to_df())
+    """
+
+    def __init__(
+        self,
+        gensim_model: Union["FastText", "Word2Vec"],
+        window: int = 10000,
+        step: int = 1000,
+        batch_size: int = 100000,
+    ):
+        """
+        Window has to be multiple of step, k is the length
+        of words (k-mers) in the model vocabulary
+        """
+
+        self.gensim_model: Union["FastText", "Word2Vec"] = gensim_model
+        self.window = window
+        self.step = step
+        self.batch_size = batch_size
+
+        self.k = len(self.gensim_model.wv.index2word[0])
+
+        assert window % step == 0 and step >= self.k and self.k <= 12
+
+        # Row of each k-mer code in vectors (-1 if the k-mer has no vector),
+        # the last row with zeros is used for unknown k-mers
+        self.kmer_rows, self.vectors = _get_kmer_table(self.gensim_model, self.k)
+        self.columns = [
+            f"feature_{index}" for index in range(self.gensim_model.vector_size)
+        ]
+
+    def _get_aggregator(self) -> _WindowAggregator:
+        return _WindowAggregator(
+            self.kmer_rows,
+            self.vectors,
+            self.k,
+            self.window,
+            self.step,
+            self.batch_size,
+        )
+
+    def iter_windows(
+        self, chunks: Iterable[str]
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Yield batches of window starts and float32 vectors
+        of DNA sequence given as iterable of string chunks
+        """
+
+        aggregator = self._get_aggregator()
+
+        for chunk in chunks:
+            windows = aggregator.feed(chunk)
+            if windows is not None and len(windows[0]):
+                yield windows
+
+        windows = aggregator.finish()
+        if len(windows[0]):
+            yield windows
+
+    def iter_fasta(
+        self, fasta_file_path: str
+    ) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+        """
+        Yield record id, window starts and vectors for each batch
+        of windows of each sequence from (multi) FASTA file,
+        the file is read line by line
+        """
+
+        aggregator, record_id = None, None
+
+        with open(fasta_file_path) as handle:
+            for line in handle:
+                line = line.strip()
+
+                if line.startswith(">"):
+                    if aggregator is not None:
+                        yield (record_id, *aggregator.finish())
+
+                    aggregator, record_id = self._get_aggregator(), line[1:].split()[0]
+                elif aggregator is not None and line:
+                    windows = aggregator.feed(line)
+                    if windows is not None:
+                        yield (record_id, *windows)
+
+        if aggregator is not None:
+            yield (record_id, *aggregator.finish())
+
+    def transform(
+        self, df: pd.DataFrame, as_array: bool = False
+    ) -> Union[pd.DataFrame, EmbeddingResult]:
+        """
+        Execute windowed DNA averaged vector transformer on each sequence
+        and return DataFrame with name (DataFrame index value), start
+        and end of the window and fixed-length numeric vector space
+
+        If as_array is True then EmbeddingResult with "<name>:<start>-<end>"
+        ids is returned instead of DataFrame
+        """
+
+        # sequence column is expected
+        assert "sequence" in df.columns
+
+        names, starts, vectors = [], [], []
+
+        with instrumentation.stage("genome_windows.transform") as stage:
+            for name, sequence in zip(df.index, df.sequence):
+                for batch_starts, batch_vectors in self.iter_windows(
+                    sequence[start : start + self.batch_size]
+                    for start in range(0, len(sequence), self.batch_size)
+                ):
+                    names.extend([name] * len(batch_starts))
+                    starts.append(batch_starts)
+                    vectors.append(batch_vectors)
+                    stage.add(items=len(batch_starts))
+
+        starts = np.concatenate(starts) if starts else np.empty(0, dtype=np.int64)
+        vectors = (
+            np.vstack(vectors)
+            if vectors
+            else np.empty((0, self.gensim_model.vector_size), dtype="float32")
+        )
+
+        if as_array:
+            return EmbeddingResult(
+                ids=[
+                    f"{name}:{start}-{start + self.window}"
+                    for name, start in zip(names, starts)
+                ],
+                vectors=vectors,
+            )
+
+        df = pd.DataFrame(data=vectors, columns=self.columns, copy=False)
+        df.insert(0, "end", starts + self.window)
+        df.insert(0, "start", starts)
+        df.insert(0, "name", names)
+
+        return df
@@ -0,0 +1,308 @@
+import os
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from phages2050 import instrumentation
+from phages2050.features.encoding import encode_sequence, get_canonical_kmer_codes
+
+
+def hash_kmer_codes(values: np.ndarray, seed: int = 42) -> np.ndarray:
+    """
+    Return 64-bit hashes (splitmix64 finalizer) of k-mer codes
+    """
+
+    with np.errstate(over="ignore"):
+        z = values + np.uint64(seed) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+
+        return z ^ (z >> np.uint64(31))
+
+
+def mash_distance(jaccard: np.ndarray, k: int) -> np.ndarray:
+    """
+    Return Mash distance estimated from Jaccard index
+    (1.0 for genomes without shared k-mers)
+    """
+
+    jaccard = np.asarray(jaccard, dtype=np.float64)
+
+    with np.errstate(divide="ignore"):
+        distance = -np.log(2 * jaccard / (1 + jaccard)) / k
+
+    return np.minimum(distance, 1.0)
+
+
+class MinHashSketches:
+    """
+    Bottom-k MinHash sketches of genomes
+
+    Sketches are kept in single uint64 array (genomes x sketch size) with
+    sorted hashes of each genome, shorter sketches are padded with the
+    maximum uint64 value. Sketches are saved as NumPy archive (.npz)
+
+    Example usage:
+
+        sketches = MinHashSketchTransformer().transform(df)
+        sketches.save("millardlab.sketches.npz")
+
+        pairs = sketches.distances(max_distance=0.1, n_jobs=8)
+        pairs = new_sketches.distances(sketches)
+    """
+
+    PADDING = np.iinfo(np.uint64).max
+
+    def __init__(
+        self, ids: Sequence, hashes: np.ndarray, sizes: np.ndarray, k: int, seed: int
+    ):
+        self.ids = list(ids)
+        self.hashes = hashes
+        self.sizes = sizes
+        self.k = k
+        self.seed = seed
+
+        assert len(self.ids) == len(hashes) == len(sizes)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def sketch_size(self) -> int:
+        return self.hashes.shape[1]
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as handle:
+            np.savez(
+                handle,
+                ids=np.array(self.ids, dtype=str),
+                hashes=self.hashes,
+                sizes=self.sizes,
+                params=np.array([self.k, self.seed]),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "MinHashSketches":
+        if not Path(path).exists():
+            raise Exception(f"Sketches file {path} doesn't exist")
+
+        with np.load(path) as data:
+            k, seed = data["params"].tolist()
+
+            return cls(data["ids"].tolist(), data["hashes"], data["sizes"], k, seed)
+
+    def distances(
+        self,
+        references: "MinHashSketches" = None,
+        max_distance: float = 1.0,
+        n_jobs: int = None,
+        block_size: int = 256,
+    ) -> pd.DataFrame:
+        """
+        Return DataFrame with Mash distances between sketches and references
+        (all-vs-all pairs without repetitions if references are not given)
+
+        Only pairs with shared hashes and distance <= max_distance are
+        returned, query blocks are processed in parallel (n_jobs processes)
+        """
+
+        all_vs_all = references is None
+        references = self if all_vs_all else references
+
+        assert (self.k, self.seed, self.sketch_size) == (
+            references.k,
+            references.seed,
+            references.sketch_size,
+        )
+
+        starts = range(0, len(self), block_size)
+        args = (self.hashes, self.sizes, references.hashes, references.sizes)
+
+        with instrumentation.stage(
+            "minhash.distances", items=len(self)
+        ), ProcessPoolExecutor(
+            max_workers=n_jobs or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=args,
+        ) as executor:
+            blocks = list(
+                executor.map(
+                    _compare_block,
+                    starts,
+                    [min(start + block_size, len(self)) for start in starts],
+                    [all_vs_all] * len(starts),
+                )
+            )
+
+        queries, targets, shared, union = [
+            np.concatenate([block[index] for block in blocks]) for index in range(4)
+        ]
+
+        distance = mash_distance(shared / np.maximum(union, 1), self.k)
+        mask = distance <= max_distance
+
+        return pd.DataFrame(
+            {
+                "query": np.array(self.ids, dtype=object)[queries[mask]],
+                "reference": np.array(references.ids, dtype=object)[targets[mask]],
+                "distance": distance[mask],
+                "shared_hashes": shared[mask],
+                "sketch_size": union[mask],
+            }
+        )
+
+
+class MinHashSketchTransformer(BaseEstimator, TransformerMixin):
+    """
+    MinHash sketch transformer is responsible to represent each DNA
+    sequence by bottom-k sketch (sketch_size smallest hashes) of its
+    canonical k-mers (21 by default), similar to Mash
+
+    K-mers with unsupported characters are ignored, k-mers and their
+    reverse complements are treated as the same k-mer
+
+    Example usage:
+
+        fr = FastaReader("NC_001604.fasta")
+        sample = fr.to_df()
+
+        mht = MinHashSketchTransformer(k=21, sketch_size=1000)
+        sketches = mht.transform(sample)
+    """
+
+    def __init__(
+        self, k: int = 21, sketch_size: int = 1000, seed: int = 42, n_jobs: int = None
+    ):
+        assert 1 <= k <= 32 and sketch_size >= 1
+
+        self.k = k
+        self.sketch_size = sketch_size
+        self.seed = seed
+        self.n_jobs = n_jobs
+
+    def sketch(self, sequence: str) -> np.ndarray:
+        """
+        Return sorted bottom-k hashes of canonical k-mers of DNA sequence
+        """
+
+        hashes = hash_kmer_codes(
+            get_canonical_kmer_codes(encode_sequence(sequence), self.k), self.seed
+        )
+
+        # Only the smallest hashes are sorted (repeated k-mers are rare)
+        candidates = 2 * self.sketch_size
+        if len(hashes) > candidates:
+            smallest = np.unique(np.partition(hashes, candidates)[:candidates])
+
+            if len(smallest) >= self.sketch_size:
+                return smallest[: self.sketch_size]
+
+        return np.unique(hashes)[: self.sketch_size]
+
+    def transform(self, df: pd.DataFrame) -> MinHashSketches:
+        """
+        Sketch each DNA sequence in parallel and return
+        sketches with DataFrame index values as ids
+        """
+
+        # sequence column is expected
+        assert "sequence" in df.columns
+
+        with instrumentation.stage(
+            "minhash.sketch", items=len(df)
+        ), ProcessPoolExecutor(max_workers=self.n_jobs or os.cpu_count()) as executor:
+            sketches = list(executor.map(self.sketch, df.sequence, chunksize=16))
+
+        hashes = np.full(
+            (len(sketches), self.sketch_size), MinHashSketches.PADDING, dtype=np.uint64
+        )
+        sizes = np.zeros(len(sketches), dtype=np.int64)
+
+        for index, sketch in enumerate(sketches):
+            hashes[index, : len(sketch)] = sketch
+            sizes[index] = len(sketch)
+
+        return MinHashSketches(df.index, hashes, sizes, self.k, self.seed)
+
+
+# Sketches shared by the worker processes (set once by the initializer)
+_WORKER_SKETCHES: Tuple = ()
+
+
+def _init_worker(hashes, sizes, ref_hashes, ref_sizes) -> None:
+    """
+    Share sketches with the worker process and build inverted index
+    of the reference hashes (sorted hashes with reference indices)
+    """
+
+    global _WORKER_SKETCHES
+
+    sketch_size = ref_hashes.shape[1]
+    valid = np.arange(sketch_size) < ref_sizes[:, None]
+
+    flat = ref_hashes[valid]
+    refs = np.nonzero(valid)[0]
+    order = np.argsort(flat, kind="stable")
+
+    _WORKER_SKETCHES = (hashes, sizes, ref_hashes, ref_sizes, flat[order], refs[order])
+
+
+def _compare_block(start: int, end: int, all_vs_all: bool) -> List[np.ndarray]:
+    """
+    Return query indices, reference indices, numbers of shared hashes and
+    union sketch sizes of the pairs with shared hashes for query block
+    """
+
+    hashes, sizes, ref_hashes, ref_sizes, sorted_hashes, sorted_refs = _WORKER_SKETCHES
+    sketch_size = hashes.shape[1]
+
+    result = [[], [], [], []]
+
+    for query in range(start, end):
+        if sizes[query] == 0:
+            continue
+
+        sketch = hashes[query, : sizes[query]]
+
+        # Candidates are references with at least one shared hash
+        left = np.searchsorted(sorted_hashes, sketch, side="left")
+        lengths = np.searchsorted(sorted_hashes, sketch, side="right") - left
+        positions = np.arange(lengths.sum()) + np.repeat(
+            left - np.cumsum(lengths) + lengths, lengths
+        )
+        candidates = np.unique(sorted_refs[positions])
+        if all_vs_all:
+            candidates = candidates[candidates > query]
+
+        if len(candidates) == 0:
+            continue
+
+        # Shared hashes among the bottom-k hashes of the union of both sketches
+        others = ref_hashes[candidates]
+        valid = np.arange(sketch_size) < ref_sizes[candidates][:, None]
+
+        position = np.searchsorted(sketch, others)
+        in_sketch = valid & (sketch[np.minimum(position, len(sketch) - 1)] == others)
+
+        common_before = np.cumsum(in_sketch, axis=1) - in_sketch
+        union_rank = np.arange(sketch_size) + position - common_before
+
+        shared = (in_sketch & (union_rank < sketch_size)).sum(axis=1)
+        union = np.minimum(
+            sketch_size, sizes[query] + ref_sizes[candidates] - in_sketch.sum(axis=1)
+        )
+
+        result[0].append(np.full(len(candidates), query))
+        result[1].append(candidates)
+        result[2].append(shared)
+        result[3].append(union)
+
+    return [
+        np.concatenate(values) if values else np.empty(0, dtype=np.int64)
+        for values in result
+    ]
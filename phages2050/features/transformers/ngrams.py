@@ -0,0 +1,245 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from scipy.sparse import coo_matrix, csr_matrix, vstack
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from Bio.SeqIO.FastaIO import FastaIterator
+
+from phages2050 import instrumentation
+from phages2050.features.encoding import (
+    AMINO_ACIDS,
+    encode_protein,
+    get_ngram_codes,
+)
+
+Result = Union[List[str], csr_matrix]
+
+
+class ProteinNGramsTransformer(BaseEstimator, TransformerMixin):
+    """
+    Amino acid n-gram transformer for proteins
+
+    Each of the protein is encoded as integers and each of the n-gram
+    as its code (base 20 number, base 21 if ambiguous amino acids X, B, J,
+    O, U and Z are included as X), n-grams with other characters (e.g. *)
+    are ignored. The transformer returns either:
+    - tokens - n-grams separated by space (word2vec corpus)
+    - counts - sparse matrix (proteins x all possible n-grams) of n-gram counts
+
+    Proteins are processed in chunks (chunk_size proteins) in parallel
+    (n_jobs processes) with bounded number of chunks in progress
+
+    Example usage:
+
+        from phages2050.features.transformers.ngrams import ProteinNGramsTransformer
+
+        pnt = ProteinNGramsTransformer(n=3, output="counts")
+        counts = pnt.transform(df)
+        pnt.get_feature_names()
+
+        ProteinNGramsTransformer(n=3).to_corpus("proteins.fasta", "corpus.txt")
+    """
+
+    OUTPUTS = ["tokens", "counts"]
+
+    def __init__(
+        self,
+        n: int = 3,
+        include_ambiguous: bool = False,
+        output: str = "tokens",
+        chunk_size: int = 1000,
+        n_jobs: int = None,
+    ):
+        assert output in self.OUTPUTS
+
+        self.n = n
+        self.include_ambiguous = include_ambiguous
+        self.output = output
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+
+    @property
+    def alphabet(self) -> str:
+        return AMINO_ACIDS + "X" if self.include_ambiguous else AMINO_ACIDS
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self.alphabet) ** self.n
+
+    def _get_ngram_codes(self, sequence: str) -> np.ndarray:
+        """
+        Return codes of valid n-grams of the protein
+        """
+
+        values, valid = get_ngram_codes(
+            encode_protein(str(sequence)), self.n, len(self.alphabet)
+        )
+
+        return values[valid]
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Return n-gram strings of the codes (bytes array)
+        """
+
+        letters = np.frombuffer(self.alphabet.encode("ascii"), dtype=np.uint8)
+        codes = np.asarray(codes, dtype=np.uint64)
+
+        # Digits of base alphabet size numbers, the most significant first
+        powers = len(self.alphabet) ** np.arange(self.n - 1, -1, -1, dtype=np.uint64)
+        digits = (codes[:, None] // powers) % np.uint64(len(self.alphabet))
+
+        return np.ascontiguousarray(letters[digits]).view(f"S{self.n}").ravel()
+
+    def get_feature_names(self) -> List[str]:
+        """
+        Return n-gram of each column of the counts matrix
+        """
+
+        codes = np.arange(self.vocabulary_size, dtype=np.uint64)
+
+        return [ngram.decode("ascii") for ngram in self.decode(codes)]
+
+    def get_tokens(self, sequence: str) -> str:
+        """
+        Return n-grams of the protein separated by space
+        """
+
+        return self._transform_sequences([sequence])[0]
+
+    def _transform_sequences(self, sequences: List[str]) -> Result:
+        """
+        Return tokens or counts matrix of the chunk of proteins
+
+        Proteins are joined with invalid character (*) as separator,
+        so n-grams of the whole chunk are coded at once
+        """
+
+        lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(lengths + 1)[:-1]])
+
+        values, valid = get_ngram_codes(
+            encode_protein("*".join(map(str, sequences))), self.n, len(self.alphabet)
+        )
+
+        # Protein (row) of each valid n-gram
+        rows = np.searchsorted(starts, np.flatnonzero(valid), side="right") - 1
+        values = values[valid]
+
+        if self.output == "counts":
+            # Duplicated (row, n-gram) entries are summed
+            return coo_matrix(
+                (np.ones(len(values), dtype=np.int32), (rows, values.astype(np.int64))),
+                shape=(len(sequences), self.vocabulary_size),
+            ).tocsr()
+
+        ngrams = self.decode(values).tolist()
+        boundaries = np.searchsorted(rows, np.arange(len(sequences) + 1)).tolist()
+
+        return [
+            b" ".join(ngrams[start:end]).decode("ascii")
+            for start, end in zip(boundaries[:-1], boundaries[1:])
+        ]
+
+    def _iter_results(
+        self, records: Iterable[Tuple[str, str]]
+    ) -> Iterator[Tuple[List, Result]]:
+        """
+        Yield ids and result of each chunk of (id, sequence) records in
+        the records order, at most 2 * n_jobs chunks are in progress at once
+        """
+
+        n_jobs = self.n_jobs or os.cpu_count()
+        records = iter(records)
+        chunks = iter(lambda: list(islice(records, self.chunk_size)), [])
+
+        with instrumentation.stage("ngrams.transform") as stage:
+            if n_jobs == 1:
+                for chunk in chunks:
+                    ids = [record_id for record_id, _ in chunk]
+                    stage.add(items=len(ids))
+
+                    yield ids, self._transform_sequences(
+                        [str(sequence) for _, sequence in chunk]
+                    )
+
+                return
+
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                pending = deque()
+
+                for chunk in chunks:
+                    future = executor.submit(
+                        self._transform_sequences,
+                        [str(sequence) for _, sequence in chunk],
+                    )
+                    pending.append(([record_id for record_id, _ in chunk], future))
+
+                    if len(pending) >= 2 * n_jobs:
+                        ids, future = pending.popleft()
+                        stage.add(items=len(ids))
+                        yield ids, future.result()
+
+                while pending:
+                    ids, future = pending.popleft()
+                    stage.add(items=len(ids))
+                    yield ids, future.result()
+
+    def transform(self, df: pd.DataFrame) -> Union[pd.Series, csr_matrix]:
+        """
+        Execute n-gram transformer on each protein sequence and return
+        Series with n-grams strings (tokens) or sparse counts matrix
+        """
+
+        # sequence column is expected
+        assert "sequence" in df.columns
+
+        results = [
+            result for _, result in self._iter_results(zip(df.index, df.sequence))
+        ]
+
+        if self.output == "tokens":
+            tokens = [tokens for result in results for tokens in result]
+
+            return pd.Series(tokens, index=df.index, name="sequence", dtype=object)
+
+        if not results:
+            return csr_matrix((0, self.vocabulary_size), dtype=np.int32)
+
+        return vstack(results, format="csr")
+
+    def iter_fasta(self, fasta_path: str) -> Iterator[Tuple[List[str], Result]]:
+        """
+        Yield protein ids and tokens or counts matrix chunk by chunk
+        from (multi) FASTA file, proteins are read one by one
+        """
+
+        with open(fasta_path) as handle:
+            yield from self._iter_results(
+                (record.id, record.seq) for record in FastaIterator(handle)
+            )
+
+    def to_corpus(self, fasta_path: str, corpus_path: str) -> int:
+        """
+        Save n-grams of each protein from (multi) FASTA file as a line of
+        the text file (word2vec corpus, e.g. gensim LineSentence format)
+        and return number of proteins
+        """
+
+        assert self.output == "tokens"
+
+        proteins = 0
+
+        with open(corpus_path, "w") as handle:
+            for ids, tokens in self.iter_fasta(fasta_path):
+                handle.writelines(f"{line}\n" for line in tokens)
+                proteins += len(ids)
+
+        return proteins
@@ -0,0 +1,138 @@
+from itertools import product
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from phages2050.features.transformers.kmers import (
+    GenomeAvgTransformer,
+    GenomeWindowTransformer,
+    KMersTransformer,
+)
+
+
+def _get_model(k: int = 3, feature_space: int = 4):
+    """
+    Return object with gensim 3 model interface used by the transformer
+    (vocabulary without a few k-mers)
+    """
+
+    words = ["".join(kmer) for kmer in product("ACGT", repeat=k)][5:]
+    vectors = np.random.RandomState(0).normal(size=(len(words), feature_space))
+
+    wv = SimpleNamespace(index2word=words, vectors=vectors.astype("float32"))
+    return SimpleNamespace(wv=wv, vector_size=feature_space)
+
+
+class _FastTextVectors(SimpleNamespace):
+    """
+    Vectors with gensim 3 fastText interface, vector of the word out
+    of the vocabulary is synthesized from its characters
+    """
+
+    def __getitem__(self, words):
+        rows = {word: index for index, word in enumerate(self.index2word)}
+
+        return np.vstack(
+            [
+                (
+                    self.vectors[rows[word]]
+                    if word in rows
+                    else self.vectors_ngrams[[ord(char) % 4 for char in word]].mean(0)
+                )
+                for word in words
+            ]
+        )
+
+
+def _get_fasttext_model(k: int = 3, feature_space: int = 4):
+    model = _get_model(k, feature_space)
+    model.wv = _FastTextVectors(
+        index2word=model.wv.index2word,
+        vectors=model.wv.vectors,
+        vectors_ngrams=np.random.RandomState(1).normal(size=(4, feature_space)),
+    )
+
+    return model
+
+
+def _average(model, sequence: str, k: int) -> np.ndarray:
+    rows = {word: index for index, word in enumerate(model.wv.index2word)}
+    found = [
+        rows[sequence[x : x + k]]
+        for x in range(len(sequence) - k + 1)
+        if sequence[x : x + k] in rows
+    ]
+
+    if not found:
+        return np.zeros(model.vector_size)
+
+    return model.wv.vectors[found].mean(axis=0)
+
+
+def test_windows_are_equal_to_window_averages(tmp_path):
+    """
+    This test check if streamed window vectors are equal to averages
+    of k-mers in each window and FASTA file gives the same windows
+    """
+
+    random_state = np.random.RandomState(1)
+    sequence = "".join(random_state.choice(list("ACGTN"), 1234, p=[0.24] * 4 + [0.04]))
+
+    model = _get_model()
+    gwt = GenomeWindowTransformer(model, window=100, step=20, batch_size=50)
+
+    df = gwt.transform(pd.DataFrame({"sequence": [sequence]}, index=["chr"]))
+
+    assert df["start"].tolist() == list(range(0, 1234 - 100 + 1, 20))
+    assert (df["end"] - df["start"] == 100).all() and (df["name"] == "chr").all()
+
+    for start, vector in zip(df["start"], df[gwt.columns].values):
+        expected = _average(model, sequence[start : start + 100], 3)
+        np.testing.assert_allclose(vector, expected, rtol=1e-5, atol=1e-6)
+
+    fasta = tmp_path / "chr.fasta"
+    lines = [sequence[x : x + 60] for x in range(0, len(sequence), 60)]
+    fasta.write_text(">chr description\n" + "\n".join(lines) + "\n>short\nACGT\n")
+
+    batches = list(gwt.iter_fasta(fasta))
+    starts = np.concatenate([starts for name, starts, _ in batches if name == "chr"])
+    vectors = np.vstack([vectors for name, _, vectors in batches if name == "chr"])
+
+    assert starts.tolist() == df["start"].tolist()
+    np.testing.assert_allclose(vectors, df[gwt.columns].values, rtol=1e-6)
+    assert sum(len(starts) for name, starts, _ in batches if name == "short") == 0
+
+    result = gwt.transform(pd.DataFrame({"sequence": [sequence]}), as_array=True)
+    assert result.ids[1] == "0:20-120"
+
+
+def test_genome_vectors_are_averages_of_kmer_vectors():
+    """
+    This test check if genome vector is average of k-mer vectors,
+    k-mers out of the vocabulary are skipped for Word2Vec model
+    and synthesized from n-grams for fastText model
+    """
+
+    random_state = np.random.RandomState(2)
+    sequences = [
+        "".join(random_state.choice(list("ACGTN"), length, p=[0.24] * 4 + [0.04]))
+        for length in [300, 50, 2]
+    ]
+    kmers = KMersTransformer(size=3)._extract_kmers_from_sequence
+    column = pd.Series([kmers(sequence) for sequence in sequences], index=list("abc"))
+
+    model = _get_model()
+    result = GenomeAvgTransformer(model).transform(column, as_array=True)
+
+    assert result.ids == ["a", "b", "c"]
+    for sequence, vector in zip(sequences, result.vectors):
+        np.testing.assert_allclose(vector, _average(model, sequence, 3), atol=1e-6)
+
+    model = _get_fasttext_model()
+    df = GenomeAvgTransformer(model).transform(column)
+
+    for sentence, vector in zip(column, df.values):
+        words = sentence.split()
+        expected = model.wv[words].mean(0) if words else np.zeros(4)
+        np.testing.assert_allclose(vector, expected, atol=1e-6)
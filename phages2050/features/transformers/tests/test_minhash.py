@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+from phages2050.features.encoding import encode_sequence, get_canonical_kmer_codes
+from phages2050.features.transformers.minhash import (
+    MinHashSketches,
+    MinHashSketchTransformer,
+)
+
+
+def _mutate(sequence: str, rate: float, random_state) -> str:
+    bases = np.array(list(sequence))
+    mask = random_state.rand(len(bases)) < rate
+    bases[mask] = random_state.choice(list("ACGT"), mask.sum())
+
+    return "".join(bases)
+
+
+def test_canonical_kmers_of_reverse_complement():
+    """
+    This test check if sequence and its reverse complement
+    have the same canonical k-mers and invalid k-mers are skipped
+    """
+
+    sequence = "ACGTTGCAAGGCNTTACG"
+    reverse = sequence[::-1].translate(str.maketrans("ACGTN", "TGCAN"))
+
+    forward_codes = get_canonical_kmer_codes(encode_sequence(sequence), 5)
+    reverse_codes = get_canonical_kmer_codes(encode_sequence(reverse), 5)
+
+    assert len(forward_codes) == len(sequence) - 4 - 5
+    assert sorted(forward_codes) == sorted(reverse_codes)
+
+
+def test_all_vs_all_distances(tmp_path):
+    """
+    This test check if related genomes are closer than unrelated ones,
+    all-vs-all pairs are not repeated and sketches survive serialization
+    """
+
+    random_state = np.random.RandomState(0)
+    genome = "".join(random_state.choice(list("ACGT"), 20000))
+
+    df = pd.DataFrame(
+        {
+            "sequence": [
+                genome,
+                _mutate(genome, 0.01, random_state),
+                _mutate(genome, 0.05, random_state),
+                "".join(random_state.choice(list("ACGT"), 20000)),
+            ]
+        },
+        index=["a", "a_1%", "a_5%", "b"],
+    )
+
+    sketches = MinHashSketchTransformer(k=16, sketch_size=500, n_jobs=2).transform(df)
+    sketches.save(tmp_path / "sketches.npz")
+    sketches = MinHashSketches.load(tmp_path / "sketches.npz")
+
+    pairs = sketches.distances(n_jobs=2, block_size=2).set_index(["query", "reference"])
+    distance = pairs["distance"]
+
+    assert distance[("a", "a_1%")] < distance[("a", "a_5%")] < 0.1
+    assert ("b", "a") not in distance.index and ("a", "a") not in distance.index
+    assert (pairs["sketch_size"] == 500).all()
+
+    queries = sketches.distances(sketches, max_distance=0.0, n_jobs=1)
+    assert sorted(zip(queries["query"], queries["reference"])) == [
+        (name, name) for name in sorted(df.index)
+    ]
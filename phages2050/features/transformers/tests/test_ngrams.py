@@ -0,0 +1,85 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from phages2050.features.transformers.ngrams import ProteinNGramsTransformer
+
+PROTEINS = ["MKVLA*XGG", "ACDEFGHIKLMNPQRSTVWY", "MK", "", "mkmkmkb"]
+
+
+def _get_ngrams(sequence: str, n: int, alphabet: str):
+    sequence = sequence.upper().translate(str.maketrans("BJOUZ", "XXXXX"))
+
+    return [
+        sequence[start : start + n]
+        for start in range(len(sequence) - n + 1)
+        if set(sequence[start : start + n]) <= set(alphabet)
+    ]
+
+
+def test_tokens_and_counts_match_python_ngrams():
+    """
+    This test check if tokens and sparse counts are the same as n-grams
+    extracted in Python, with and without ambiguous amino acids
+    """
+
+    df = pd.DataFrame({"sequence": PROTEINS}, index=list("abcde"))
+
+    for include_ambiguous in [False, True]:
+        transformer = ProteinNGramsTransformer(
+            n=2, include_ambiguous=include_ambiguous, chunk_size=2, n_jobs=1
+        )
+        expected = [
+            _get_ngrams(protein, 2, transformer.alphabet) for protein in PROTEINS
+        ]
+
+        tokens = transformer.transform(df)
+        assert tokens.index.tolist() == list("abcde")
+        assert [row.split() for row in tokens] == expected
+
+        transformer.set_params(output="counts")
+        counts = transformer.transform(df)
+        names = transformer.get_feature_names()
+
+        assert counts.shape == (5, transformer.vocabulary_size)
+        for row, ngrams in enumerate(expected):
+            columns = counts[row].nonzero()[1]
+            assert {names[c]: counts[row, c] for c in columns} == Counter(ngrams)
+
+
+def test_parallel_chunks_from_fasta(tmp_path):
+    """
+    This test check if proteins from FASTA file processed in parallel
+    chunks are returned in order and saved as word2vec corpus
+    """
+
+    random_state = np.random.RandomState(0)
+    proteins = [
+        "".join(random_state.choice(list("ACDEFGHIKLMNPQRSTVWY"), length))
+        for length in random_state.randint(1, 80, 50)
+    ]
+
+    fasta_path = tmp_path / "proteins.fasta"
+    fasta_path.write_text(
+        "".join(
+            f">protein_{index}\n{protein}\n" for index, protein in enumerate(proteins)
+        )
+    )
+
+    transformer = ProteinNGramsTransformer(n=3, chunk_size=7, n_jobs=2)
+
+    ids = [
+        record_id
+        for chunk_ids, _ in transformer.iter_fasta(str(fasta_path))
+        for record_id in chunk_ids
+    ]
+    assert ids == [f"protein_{index}" for index in range(50)]
+
+    corpus_path = tmp_path / "corpus.txt"
+    assert transformer.to_corpus(str(fasta_path), str(corpus_path)) == 50
+
+    lines = corpus_path.read_text().split("\n")[:-1]
+    assert [line.split() for line in lines] == [
+        _get_ngrams(protein, 3, transformer.alphabet) for protein in proteins
+    ]
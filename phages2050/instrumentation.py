@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import time
+import threading
+from typing import Callable, Dict, List, NamedTuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class StageRecord(NamedTuple):
+    """
+    Single execution of the instrumented stage
+    (peak RSS of the process in bytes at the end of the stage)
+    """
+
+    name: str
+    seconds: float
+    items: int
+    bytes_read: int
+    peak_rss: int
+
+
+def get_peak_rss() -> int:
+    """
+    Return peak resident set size of the process in bytes
+    (0 if it's not supported by the platform)
+    """
+
+    if resource is None:
+        return 0
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+class _NullStage:
+    """
+    Stage returned when instrumentation is disabled (no-op)
+    """
+
+    def add(self, items: int = 0, bytes_read: int = 0) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """
+    Timed stage, items and bytes can be counted
+    during the stage with add method
+    """
+
+    __slots__ = ("instrumentation", "name", "items", "bytes_read", "start")
+
+    def __init__(self, instrumentation, name: str, items: int, bytes_read: int):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.items = items
+        self.bytes_read = bytes_read
+
+    def add(self, items: int = 0, bytes_read: int = 0) -> None:
+        self.items += items
+        self.bytes_read += bytes_read
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.instrumentation.record(
+            StageRecord(
+                name=self.name,
+                seconds=time.perf_counter() - self.start,
+                items=self.items,
+                bytes_read=self.bytes_read,
+                peak_rss=get_peak_rss(),
+            )
+        )
+
+        return False
+
+
+class Instrumentation:
+    """
+    Stage-level instrumentation of readers, transformers, embedders
+    and classifiers (wall time, items processed, bytes read, peak RSS)
+
+    Instrumentation is disabled by default (stages are no-op) and can be
+    enabled in the code or with PHAGES2050_INSTRUMENTATION=1 variable.
+    Each of the stage record is passed to the callbacks and aggregated
+    per stage name, aggregated metrics are exported as dict, JSON
+    or Prometheus text format
+
+    Example usage:
+
+        from phages2050 import instrumentation
+
+        instrumentation.enable()
+        instrumentation.add_callback(print)
+
+        FastaReader("NC_001604.fasta").get_sequence()
+
+        instrumentation.get_metrics()
+        instrumentation.to_json("metrics.json")
+        instrumentation.to_prometheus()
+    """
+
+    PROMETHEUS_PREFIX = "phages2050"
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.callbacks: List[Callable[[StageRecord], None]] = []
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        """
+        Remove aggregated metrics of all the stages
+        """
+
+        with self.lock:
+            self.stages: Dict[str, Dict] = {}
+            self.peak_rss = 0
+
+    def add_callback(self, callback: Callable[[StageRecord], None]) -> None:
+        self.callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[StageRecord], None]) -> None:
+        self.callbacks.remove(callback)
+
+    def stage(self, name: str, items: int = 0, bytes_read: int = 0):
+        """
+        Return context manager which measures the stage
+        (shared no-op object if instrumentation is disabled)
+        """
+
+        if not self.enabled:
+            return _NULL_STAGE
+
+        return _Stage(self, name, items, bytes_read)
+
+    def record(self, record: StageRecord) -> None:
+        """
+        Aggregate stage record and pass it to the callbacks
+        """
+
+        with self.lock:
+            metrics = self.stages.setdefault(
+                record.name, {"calls": 0, "seconds": 0.0, "items": 0, "bytes_read": 0}
+            )
+            metrics["calls"] += 1
+            metrics["seconds"] += record.seconds
+            metrics["items"] += record.items
+            metrics["bytes_read"] += record.bytes_read
+
+            self.peak_rss = max(self.peak_rss, record.peak_rss)
+
+        for callback in self.callbacks:
+            callback(record)
+
+    def get_metrics(self) -> Dict:
+        """
+        Return aggregated metrics of each stage with throughput
+        (items per second) and peak RSS of the process
+        """
+
+        with self.lock:
+            stages = {
+                name: dict(
+                    metrics,
+                    items_per_second=(
+                        metrics["items"] / metrics["seconds"]
+                        if metrics["seconds"]
+                        else 0.0
+                    ),
+                )
+                for name, metrics in self.stages.items()
+            }
+
+            return {"stages": stages, "peak_rss": self.peak_rss}
+
+    def to_json(self, path: str = None) -> str:
+        """
+        Return metrics as JSON string (and save it if path is given)
+        """
+
+        metrics = json.dumps(self.get_metrics(), indent=2)
+
+        if path is not None:
+            with open(path, "w") as handle:
+                handle.write(metrics)
+
+        return metrics
+
+    def to_prometheus(self) -> str:
+        """
+        Return metrics in Prometheus text exposition format
+        """
+
+        metrics = self.get_metrics()
+        lines = []
+
+        for key, help_text in [
+            ("calls", "Number of stage executions"),
+            ("seconds", "Wall time spent in the stage"),
+            ("items", "Number of items processed by the stage"),
+            ("bytes_read", "Number of bytes read by the stage"),
+        ]:
+            name = f"{self.PROMETHEUS_PREFIX}_stage_{key}_total"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+
+            for stage, values in sorted(metrics["stages"].items()):
+                lines.append(f'{name}{{stage="{stage}"}} {values[key]}')
+
+        name = f"{self.PROMETHEUS_PREFIX}_peak_rss_bytes"
+        lines.append(f"# HELP {name} Peak resident set size of the process")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {metrics['peak_rss']}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Instrumentation shared by all the modules
+_instrumentation = Instrumentation(
+    enabled=os.environ.get("PHAGES2050_INSTRUMENTATION", "") not in ("", "0")
+)
+
+enable = _instrumentation.enable
+disable = _instrumentation.disable
+reset = _instrumentation.reset
+stage = _instrumentation.stage
+add_callback = _instrumentation.add_callback
+remove_callback = _instrumentation.remove_callback
+get_metrics = _instrumentation.get_metrics
+to_json = _instrumentation.to_json
+to_prometheus = _instrumentation.to_prometheus
+
+
+def is_enabled() -> bool:
+    return _instrumentation.enabled
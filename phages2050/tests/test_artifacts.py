@@ -0,0 +1,174 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from zipfile import ZipFile
+
+import pytest
+
+from phages2050.artifacts import ArtifactStore
+from phages2050.classifiers.proteins.structural_protein import (
+    BacteriophageStructuralProteinManager,
+)
+from phages2050.embeddings.nucleotides.word2vec import Word2VecModelManager
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """
+    ZIP archive with single model file
+    """
+
+    path = tmp_path / "mirror" / "model.zip"
+    path.parent.mkdir()
+
+    with ZipFile(path, "w") as zip_file:
+        zip_file.writestr("model.bin", bytes(range(256)) * 512)
+
+    return path
+
+
+@pytest.fixture
+def server(archive):
+    """
+    Local HTTP server with range requests support
+    which serves the archive and records request headers
+    """
+
+    content = archive.read_bytes()
+    ranges = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            start = 0
+            if self.headers.get("Range"):
+                ranges.append(self.headers["Range"])
+                start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+
+            self.send_response(206 if start else 200)
+            self.send_header("Content-Length", str(len(content) - start))
+            self.end_headers()
+            self.wfile.write(content[start:])
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    host, port = httpd.server_address
+    yield f"http://{host}:{port}/model.zip", ranges
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_from_mirror_with_checksum(archive, tmp_path):
+    """
+    This test check if the archive from the mirror is verified
+    and extracted once into the target directory
+    """
+
+    store = ArtifactStore(cache_dir=str(tmp_path / "cache"), mirror_dir=archive.parent)
+    sha256 = hashlib.sha256(archive.read_bytes()).hexdigest()
+
+    with pytest.raises(Exception):
+        store.fetch("http://localhost/model.zip", tmp_path / "model", sha256="0" * 64)
+    assert not (tmp_path / "model").exists()
+
+    target_dir = store.fetch(
+        "http://localhost/model.zip", tmp_path / "model", sha256=sha256
+    )
+
+    assert (target_dir / "model.bin").exists()
+    assert store.is_complete(target_dir)
+    # Mirror is never modified
+    assert archive.exists()
+
+
+def test_interrupted_download_is_resumed(archive, server, tmp_path, monkeypatch):
+    """
+    This test check if the partial download is continued
+    with the range request instead of starting from the beginning
+    """
+
+    # User-Agent database is not fetched from the internet
+    monkeypatch.setattr(ArtifactStore, "_get_headers", staticmethod(lambda: {}))
+
+    url, ranges = server
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+
+    content = archive.read_bytes()
+    (cache_dir / "model.zip.part").write_bytes(content[:1000])
+
+    store = ArtifactStore(cache_dir=str(cache_dir))
+    target_dir = store.fetch(
+        url, tmp_path / "model", sha256=hashlib.sha256(content).hexdigest()
+    )
+
+    assert ranges == ["bytes=1000-"]
+    assert (target_dir / "model.bin").read_bytes() == bytes(range(256)) * 512
+    # Downloaded archive is removed after extraction (lock file is kept)
+    assert not list(cache_dir.glob("model.zip*"))
+
+
+def test_existing_files_are_kept(archive, tmp_path):
+    """
+    This test check if files already in the target directory are kept
+    after extraction and directory with the expected files is marked
+    as complete without the archive
+    """
+
+    store = ArtifactStore(cache_dir=str(tmp_path / "cache"), mirror_dir=archive.parent)
+
+    target_dir = tmp_path / "model"
+    target_dir.mkdir()
+    (target_dir / "notes.txt").write_text("user file")
+
+    store.fetch("http://localhost/model.zip", target_dir)
+
+    assert (target_dir / "notes.txt").read_text() == "user file"
+    assert (target_dir / "model.bin").exists()
+    assert not (target_dir / ArtifactStore.EXTRACT_DIR_NAME).exists()
+
+    # Model extracted by the previous version (without marker)
+    legacy_dir = tmp_path / "legacy"
+    (legacy_dir / "bert").mkdir(parents=True)
+
+    store = ArtifactStore(cache_dir=str(tmp_path / "cache"))
+    store.fetch("http://localhost/missing.zip", legacy_dir, expected=["bert"])
+
+    assert store.is_complete(legacy_dir)
+    assert (legacy_dir / "bert").is_dir()
+
+
+def test_models_downloaded_before_are_kept(tmp_path, monkeypatch):
+    """
+    This test check if models extracted by the previous version
+    (directories without marker) are not downloaded again
+    """
+
+    def get_archive(self, url):
+        raise Exception("The model shouldn't be downloaded")
+
+    monkeypatch.setenv("PHAGES2050_CACHE", str(tmp_path / "cache"))
+    monkeypatch.setattr(ArtifactStore, "_get_archive", get_archive)
+
+    word2vec_dir = tmp_path / "word2vec_model"
+    word2vec_dir.mkdir()
+    (word2vec_dir / Word2VecModelManager.WORD2VEC_FILE_NAME).write_bytes(b"model")
+
+    assert Word2VecModelManager(str(word2vec_dir)).download_model() == word2vec_dir
+
+    bsp_dir = tmp_path / "bsp_model"
+    for name, file_name in [("model", "model.joblib"), ("label_encoder", "le.joblib")]:
+        (bsp_dir / name).mkdir(parents=True)
+        (bsp_dir / name / file_name).write_bytes(b"model")
+
+    paths = BacteriophageStructuralProteinManager(str(bsp_dir)).download_model()
+
+    assert paths == {
+        "model_path": bsp_dir / "model" / "model.joblib",
+        "label_encoder_path": bsp_dir / "label_encoder" / "le.joblib",
+    }
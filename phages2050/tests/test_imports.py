@@ -0,0 +1,90 @@
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+import phages2050
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+
+# Import of the package has to stay cheap for short-lived CLI invocations
+IMPORT_BUDGET_SECONDS = 0.5
+
+HEAVY_MODULES = ["gensim", "pandarallel", "torch", "esm", "bio_embeddings"]
+
+LIGHT_MODULES = [
+    "phages2050.features.io.fasta",
+    "phages2050.features.extractors.proteins",
+    "phages2050.features.extractors.genomes",
+    "phages2050.features.transformers.kmers",
+    "phages2050.features.transformers.minhash",
+    "phages2050.features.transformers.ngrams",
+    "phages2050.embeddings.nucleotides.word2vec",
+    "phages2050.embeddings.proteins.bert",
+    "phages2050.embeddings.proteins.esm",
+    "phages2050.classifiers.proteins.pipeline",
+    "phages2050.batch.runner",
+]
+
+
+def _run_imports(modules):
+    """
+    Import modules in the fresh interpreter and return
+    import time with the list of loaded modules
+    """
+
+    code = (
+        "import sys, json, time, importlib\n"
+        "start = time.perf_counter()\n"
+        f"for module in {modules!r}:\n"
+        "    importlib.import_module(module)\n"
+        "seconds = time.perf_counter() - start\n"
+        "print(json.dumps({'seconds': seconds, 'modules': list(sys.modules)}))\n"
+    )
+
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+
+def test_package_import_budget():
+    """
+    This test check if import of the package is within the time
+    budget and does not load pandas, sklearn or any heavy dependency
+    """
+
+    result = _run_imports(["phages2050"])
+
+    assert result["seconds"] < IMPORT_BUDGET_SECONDS
+    for module in HEAVY_MODULES + ["pandas", "sklearn"]:
+        assert module not in result["modules"]
+
+
+def test_heavy_dependencies_are_deferred():
+    """
+    This test check if modules with transformers, embedders and
+    the classifier can be imported without loading heavy dependencies
+    """
+
+    result = _run_imports(LIGHT_MODULES)
+
+    for module in HEAVY_MODULES:
+        assert module not in result["modules"]
+
+
+def test_public_api_is_lazy():
+    """
+    This test check if public classes are available
+    from the top-level package
+    """
+
+    from phages2050.features.io.fasta import FastaReader
+
+    assert phages2050.FastaReader is FastaReader
+    assert "GenomeAvgTransformer" in dir(phages2050)
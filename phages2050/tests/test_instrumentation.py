@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from phages2050 import instrumentation
+from phages2050.instrumentation import Instrumentation
+from phages2050.features.io.fasta import FastaReader
+
+
+@pytest.fixture
+def enabled():
+    """
+    Shared instrumentation enabled for single test
+    """
+
+    instrumentation.reset()
+    instrumentation.enable()
+
+    yield instrumentation
+
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_disabled_stage_is_not_recorded():
+    """
+    This test check if stages are no-op and nothing
+    is recorded when the instrumentation is disabled
+    """
+
+    tracker = Instrumentation()
+    records = []
+    tracker.add_callback(records.append)
+
+    with tracker.stage("disabled", items=10) as stage:
+        stage.add(items=5, bytes_read=100)
+
+    assert records == []
+    assert tracker.get_metrics() == {"stages": {}, "peak_rss": 0}
+
+
+def test_stages_are_aggregated_and_exported(tmp_path):
+    """
+    This test check if stage records are passed to the callbacks,
+    aggregated per stage name and exported as JSON and Prometheus text
+    """
+
+    tracker = Instrumentation(enabled=True)
+    records = []
+    tracker.add_callback(records.append)
+
+    for _ in range(2):
+        with tracker.stage("read", bytes_read=100) as stage:
+            stage.add(items=3)
+
+    assert [record.name for record in records] == ["read", "read"]
+    assert all(record.seconds >= 0 for record in records)
+
+    metrics = tracker.get_metrics()
+    assert metrics["stages"]["read"]["calls"] == 2
+    assert metrics["stages"]["read"]["items"] == 6
+    assert metrics["stages"]["read"]["bytes_read"] == 200
+    assert metrics["peak_rss"] > 0
+
+    tracker.to_json(str(tmp_path / "metrics.json"))
+    with open(tmp_path / "metrics.json") as handle:
+        assert json.load(handle)["stages"]["read"]["items"] == 6
+
+    prometheus = tracker.to_prometheus()
+    assert 'phages2050_stage_items_total{stage="read"} 6' in prometheus
+    assert "# TYPE phages2050_peak_rss_bytes gauge" in prometheus
+
+
+def test_fasta_reader_stage(enabled, tmp_path):
+    """
+    This test check if FastaReader records number
+    of sequences and bytes read in the shared instrumentation
+    """
+
+    fasta_path = tmp_path / "genomes.fasta"
+    fasta_path.write_text(">genome_1\nACGT\n>genome_2\nGGCC\n")
+
+    FastaReader(str(fasta_path)).get_sequence()
+
+    stage = enabled.get_metrics()["stages"]["fasta.read"]
+    assert stage["items"] == 2
+    assert stage["bytes_read"] == fasta_path.stat().st_size
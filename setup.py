@@ -46,7 +46,17 @@ setup(
         "phages2050.embeddings.nucleotides",
         "phages2050.classifiers",
         "phages2050.classifiers.proteins",
+        "phages2050.batch",
+        "phages2050.explore",
     ],
+    entry_points={
+        "console_scripts": [
+            "phages2050-bsp=phages2050.classifiers.proteins.pipeline:main",
+            "phages2050-bsp-server=phages2050.classifiers.proteins.server:main",
+            "phages2050-batch=phages2050.batch.runner:main",
+            "phages2050-bsp-train=phages2050.classifiers.proteins.training:main",
+        ],
+    },
     data_files=glob("examples/*/**"),
     include_package_data=True,
     keywords=[